@@ -2,17 +2,84 @@
 Contains Service implementing the capabilities of the ClearSKY Vision API
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+import json
 import shutil
-from typing import Optional, Union
+from typing import Callable, Iterator, List, Optional, Tuple, Union
 import uuid
+import threading
 import requests
+import urllib3
 import cgi
 import os
 
 from tqdm import tqdm  # for progress bar only
 
 import models
+from tools.batch_executor import THROTTLING_STATUS_CODES, BatchJob, BatchJobOutcome, ThrottledError, execute_batch
+from tools.composite_cache import CompositeCache, canonical_command_key
+from tools.connection_limiter import ConnectionLimiter
+from tools.composite_planner import CompositeManifest, process_composite_in_pieces
+from tools.request_metrics import InstrumentedSession, MetricsExporter, TimedHTTPAdapter
+from tools.pipelined_writer import FSYNC_EVERY_BUFFER, FSYNC_NONE, FSYNC_POLICIES, PipelinedFileWriter
+from tools.response_cache import ResponseCache
+
+
+class CompositeChunkIterator:
+    """
+    Iterator over the chunks of a streamed composite response, returned by iter_composite_of_satellite_imagery.
+
+    The response, with its connection and connection_limiter slot, is closed when the iterator is exhausted, closed,
+    used as a context manager or garbage collected, also when it was never iterated.
+    """
+
+    def __init__(
+        self,
+        response: requests.Response,
+        chunk_size: int,
+    ):
+        self._response = response
+        self._chunks = response.iter_content(chunk_size=chunk_size)
+        self._content_length = response.headers.get("content-length")
+        self._closed = False
+        self.bytes_received = 0
+
+    def __iter__(self) -> "CompositeChunkIterator":
+        return self
+
+    def __next__(self) -> bytes:
+        if self._closed:
+            raise StopIteration
+
+        try:
+            for chunk in self._chunks:
+                if chunk:
+                    self.bytes_received += len(chunk)
+                    return chunk
+        except BaseException:
+            self.close()
+            raise
+
+        self.close()
+        if self._content_length is not None and self.bytes_received < int(self._content_length):
+            raise requests.exceptions.ChunkedEncodingError(f"Connection dropped after {self.bytes_received} of {self._content_length} bytes")
+        raise StopIteration
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._response.close()
+
+    def __enter__(self) -> "CompositeChunkIterator":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
 
 
 class ClearSkyVisionAPI:
@@ -21,13 +88,34 @@ class ClearSkyVisionAPI:
     """
 
     BASE_URL = "https://api.clearsky.vision"
+    DEFAULT_MAX_CONCURRENT_CONNECTIONS = 10
+    MIN_SEGMENT_SIZE = 8 * 2**20
 
     def __init__(
         self,
         api_key: str,
+        max_concurrent_connections: Optional[int] = None,
+        composite_cache: Optional[CompositeCache] = None,
+        response_cache: Optional[ResponseCache] = None,
+        metrics_exporters: Optional[List[MetricsExporter]] = None,
+        connection_limiter: Optional[ConnectionLimiter] = None,
     ):
         """
         Initialize the service with an API key.
+
+        Requests are sent through a pooled keep-alive session, so connections are reused between calls.
+
+        max_concurrent_connections: size of the connection pool. If not set, the pool is sized from
+        ApiKeyData.MaxConcurrentConnections the first time get_api_key_info succeeds.
+        composite_cache: optional cache of downloaded composites, identical commands are served from the cache
+        instead of being processed and paid for again.
+        response_cache: optional cache of responses from the read-only endpoints (tasking models, orderable tile
+        search and estimates, api key info only if given a TTL), see tools/response_cache.py.
+        metrics_exporters: optional exporters receiving connect time, time to first byte, download duration,
+        payload sizes and status code of every request, see tools/request_metrics.py.
+        connection_limiter: optional limiter shared with the other workers using the API key, e.g. other processes
+        or hosts, so together they never exceed MaxConcurrentConnections. Every request, and every segment of a
+        segmented download, holds a slot until its response is read, see tools/connection_limiter.py.
         """
         self.api_key = api_key
         self.headers = {
@@ -35,6 +123,120 @@ class ClearSkyVisionAPI:
             "Accept": "application/json, application/octet-stream",
             "Content-Type": "application/json",
         }
+        self.composite_cache = composite_cache
+        self.response_cache = response_cache
+        self._pool_size_from_api_key = max_concurrent_connections is None
+        self._pool_lock = threading.Lock()
+        self._session = InstrumentedSession()
+        self._session.metrics_exporters.extend(metrics_exporters or [])
+        self._session.hooks["response"].append(self._record_response)
+        self._session.connection_limiter = connection_limiter
+        self._last_response = threading.local()
+        self._throttling = threading.local()
+        self._configure_connection_pool(max_concurrent_connections or self.DEFAULT_MAX_CONCURRENT_CONNECTIONS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the pooled connections held by the service.
+        """
+        self._session.close()
+
+    @property
+    def max_concurrent_connections(self) -> int:
+        return self._max_concurrent_connections
+
+    def add_metrics_exporter(
+        self,
+        exporter: MetricsExporter,
+    ):
+        """
+        Add an exporter receiving the RequestMetrics of every subsequent request.
+        """
+        self._session.metrics_exporters.append(exporter)
+
+    @property
+    def last_response_status_code(self) -> Optional[int]:
+        """
+        Status code of the last response received by the calling thread, None if cleared or served from a cache.
+        """
+        return getattr(self._last_response, "status_code", None)
+
+    @property
+    def last_response_headers(self) -> Optional[dict]:
+        return getattr(self._last_response, "headers", None)
+
+    def clear_last_response(self):
+        self._last_response.__dict__.clear()
+
+    def _record_response(self, response: requests.Response, *args, **kwargs):
+        self._last_response.status_code = response.status_code
+        self._last_response.headers = response.headers
+
+    @contextmanager
+    def raising_on_throttling(self) -> Iterator[None]:
+        """
+        Within the block, 429 and 503 responses received by the calling thread raise ThrottledError instead of being
+        returned as error results. Used by execute_batch, so a job reports the response which was throttled even if it
+        makes further requests.
+        """
+        previous = getattr(self._throttling, "raise_errors", False)
+        self._throttling.raise_errors = True
+        try:
+            yield
+        finally:
+            self._throttling.raise_errors = previous
+
+    def _raise_if_throttled(
+        self,
+        response: requests.Response,
+    ):
+        if response.status_code in THROTTLING_STATUS_CODES and getattr(self._throttling, "raise_errors", False):
+            response.close()
+            raise ThrottledError(response.status_code, response.headers)
+
+    def execute_batch(
+        self,
+        jobs: List[BatchJob],
+        max_concurrency: Optional[int] = None,
+        max_retries: int = 4,
+        latency_target_seconds: Optional[float] = None,
+        on_outcome: Optional[Callable[[BatchJobOutcome], None]] = None,
+    ) -> List[BatchJobOutcome]:
+        """
+        Run a batch of calls of this service with adaptive concurrency, retrying idempotent calls on 429/5xx responses
+        and connection errors with jittered backoff.
+
+        Returns an outcome per job, in the order of jobs, rather than failing the whole batch. on_outcome is called with
+        every outcome as soon as its job finishes. See tools/batch_executor.py
+        """
+        return execute_batch(self, jobs, max_concurrency=max_concurrency, max_retries=max_retries, latency_target_seconds=latency_target_seconds, on_outcome=on_outcome)
+
+    def _configure_connection_pool(
+        self,
+        max_concurrent_connections: int,
+    ):
+        """
+        Helper method to (re)size the connection pool.
+
+        The pool blocks when exhausted, so at most max_concurrent_connections requests are in flight,
+        regardless of how many threads share the service.
+        """
+        if max_concurrent_connections < 1:
+            raise ValueError("max_concurrent_connections must be at least 1")
+
+        with self._pool_lock:
+            self._max_concurrent_connections = max_concurrent_connections
+            adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent_connections, pool_block=True)
+            # the previous adapter is not closed, as other threads may have requests in flight on its connections,
+            # its connections are closed once it is garbage collected
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
 
     def _extract_filename_from_headers(
         self,
@@ -49,19 +251,59 @@ class ClearSkyVisionAPI:
             return params.get("filename")
         return None
 
+    def _request_with_cache(
+        self,
+        endpoint: str,
+        method: str,
+        url: str,
+        data: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> Tuple[int, Union[bytes, str]]:
+        """
+        Helper method for read-only endpoints, serving successful responses from the response cache when possible.
+
+        Returns the status code and the raw JSON content of the response, to be decoded with model_validate_json.
+        """
+        cache_key = None
+        ttl_seconds = self.response_cache.ttl_for(endpoint) if self.response_cache is not None and use_cache else None
+        if self.response_cache is not None and ttl_seconds:
+            cache_key = self.response_cache.make_key(endpoint, self.api_key, data)
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                return 200, cached_response
+
+        response = self._session.request(method, url, headers=self.headers, data=data)
+
+        if response.status_code == 401:
+            raise Exception("API Key is Unauthorized")
+
+        self._raise_if_throttled(response)
+
+        if cache_key is not None and response.status_code == 200:
+            self.response_cache.set(cache_key, response.text, ttl_seconds)  # type: ignore
+
+        return response.status_code, response.content
+
     def get_api_key_info(
         self,
+        use_cache: bool = True,
     ) -> models.ApiKeyInfoQueryResponseDto:
         """
         Get API Key Information.
+
+        use_cache: when False, the response cache is bypassed even if a TTL is configured for this endpoint,
+        e.g. for credit checks which must see the current CreditAmount.
         """
         url = f"{self.BASE_URL}/api/apikey/info"
-        response = requests.get(url, headers=self.headers)
+        _, response_content = self._request_with_cache("get_api_key_info", "GET", url, use_cache=use_cache)
 
-        if response.status_code == 401:
-            raise Exception("API Key is Unauthorized")
+        api_key_info = models.ApiKeyInfoQueryResponseDto.model_validate_json(response_content)
+
+        if self._pool_size_from_api_key and api_key_info.Data is not None:
+            if api_key_info.Data.MaxConcurrentConnections != self._max_concurrent_connections:
+                self._configure_connection_pool(api_key_info.Data.MaxConcurrentConnections)
 
-        return models.ApiKeyInfoQueryResponseDto.model_validate(response.json())
+        return api_key_info
 
     def search_available_imagery(
         self,
@@ -71,15 +313,17 @@ class ClearSkyVisionAPI:
         Search Available Imagery.
         """
         url = f"{self.BASE_URL}/api/satelliteimages/search/available"
-        response = requests.post(url, headers=self.headers, data=query.model_dump_json())
+        response = self._session.post(url, headers=self.headers, data=query.model_dump_json())
 
         if response.status_code == 401:
             raise Exception("API Key is Unauthorized")
 
+        self._raise_if_throttled(response)
+
         if response.status_code != 200:
-            return models.ServiceResultError(**response.json())
+            return models.ServiceResultError.model_validate_json(response.content)
 
-        return models.SearchAvailableImageryQueryResponseDto.model_validate(response.json())
+        return models.SearchAvailableImageryQueryResponseDto.model_validate_json(response.content)
 
     def retrieve_estimate_for_process_composite_of_satellite_imagery(
         self,
@@ -89,18 +333,20 @@ class ClearSkyVisionAPI:
         Get Estimate for Processing Composite Satellite Imagery.
         """
         url = f"{self.BASE_URL}/api/satelliteimages/process/composite/estimate"
-        response = requests.post(url, headers=self.headers, data=query.model_dump_json())
+        _, response_content = self._request_with_cache("retrieve_estimate_for_process_composite_of_satellite_imagery", "POST", url, query.model_dump_json())
 
-        if response.status_code == 401:
-            raise Exception("API Key is Unauthorized")
-
-        return models.ProcessCompositeEstimateQueryResponseDto.model_validate(response.json())
+        return models.ProcessCompositeEstimateQueryResponseDto.model_validate_json(response_content)
 
     def process_composite_of_satellite_imagery(
         self,
         directory_to_save_file: str,
         command: models.ProcessCompositeCommandDto,
         show_progress=True,
+        resume_attempts: int = 0,
+        segments: int = 1,
+        allow_segment_requests: bool = False,
+        pipelined_writes: bool = False,
+        fsync_policy: str = FSYNC_NONE,
     ) -> Union[str, models.ServiceResultError]:
         """
         Process Composite Satellite Imagery.
@@ -108,50 +354,476 @@ class ClearSkyVisionAPI:
         If requests succeeds, it returns the path to the saved file.
         If it fails, the error response is returned
 
+        Interrupted downloads leave a <file>.incomplete file behind. Running the same command again continues from
+        the length of that file using an HTTP Range request, or starts over if the server does not support it.
+
+        resume_attempts: number of times an interrupted download is resumed within this call before the
+        connection error is raised. Note that every attempt is a new request to the API.
+
+        segments: when larger than 1, the first MIN_SEGMENT_SIZE bytes are requested with a Range header. If the
+        server answers with 206, the rest of the composite is split into up to segments - 1 byte ranges which are
+        fetched over parallel pooled connections, never more than max_concurrent_connections. Otherwise the composite
+        is downloaded as a single stream. Every segment is a separate composite request to the API, which may process
+        and bill the composite again, so segments > 1 requires allow_segment_requests=True.
+
+        pipelined_writes: when set, a writer thread flushes reusable buffers to a file preallocated from
+        Content-Length while the next buffer is read from the connection. Useful on slow disks or network storage.
+        fsync_policy: "none" (default) leaves flushing to the OS, "end" syncs the file once the download completes,
+        "every_buffer" syncs after every 1 MB buffer.
+
         see tools/utm_utm_boundingbox_to_wgs84.py for details on how to use PixelSelectionMode
         with a boundingbox as the command geometry if you require precise pixels to be returned
         """
 
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}")
+
+        if segments > 1 and not allow_segment_requests:
+            raise ValueError("segments > 1 sends a composite request per segment, which may be billed separately, pass allow_segment_requests=True to allow it")
+
         if not directory_to_save_file.endswith("/"):
             directory_to_save_file = directory_to_save_file + "/"
 
         os.makedirs(directory_to_save_file, exist_ok=True)
 
-        url = f"{self.BASE_URL}/api/satelliteimages/process/composite"
-        request_start = datetime.now()
-        with requests.post(url, headers=self.headers, data=command.model_dump_json(), stream=True) as response:
+        if self.composite_cache is not None:
+            cached_file_path = self.composite_cache.get(command, directory_to_save_file)
+            if cached_file_path is not None:
+                return cached_file_path
+
+        resume_state_path = f"{directory_to_save_file}.{canonical_command_key(command)}.resume"
+        attempt = 0
+        while True:
+            headers = dict(self.headers)
+            resume_state = self._read_resume_state(resume_state_path)
+            resume_offset = self._get_resume_offset(directory_to_save_file, resume_state)
+            if resume_state is not None and resume_offset > 0:
+                headers["Range"] = f"bytes={resume_offset}-"
+                if resume_state.get("validator"):
+                    headers["If-Range"] = resume_state["validator"]
+            elif segments > 1:
+                headers["Range"] = f"bytes=0-{self.MIN_SEGMENT_SIZE - 1}"
+
+            request_start = datetime.now()
+            with self._open_composite_response(command, headers) as response:
+
+                if resume_offset > 0 and (response.status_code == 416 or (response.status_code == 206 and self._get_content_range_start(response) != resume_offset)):
+                    # the server can not continue the partial download, start over
+                    self._discard_partial_download(directory_to_save_file, resume_state_path, resume_state)
+                    continue
+
+                if response.status_code not in (200, 206):
+                    return models.ServiceResultError.model_validate_json(response.content)
+
+                try:
+                    if segments > 1 and resume_offset == 0 and response.status_code == 206:
+                        file_path = self._download_file_in_segments(directory_to_save_file, show_progress, request_start, command, response, segments)
+                    else:
+                        file_path = self._download_file_with_tdqm_progress(
+                            directory_to_save_file,
+                            show_progress,
+                            request_start,
+                            command.FileType,
+                            response,
+                            resume_state_path,
+                            resume_state,
+                            pipelined_writes,
+                            fsync_policy,
+                        )
+                except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                    if attempt >= resume_attempts:
+                        raise
+                    attempt += 1
+                    continue
+
+            break
+
+        if self.composite_cache is not None:
+            self.composite_cache.put(command, file_path)
+
+        return file_path
+
+    def process_composite_of_satellite_imagery_in_pieces(
+        self,
+        directory_to_save_files: str,
+        command: models.ProcessCompositeCommandDto,
+        max_area_km2: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> CompositeManifest:
+        """
+        Process Composite Satellite Imagery of a geometry larger than the MaxCompositeAreaKm2 of the API key.
+
+        The geometry is split into pieces aligned to a UTM grid, which are downloaded concurrently. Returns the manifest
+        of the pieces, also written to manifest.json in directory_to_save_files. See tools/composite_planner.py
+        """
+        return process_composite_in_pieces(self, directory_to_save_files, command, max_area_km2=max_area_km2, max_concurrency=max_concurrency)
+
+    def process_composite_of_satellite_imagery_to_memory(
+        self,
+        command: models.ProcessCompositeCommandDto,
+    ) -> Union[memoryview, models.ServiceResultError]:
+        """
+        Process Composite Satellite Imagery, returning the file content without writing it to disk.
+
+        If requests succeeds, it returns a memoryview of the file content, use bytes(...) if bytes are required.
+        If it fails, the error response is returned
+        """
+        with self._open_composite_response(command) as response:
+
+            if response.status_code != 200:
+                return models.ServiceResultError.model_validate_json(response.content)
+
+            content_length = response.headers.get("content-length")
+            if content_length is None:
+                return memoryview(bytearray(response.content))
+
+            content = bytearray(int(content_length))
+            bytes_received = self._read_response_into_buffer(response, memoryview(content))
+            return memoryview(content)[:bytes_received]
+
+    def process_composite_of_satellite_imagery_into_buffer(
+        self,
+        command: models.ProcessCompositeCommandDto,
+        buffer,
+    ) -> Union[int, models.ServiceResultError]:
+        """
+        Process Composite Satellite Imagery, writing the file content into a caller-supplied writable buffer
+        (bytearray, memoryview, mmap, numpy array, ...).
 
-            if response.status_code == 401:
-                raise Exception("API Key is Unauthorized")
+        If requests succeeds, it returns the number of bytes written to the buffer.
+        If it fails, the error response is returned
+        """
+        buffer_view = memoryview(buffer).cast("B")
+        if buffer_view.readonly:
+            raise ValueError("buffer must be writable")
+
+        with self._open_composite_response(command) as response:
 
             if response.status_code != 200:
-                return models.ServiceResultError(**response.json())
+                return models.ServiceResultError.model_validate_json(response.content)
+
+            content_length = response.headers.get("content-length")
+            if content_length is not None and int(content_length) > len(buffer_view):
+                raise ValueError(f"buffer of {len(buffer_view)} bytes is too small for composite of {content_length} bytes")
+
+            return self._read_response_into_buffer(response, buffer_view)
+
+    def iter_composite_of_satellite_imagery(
+        self,
+        command: models.ProcessCompositeCommandDto,
+        chunk_size: int = 2**20,
+    ) -> Union[CompositeChunkIterator, models.ServiceResultError]:
+        """
+        Process Composite Satellite Imagery, returning an iterator over chunks of the file content,
+        e.g. for streaming the file to object storage.
+
+        The request is sent immediately. If it fails, the error response is returned.
+        The connection is held until the iterator is exhausted or closed, preferably by using it as a context manager:
+
+            with api_service.iter_composite_of_satellite_imagery(command) as chunks:
+                for chunk in chunks:
+                    ...
+        """
+        response = self._open_composite_response(command)
+
+        if response.status_code != 200:
+            with response:
+                return models.ServiceResultError.model_validate_json(response.content)
+
+        return CompositeChunkIterator(response, chunk_size)
+
+    def _open_composite_response(
+        self,
+        command: models.ProcessCompositeCommandDto,
+        headers: Optional[dict] = None,
+    ) -> requests.Response:
+        """
+        Helper method sending a process composite request, shared by all composite sinks.
+
+        Returns the streamed response, which the caller must close.
+        """
+        url = f"{self.BASE_URL}/api/satelliteimages/process/composite"
+        response = self._session.post(url, headers=headers or self.headers, data=command.model_dump_json(), stream=True)
+
+        if response.status_code == 401:
+            response.close()
+            raise Exception("API Key is Unauthorized")
+
+        self._raise_if_throttled(response)
+
+        return response
+
+    def _read_response_into_buffer(
+        self,
+        response: requests.Response,
+        buffer_view: memoryview,
+    ) -> int:
+        """
+        Helper method copying a streamed response body into buffer_view, returning the number of bytes written.
+        """
+        content_length = response.headers.get("content-length")
+        position = 0
+        for chunk in response.iter_content(chunk_size=2**20):
+            if position + len(chunk) > len(buffer_view):
+                raise ValueError(f"buffer of {len(buffer_view)} bytes is too small for composite")
+            buffer_view[position : position + len(chunk)] = chunk
+            position += len(chunk)
+
+        if content_length is not None and position < int(content_length):
+            raise requests.exceptions.ChunkedEncodingError(f"Connection dropped after {position} of {content_length} bytes")
+
+        return position
+
+    def _readinto_response(
+        self,
+        response: requests.Response,
+        buffer_view: memoryview,
+    ) -> int:
+        """
+        Helper method reading the next bytes of a streamed response into buffer_view, returning 0 at the end of the body.
+
+        Uncompressed bodies are read with the readinto of urllib3, which keeps its byte count and connection release
+        up to date, compressed bodies are decoded first.
+        """
+        raw = response.raw
+        try:
+            if response.headers.get("content-encoding", "identity").lower() != "identity":
+                data = raw.read(len(buffer_view), decode_content=True)
+                buffer_view[: len(data)] = data
+                return len(data)
+
+            return raw.readinto(buffer_view)
+        except (urllib3.exceptions.HTTPError, OSError) as e:
+            raise requests.exceptions.ChunkedEncodingError(f"Connection dropped while reading the response: {e}") from e
+
+    def _read_resume_state(
+        self,
+        resume_state_path: str,
+    ) -> Optional[dict]:
+        """
+        Helper method to read the filename and validator of a partial download, if any.
+        """
+        try:
+            with open(resume_state_path, "r") as resume_state_file:
+                return json.load(resume_state_file)
+        except (OSError, ValueError):
+            return None
+
+    def _get_resume_offset(
+        self,
+        directory_to_save_file: str,
+        resume_state: Optional[dict],
+    ) -> int:
+        if resume_state is None:
+            return 0
 
-            file_path = self._download_file_with_tdqm_progress(directory_to_save_file, show_progress, request_start, command.FileType, response)
+        incomplete_file_path = directory_to_save_file + resume_state["filename"] + ".incomplete"
+        return os.path.getsize(incomplete_file_path) if os.path.isfile(incomplete_file_path) else 0
 
-            return file_path
+    def _get_content_range_start(
+        self,
+        response: requests.Response,
+    ) -> Optional[int]:
+        """
+        Helper method to extract the first byte position from a "bytes start-end/total" Content-Range header.
+        """
+        content_range = response.headers.get("content-range", "")
+        try:
+            return int(content_range.split(" ", 1)[1].split("-", 1)[0])
+        except (IndexError, ValueError):
+            return None
 
-    def _download_file_with_tdqm_progress(self, directory_to_save_file: str, show_progress: bool, request_start: datetime, file_extension: str, response: requests.Response):
+    def _discard_partial_download(
+        self,
+        directory_to_save_file: str,
+        resume_state_path: str,
+        resume_state: Optional[dict],
+    ):
+        if resume_state is not None:
+            incomplete_file_path = directory_to_save_file + resume_state["filename"] + ".incomplete"
+            if os.path.isfile(incomplete_file_path):
+                os.remove(incomplete_file_path)
+
+        if os.path.isfile(resume_state_path):
+            os.remove(resume_state_path)
+
+    def _get_content_range_total(
+        self,
+        response: requests.Response,
+    ) -> Optional[int]:
+        """
+        Helper method to extract the total size from a "bytes start-end/total" Content-Range header.
+        """
+        content_range = response.headers.get("content-range", "")
+        try:
+            return int(content_range.rsplit("/", 1)[1])
+        except (IndexError, ValueError):
+            return None
+
+    def _download_file_in_segments(
+        self,
+        directory_to_save_file: str,
+        show_progress: bool,
+        request_start: datetime,
+        command: models.ProcessCompositeCommandDto,
+        response: requests.Response,
+        segments: int,
+    ) -> str:
+        """
+        Helper method downloading a composite as parallel byte ranges into a preallocated file.
+
+        The first range is read from the 206 response already received, whose Content-Range gives the size of the
+        composite. The remaining bytes are split into ranges requested with Range headers through the connection pool.
+        The first range never waits on the others and its response is closed once read, so downloads sharing an exhausted
+        pool or connection_limiter always make progress.
+        """
         filename = self._extract_filename_from_headers(response)
         if not filename:
-            filename = f"output-{uuid.uuid4()}.{file_extension}"
+            filename = f"output-{uuid.uuid4()}.{command.FileType}"
+
+        file_path = directory_to_save_file + filename
+        incomplete_file_path = file_path + ".incomplete"
+        total_size = self._get_content_range_total(response)
+        if total_size is None or "content-length" not in response.headers:
+            raise Exception(f"Segmented download failed, server answered the first range with Content-Range {response.headers.get('content-range')}")
+        first_end = int(response.headers["content-length"]) - 1
+
+        remaining_size = total_size - first_end - 1
+        segment_count = max(1, min(segments - 1, self._max_concurrent_connections - 1, remaining_size // self.MIN_SEGMENT_SIZE))
+        segment_size = max(1, -(-remaining_size // segment_count))
+        byte_ranges = [(0, first_end)] + [(start, min(start + segment_size, total_size) - 1) for start in range(first_end + 1, total_size, segment_size)]
+
+        with open(incomplete_file_path, "wb") as incomplete_file:
+            incomplete_file.truncate(total_size)
+
+        if show_progress:
+            print("Request complete, time elapsed: " + str((datetime.now() - request_start).seconds) + f" seconds, starting download in {len(byte_ranges)} segments")
+
+        progress_lock = threading.Lock()
+        with tqdm(unit="B", unit_scale=True, disable=not show_progress, total=total_size) as progress:
+
+            def write_segment(segment_response: requests.Response, start: int, end: int):
+                chunk_size = 2**20
+                position = start
+                with open(incomplete_file_path, "r+b") as incomplete_file:
+                    incomplete_file.seek(start)
+                    for chunk in segment_response.iter_content(chunk_size=chunk_size):
+                        chunk = chunk[: end + 1 - position]
+                        incomplete_file.write(chunk)
+                        position += len(chunk)
+                        with progress_lock:
+                            progress.update(len(chunk))
+                        if position > end:
+                            break
+
+                if position <= end:
+                    raise requests.exceptions.ChunkedEncodingError(f"Connection dropped after {position - start} of {end + 1 - start} bytes of segment starting at {start}")
+
+            def download_segment(start: int, end: int):
+                headers = dict(self.headers)
+                headers["Range"] = f"bytes={start}-{end}"
+                with self._open_composite_response(command, headers) as segment_response:
+                    if segment_response.status_code != 206 or self._get_content_range_start(segment_response) != start:
+                        raise Exception(f"Segmented download failed, server answered range {start}-{end} with status {segment_response.status_code}")
+                    write_segment(segment_response, start, end)
+
+            try:
+                with ThreadPoolExecutor(max_workers=max(1, len(byte_ranges) - 1)) as executor:
+                    futures = [executor.submit(download_segment, start, end) for start, end in byte_ranges[1:]]
+                    try:
+                        write_segment(response, *byte_ranges[0])
+                    finally:
+                        # gives the connection, and the slot of a connection_limiter, to the waiting segments
+                        response.close()
+                    for future in futures:
+                        future.result()
+            except BaseException:
+                if os.path.isfile(incomplete_file_path):
+                    os.remove(incomplete_file_path)
+                raise
+
+        shutil.move(incomplete_file_path, file_path)
+        return file_path
+
+    def _download_file_with_tdqm_progress(
+        self,
+        directory_to_save_file: str,
+        show_progress: bool,
+        request_start: datetime,
+        file_extension: str,
+        response: requests.Response,
+        resume_state_path: Optional[str] = None,
+        resume_state: Optional[dict] = None,
+        pipelined_writes: bool = False,
+        fsync_policy: str = FSYNC_NONE,
+    ):
+        resuming = response.status_code == 206 and resume_state is not None
+        if resuming:
+            filename = resume_state["filename"]  # type: ignore
+        else:
+            filename = self._extract_filename_from_headers(response)
+            if not filename:
+                filename = f"output-{uuid.uuid4()}.{file_extension}"
 
         file_path = directory_to_save_file + filename
         incomplete_file_path = file_path + ".incomplete"
         request_end: Optional[datetime] = None
+        resume_offset = os.path.getsize(incomplete_file_path) if resuming else 0
+
+        if resume_state_path is not None and not resuming:
+            with open(resume_state_path, "w") as resume_state_file:
+                json.dump({"filename": filename, "validator": response.headers.get("etag") or response.headers.get("last-modified")}, resume_state_file)
 
-        with tqdm(unit="B", unit_scale=True, disable=not show_progress) as progress:
+        content_length = response.headers.get("content-length")
+        bytes_received = 0
+
+        with tqdm(unit="B", unit_scale=True, disable=not show_progress, initial=resume_offset) as progress:
             chunk_size = 2**20
-            with open(incomplete_file_path, "wb") as incomplete_file:
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if chunk:
-                        if request_end is None:
-                            request_end = datetime.now()
-                            print("Request complete, time elapsed: " + str((request_end - request_start).seconds) + " seconds, starting download")
-                        incomplete_file.write(chunk)
-                        progress.update(len(chunk))
+            if pipelined_writes:
+                # socket reads continue while the writer thread flushes the previous buffer to disk
+                preallocate_size = int(content_length) if content_length is not None else None
+                if show_progress:
+                    print("Request complete, time elapsed: " + str((datetime.now() - request_start).seconds) + " seconds, starting download")
+                with PipelinedFileWriter(incomplete_file_path, resume_offset, preallocate_size, chunk_size, fsync_policy=fsync_policy) as writer:
+                    while True:
+                        buffer = writer.acquire_buffer()
+                        buffer_view = memoryview(buffer)
+                        size = 0
+                        while size < len(buffer_view):
+                            bytes_read = self._readinto_response(response, buffer_view[size:])
+                            if not bytes_read:
+                                break
+                            size += bytes_read
+
+                        if not size:
+                            writer.release_buffer(buffer)
+                            break
+                        writer.submit(buffer, size)
+                        bytes_received += size
+                        progress.update(size)
+            else:
+                with open(incomplete_file_path, "ab" if resuming else "wb") as incomplete_file:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            if request_end is None:
+                                request_end = datetime.now()
+                                print("Request complete, time elapsed: " + str((request_end - request_start).seconds) + " seconds, starting download")
+                            incomplete_file.write(chunk)
+                            if fsync_policy == FSYNC_EVERY_BUFFER:
+                                incomplete_file.flush()
+                                os.fsync(incomplete_file.fileno())
+                            bytes_received += len(chunk)
+                            progress.update(len(chunk))
+                    if fsync_policy != FSYNC_NONE:
+                        incomplete_file.flush()
+                        os.fsync(incomplete_file.fileno())
+
+        if content_length is not None and bytes_received < int(content_length):
+            raise requests.exceptions.ChunkedEncodingError(f"Connection dropped after {bytes_received} of {content_length} bytes, download can be resumed")
 
         shutil.move(incomplete_file_path, file_path)
+        if resume_state_path is not None and os.path.isfile(resume_state_path):
+            os.remove(resume_state_path)
         return file_path
 
     def get_tasking_models(
@@ -161,12 +833,9 @@ class ClearSkyVisionAPI:
         Get Models Available for Tasking.
         """
         url = f"{self.BASE_URL}/api/tasking/models"
-        response = requests.get(url, headers=self.headers)
-
-        if response.status_code == 401:
-            raise Exception("API Key is Unauthorized")
+        _, response_content = self._request_with_cache("get_tasking_models", "GET", url)
 
-        return models.TaskingModelsQueryResponseDto.model_validate(response.json())
+        return models.TaskingModelsQueryResponseDto.model_validate_json(response_content)
 
     def get_tasking_orders(
         self,
@@ -178,12 +847,14 @@ class ClearSkyVisionAPI:
         recurring_only: only retrieve recurring taskorders
         """
         url = f"{self.BASE_URL}/api/tasking/orders?recurringOnly={recurring_only}"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
 
         if response.status_code == 401:
             raise Exception("API Key is Unauthorized")
 
-        return models.TaskingOrdersQueryResponseDto.model_validate(response.json())
+        self._raise_if_throttled(response)
+
+        return models.TaskingOrdersQueryResponseDto.model_validate_json(response.content)
 
     def search_orderable_tiles(
         self,
@@ -193,12 +864,9 @@ class ClearSkyVisionAPI:
         Search tiles available for Tasking Orders.
         """
         url = f"{self.BASE_URL}/api/tasking/search/tiles"
-        response = requests.post(url, headers=self.headers, json=query.model_dump())
-
-        if response.status_code == 401:
-            raise Exception("API Key is Unauthorized")
+        _, response_content = self._request_with_cache("search_orderable_tiles", "POST", url, query.model_dump_json())
 
-        return models.TaskingTileSearchQueryResponseDto.model_validate(response.json())
+        return models.TaskingTileSearchQueryResponseDto.model_validate_json(response_content)
 
     def retrieve_estimate_for_tasking_order(
         self,
@@ -208,15 +876,12 @@ class ClearSkyVisionAPI:
         Get Estimate for Tasking Order.
         """
         url = f"{self.BASE_URL}/api/tasking/orders/estimate"
-        response = requests.post(url, headers=self.headers, data=query.model_dump_json())
+        status_code, response_content = self._request_with_cache("retrieve_estimate_for_tasking_order", "POST", url, query.model_dump_json())
 
-        if response.status_code == 401:
-            raise Exception("API Key is Unauthorized")
-
-        if response.status_code != 200:
-            return models.ServiceResultError(**response.json())
+        if status_code != 200:
+            return models.ServiceResultError.model_validate_json(response_content)
 
-        return models.TaskingOrderEstimateQueryResponseDto.model_validate(response.json())
+        return models.TaskingOrderEstimateQueryResponseDto.model_validate_json(response_content)
 
     def create_tasking_order(
         self,
@@ -229,15 +894,17 @@ class ClearSkyVisionAPI:
         Evaluate the estimate for a tasking order before creating a tasking order.
         """
         url = f"{self.BASE_URL}/api/tasking/orders"
-        response = requests.post(url, headers=self.headers, data=command.model_dump_json())
+        response = self._session.post(url, headers=self.headers, data=command.model_dump_json())
 
         if response.status_code == 401:
             raise Exception("API Key is Unauthorized")
 
+        self._raise_if_throttled(response)
+
         if response.status_code != 200:
-            return models.ServiceResultError(**response.json())
+            return models.ServiceResultError.model_validate_json(response.content)
 
-        return models.TaskingOrderCreateCommandResponseDto.model_validate(response.json())
+        return models.TaskingOrderCreateCommandResponseDto.model_validate_json(response.content)
 
     def cancel_recurring_order(
         self,
@@ -249,9 +916,11 @@ class ClearSkyVisionAPI:
         taskorder_guid: Guid identifying the Tasking Order
         """
         url = f"{self.BASE_URL}/api/tasking/orders/cancel?taskOrderGuid={taskorder_guid}"
-        response = requests.delete(url, headers=self.headers)
+        response = self._session.delete(url, headers=self.headers)
 
         if response.status_code == 401:
             raise Exception("API Key is Unauthorized")
 
+        self._raise_if_throttled(response)
+
         return response.status_code == 200
@@ -0,0 +1,351 @@
+"""
+Contains an asyncio Service implementing the capabilities of the ClearSKY Vision API
+"""
+
+import asyncio
+from datetime import datetime
+import shutil
+from typing import Optional, Union
+import uuid
+import os
+
+import aiohttp
+from tqdm import tqdm  # for progress bar only
+
+import models
+
+
+class _ConnectionLimit:
+    """
+    Resizable semaphore limiting the requests in flight. Shrinking the limit holds back new requests until enough
+    requests in flight have finished, so the limit is never exceeded.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+    ):
+        self.limit = limit
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def resize(
+        self,
+        limit: int,
+    ):
+        async with self._condition:
+            self.limit = limit
+            self._condition.notify_all()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+
+class AsyncClearSkyVisionAPI:
+    """
+    Asyncio Service class representing the ClearSKY Vision API.
+
+    Mirrors ClearSkyVisionAPI, but every endpoint is a coroutine. A semaphore limits the number of requests in flight
+    to the MaxConcurrentConnections of the API key, so any number of coroutines can share one instance.
+
+    Requests have no total timeout, as composites can take longer to process and download than any fixed limit.
+    CONNECT_TIMEOUT_SECONDS limits establishing connections, and READ_TIMEOUT_SECONDS the time waiting for the next
+    bytes of a response, including the processing time of a composite before its download starts.
+    """
+
+    BASE_URL = "https://api.clearsky.vision"
+    DEFAULT_MAX_CONCURRENT_CONNECTIONS = 10
+    CONNECT_TIMEOUT_SECONDS = 30.0
+    READ_TIMEOUT_SECONDS = 900.0
+
+    def __init__(
+        self,
+        api_key: str,
+        max_concurrent_connections: Optional[int] = None,
+    ):
+        """
+        Initialize the service with an API key.
+
+        max_concurrent_connections: number of requests allowed in flight. If not set, the limit is taken from
+        ApiKeyData.MaxConcurrentConnections the first time get_api_key_info succeeds.
+        """
+        self.api_key = api_key
+        self.headers = {
+            "x-api-key": self.api_key,
+            "Accept": "application/json, application/octet-stream",
+            "Content-Type": "application/json",
+        }
+        self._limit_from_api_key = max_concurrent_connections is None
+        self._max_concurrent_connections = max_concurrent_connections or self.DEFAULT_MAX_CONCURRENT_CONNECTIONS
+        if self._max_concurrent_connections < 1:
+            raise ValueError("max_concurrent_connections must be at least 1")
+
+        # created lazily, as both must be bound to the running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._connection_limit: Optional[_ConnectionLimit] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the pooled connections held by the service.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def max_concurrent_connections(self) -> int:
+        return self._max_concurrent_connections
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.CONNECT_TIMEOUT_SECONDS, sock_read=self.READ_TIMEOUT_SECONDS)
+            self._session = aiohttp.ClientSession(headers=self.headers, timeout=timeout)
+        return self._session
+
+    def _get_connection_limit(self) -> _ConnectionLimit:
+        if self._connection_limit is None:
+            self._connection_limit = _ConnectionLimit(self._max_concurrent_connections)
+        return self._connection_limit
+
+    async def _set_max_concurrent_connections(
+        self,
+        max_concurrent_connections: int,
+    ):
+        """
+        Helper method to change the concurrency limit. When shrinking it, new requests wait until the requests
+        already in flight fit the new limit.
+        """
+        self._max_concurrent_connections = max_concurrent_connections
+        await self._get_connection_limit().resize(max_concurrent_connections)
+
+    async def _get(
+        self,
+        url: str,
+    ):
+        async with self._get_connection_limit():
+            async with self._get_session().get(url) as response:
+                if response.status == 401:
+                    raise Exception("API Key is Unauthorized")
+
+                return response.status, await response.read()
+
+    async def _post(
+        self,
+        url: str,
+        data: str,
+    ):
+        async with self._get_connection_limit():
+            async with self._get_session().post(url, data=data) as response:
+                if response.status == 401:
+                    raise Exception("API Key is Unauthorized")
+
+                return response.status, await response.read()
+
+    async def get_api_key_info(
+        self,
+    ) -> models.ApiKeyInfoQueryResponseDto:
+        """
+        Get API Key Information.
+        """
+        url = f"{self.BASE_URL}/api/apikey/info"
+        _, response_content = await self._get(url)
+
+        api_key_info = models.ApiKeyInfoQueryResponseDto.model_validate_json(response_content)
+
+        if self._limit_from_api_key and api_key_info.Data is not None:
+            if api_key_info.Data.MaxConcurrentConnections != self._max_concurrent_connections:
+                await self._set_max_concurrent_connections(api_key_info.Data.MaxConcurrentConnections)
+
+        return api_key_info
+
+    async def search_available_imagery(
+        self,
+        query: models.SearchAvailableImageryQueryDto,
+    ) -> Union[models.SearchAvailableImageryQueryResponseDto, models.ServiceResultError]:
+        """
+        Search Available Imagery.
+        """
+        url = f"{self.BASE_URL}/api/satelliteimages/search/available"
+        status, response_content = await self._post(url, query.model_dump_json())
+
+        if status != 200:
+            return models.ServiceResultError.model_validate_json(response_content)
+
+        return models.SearchAvailableImageryQueryResponseDto.model_validate_json(response_content)
+
+    async def retrieve_estimate_for_process_composite_of_satellite_imagery(
+        self,
+        query: models.ProcessCompositeEstimateQueryDto,
+    ) -> models.ProcessCompositeEstimateQueryResponseDto:
+        """
+        Get Estimate for Processing Composite Satellite Imagery.
+        """
+        url = f"{self.BASE_URL}/api/satelliteimages/process/composite/estimate"
+        _, response_content = await self._post(url, query.model_dump_json())
+
+        return models.ProcessCompositeEstimateQueryResponseDto.model_validate_json(response_content)
+
+    async def process_composite_of_satellite_imagery(
+        self,
+        directory_to_save_file: str,
+        command: models.ProcessCompositeCommandDto,
+        show_progress=True,
+    ) -> Union[str, models.ServiceResultError]:
+        """
+        Process Composite Satellite Imagery.
+
+        If requests succeeds, it returns the path to the saved file.
+        If it fails, the error response is returned
+
+        The response body is streamed to disk, with file writes running in the default executor so the event loop
+        is never blocked by disk I/O.
+        """
+
+        if not directory_to_save_file.endswith("/"):
+            directory_to_save_file = directory_to_save_file + "/"
+
+        os.makedirs(directory_to_save_file, exist_ok=True)
+
+        url = f"{self.BASE_URL}/api/satelliteimages/process/composite"
+        request_start = datetime.now()
+        async with self._get_connection_limit():
+            async with self._get_session().post(url, data=command.model_dump_json()) as response:
+
+                if response.status == 401:
+                    raise Exception("API Key is Unauthorized")
+
+                if response.status != 200:
+                    return models.ServiceResultError.model_validate_json(await response.read())
+
+                file_path = await self._download_file_with_tdqm_progress(directory_to_save_file, show_progress, request_start, command.FileType, response)
+
+                return file_path
+
+    async def _download_file_with_tdqm_progress(
+        self, directory_to_save_file: str, show_progress: bool, request_start: datetime, file_extension: str, response: aiohttp.ClientResponse
+    ):
+        filename = response.content_disposition.filename if response.content_disposition else None
+        if not filename:
+            filename = f"output-{uuid.uuid4()}.{file_extension}"
+
+        file_path = directory_to_save_file + filename
+        incomplete_file_path = file_path + ".incomplete"
+        request_end: Optional[datetime] = None
+        loop = asyncio.get_running_loop()
+
+        with tqdm(unit="B", unit_scale=True, disable=not show_progress) as progress:
+            chunk_size = 2**20
+            incomplete_file = await loop.run_in_executor(None, open, incomplete_file_path, "wb")
+            try:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    if chunk:
+                        if request_end is None:
+                            request_end = datetime.now()
+                            print("Request complete, time elapsed: " + str((request_end - request_start).seconds) + " seconds, starting download")
+                        await loop.run_in_executor(None, incomplete_file.write, chunk)
+                        progress.update(len(chunk))
+            finally:
+                await loop.run_in_executor(None, incomplete_file.close)
+
+        await loop.run_in_executor(None, shutil.move, incomplete_file_path, file_path)
+        return file_path
+
+    async def get_tasking_models(
+        self,
+    ) -> models.TaskingModelsQueryResponseDto:
+        """
+        Get Models Available for Tasking.
+        """
+        url = f"{self.BASE_URL}/api/tasking/models"
+        _, response_content = await self._get(url)
+
+        return models.TaskingModelsQueryResponseDto.model_validate_json(response_content)
+
+    async def get_tasking_orders(
+        self,
+        recurring_only: bool,
+    ) -> models.TaskingOrdersQueryResponseDto:
+        """
+        Get Tasking Orders.
+
+        recurring_only: only retrieve recurring taskorders
+        """
+        url = f"{self.BASE_URL}/api/tasking/orders?recurringOnly={recurring_only}"
+        _, response_content = await self._get(url)
+
+        return models.TaskingOrdersQueryResponseDto.model_validate_json(response_content)
+
+    async def search_orderable_tiles(
+        self,
+        query: models.TaskingTileSearchQueryDto,
+    ) -> models.TaskingTileSearchQueryResponseDto:
+        """
+        Search tiles available for Tasking Orders.
+        """
+        url = f"{self.BASE_URL}/api/tasking/search/tiles"
+        _, response_content = await self._post(url, query.model_dump_json())
+
+        return models.TaskingTileSearchQueryResponseDto.model_validate_json(response_content)
+
+    async def retrieve_estimate_for_tasking_order(
+        self,
+        query: models.CreateTaskingOrderEstimateQueryAndCreateCommandDto,
+    ) -> Union[models.TaskingOrderEstimateQueryResponseDto, models.ServiceResultError]:
+        """
+        Get Estimate for Tasking Order.
+        """
+        url = f"{self.BASE_URL}/api/tasking/orders/estimate"
+        status, response_content = await self._post(url, query.model_dump_json())
+
+        if status != 200:
+            return models.ServiceResultError.model_validate_json(response_content)
+
+        return models.TaskingOrderEstimateQueryResponseDto.model_validate_json(response_content)
+
+    async def create_tasking_order(
+        self,
+        command: models.CreateTaskingOrderEstimateQueryAndCreateCommandDto,
+    ) -> Union[models.TaskingOrderCreateCommandResponseDto, models.ServiceResultError]:
+        """
+        Create Tasking Order.
+
+        !!IMPORTANT!!
+        Evaluate the estimate for a tasking order before creating a tasking order.
+        """
+        url = f"{self.BASE_URL}/api/tasking/orders"
+        status, response_content = await self._post(url, command.model_dump_json())
+
+        if status != 200:
+            return models.ServiceResultError.model_validate_json(response_content)
+
+        return models.TaskingOrderCreateCommandResponseDto.model_validate_json(response_content)
+
+    async def cancel_recurring_order(
+        self,
+        taskorder_guid: str,
+    ) -> bool:
+        """
+        Cancel Recurring Tasking Order, ensuring the recurring order does not persist next month.
+
+        taskorder_guid: Guid identifying the Tasking Order
+        """
+        url = f"{self.BASE_URL}/api/tasking/orders/cancel?taskOrderGuid={taskorder_guid}"
+        async with self._get_connection_limit():
+            async with self._get_session().delete(url) as response:
+                if response.status == 401:
+                    raise Exception("API Key is Unauthorized")
+
+                return response.status == 200
@@ -0,0 +1,81 @@
+"""
+Crash-safe runner of large batches of composite commands.
+
+Reads a JSONL manifest with a ProcessCompositeCommandDto per line and downloads the composites with bounded
+concurrency, recording the state and output path of every job in an SQLite journal. Running the same manifest again
+after a crash or interruption only runs the jobs not completed yet, and continues partial downloads.
+
+Run with: python batch_runner.py commands.jsonl --output-directory ./files/ --api-key <api key>
+"""
+
+import argparse
+import os
+import sys
+from typing import Iterator
+
+import models
+from api_service import ClearSkyVisionAPI
+from tools.batch_journal import JOB_COMPLETED, BatchJournal, run_journaled_batch
+
+
+def read_manifest(manifest_path: str) -> Iterator[models.ProcessCompositeCommandDto]:
+    """
+    Yields the commands of a JSONL manifest, skipping empty lines.
+    """
+    with open(manifest_path, "r") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield models.ProcessCompositeCommandDto.model_validate_json(line)
+            except ValueError as e:
+                raise ValueError(f"invalid command on line {line_number} of {manifest_path}: {e}") from e
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the composites of a JSONL manifest of ProcessCompositeCommandDto, resuming incomplete jobs on restart.")
+    parser.add_argument("manifest", help="JSONL file with a ProcessCompositeCommandDto per line")
+    parser.add_argument("--output-directory", default="./files/", help="directory the composites are saved in")
+    parser.add_argument("--journal", help="SQLite journal of the job states, defaults to <manifest>.journal.sqlite")
+    parser.add_argument("--api-key", default=os.environ.get("CLEARSKY_API_KEY"), help="API key, defaults to the CLEARSKY_API_KEY environment variable")
+    parser.add_argument("--base-url", default=ClearSkyVisionAPI.BASE_URL, help="base URL of the API, e.g. of tools/mock_server.py")
+    parser.add_argument("--max-concurrency", type=int, help="concurrent composite requests, defaults to MaxConcurrentConnections of the API key")
+    parser.add_argument("--max-attempts", type=int, default=3, help="attempts of a job, over all runs, before it is no longer retried")
+    parser.add_argument("--resume-attempts", type=int, default=2, help="times an interrupted download is resumed within one attempt")
+    arguments = parser.parse_args()
+
+    if not arguments.api_key:
+        parser.error("an API key is required, set --api-key or CLEARSKY_API_KEY")
+
+    journal = BatchJournal(arguments.journal or f"{arguments.manifest}.journal.sqlite")
+    added_jobs = journal.add_commands(read_manifest(arguments.manifest))
+    print(f"Added {added_jobs} new jobs to the journal {journal.database_path}, jobs per state: {journal.state_counts()}")
+
+    with ClearSkyVisionAPI(arguments.api_key, max_concurrent_connections=arguments.max_concurrency) as api_service:
+        api_service.BASE_URL = arguments.base_url
+        if arguments.max_concurrency is None:
+            apikey_info = api_service.get_api_key_info()
+            if apikey_info.Data is None:
+                raise Exception(f"failed to retrieve the API key info: {apikey_info.Error.Message if apikey_info.Error else 'no data'}")
+
+        def report_job(job_key: str, outcome):
+            status = "completed" if outcome.succeeded and isinstance(outcome.result, str) else "failed"
+            print(f"{status} job {job_key[:12]} in {outcome.elapsed_seconds:.1f}s")
+
+        state_counts = run_journaled_batch(
+            api_service,
+            journal,
+            arguments.output_directory,
+            max_concurrency=arguments.max_concurrency,
+            max_attempts=arguments.max_attempts,
+            resume_attempts=arguments.resume_attempts,
+            on_job_finished=report_job,
+        )
+
+    print(f"Jobs per state: {state_counts}")
+    if any(state != JOB_COMPLETED for state in state_counts):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
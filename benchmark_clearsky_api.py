@@ -0,0 +1,323 @@
+"""
+Benchmarks of the ClearSKY Vision API service against the local stand-in server in tools/mock_server.py.
+
+No API key or credits are used. Run with: python benchmark_clearsky_api.py
+
+Reported figures are requests/sec, download MB/s and latency percentiles, compare them between revisions
+to catch performance regressions.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+import models
+import tools
+from api_service import ClearSkyVisionAPI
+from example_clearsky_api import process_composite_images, process_estimates
+from tools.mock_server import MOCK_API_KEY, MockClearSkyServer
+
+TEST_WKT = "POLYGON ((8.476348 56.176533, 8.482252 56.177059, 8.482059 56.17622, 8.481702 56.174142, 8.480291 56.174038, 8.476348 56.176533))"
+
+
+def _estimate_dtos(count: int) -> List[models.ProcessCompositeEstimateQueryDto]:
+    # shift the geometry slightly so every request is distinct
+    return [
+        models.ProcessCompositeEstimateQueryDto(Wkt=TEST_WKT.replace("8.476348", f"{8.476348 + index * 1e-6:.6f}"), EpsgProjection=32632, Bandnames="all") for index in range(count)
+    ]
+
+
+def _composite_dtos(count: int) -> List[models.ProcessCompositeCommandDto]:
+    return [
+        models.ProcessCompositeCommandDto(
+            Wkt=estimate_dto.Wkt,
+            EpsgProjection=estimate_dto.EpsgProjection,
+            Date=date(2024, 11, 1),
+            PixelSelectionMode="intersect",
+            SatelliteConstellations=[models.SatelliteConstellation.Sentinel2.value],
+            Model=models.Model.Stratus2.value,
+            UtmGridForcePixelResolutionSize=False,
+        )
+        for estimate_dto in _estimate_dtos(count)
+    ]
+
+
+def _print_latencies(title: str, metrics: tools.InMemoryMetricsExporter, endpoint: str, request_count: int, elapsed: float):
+    percentiles = ", ".join(f"p{percentile}={1000 * (metrics.latency_percentile(endpoint, percentile) or 0):.1f}ms" for percentile in (50, 95, 99))
+    print(f"{title}: {request_count / elapsed:.1f} requests/sec, {percentiles}")
+
+
+def benchmark_json_requests(request_count: int = 500, latency_seconds: float = 0.02, max_concurrent_connections: int = 10):
+    """
+    Measures requests/sec and tail latency of estimate requests sent concurrently through one service.
+    """
+    with MockClearSkyServer(latency_seconds=latency_seconds, max_concurrent_connections=max_concurrent_connections) as mock_server:
+        metrics = tools.InMemoryMetricsExporter()
+        with ClearSkyVisionAPI(MOCK_API_KEY, metrics_exporters=[metrics]) as api_service:
+            api_service.BASE_URL = mock_server.url
+            api_service.get_api_key_info()
+            dtos = _estimate_dtos(request_count)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=api_service.max_concurrent_connections) as executor:
+                list(executor.map(api_service.retrieve_estimate_for_process_composite_of_satellite_imagery, dtos))
+            elapsed = time.perf_counter() - start
+
+        _print_latencies(
+            f"\nEstimate requests ({latency_seconds * 1000:.0f} ms server latency)", metrics, "/api/satelliteimages/process/composite/estimate", request_count, elapsed
+        )
+        print(f"server: max in flight {mock_server.max_in_flight} of {max_concurrent_connections}, status codes {mock_server.status_counts}")
+
+
+def benchmark_example_fan_out(job_count: int = 40, composite_size_bytes: int = 4 * 2**20, bandwidth_bytes_per_second: float = 32 * 2**20):
+    """
+    Measures the process_estimates and process_composite_images fan-out of example_clearsky_api.py.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        with MockClearSkyServer(
+            latency_seconds=0.02, composite_latency_seconds=0.1, composite_size_bytes=composite_size_bytes, bandwidth_bytes_per_second=bandwidth_bytes_per_second
+        ) as mock_server:
+            metrics = tools.InMemoryMetricsExporter()
+            with ClearSkyVisionAPI(MOCK_API_KEY, metrics_exporters=[metrics]) as api_service:
+                api_service.BASE_URL = mock_server.url
+                apikey_info = api_service.get_api_key_info()
+                assert apikey_info.Data is not None
+                concurrent_requests = apikey_info.Data.MaxConcurrentConnections
+
+                start = time.perf_counter()
+                process_estimates(api_service, concurrent_requests, _estimate_dtos(job_count))
+                elapsed = time.perf_counter() - start
+                _print_latencies("\nExample process_estimates fan-out", metrics, "/api/satelliteimages/process/composite/estimate", job_count, elapsed)
+
+                start = time.perf_counter()
+                process_composite_images(api_service, concurrent_requests, _composite_dtos(job_count), directory)
+                elapsed = time.perf_counter() - start
+                _print_latencies("Example process_composite_images fan-out", metrics, "/api/satelliteimages/process/composite", job_count, elapsed)
+                print(f"download: {job_count * composite_size_bytes / 2**20 / elapsed:.1f} MB/s aggregate over {concurrent_requests} connections")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_composite_pipeline(job_count: int = 40, composite_size_bytes: int = 2**20, bandwidth_bytes_per_second: float = 8 * 2**20):
+    """
+    Compares estimating all commands before downloading any composite with tools.run_composite_pipeline, where every
+    composite is requested as soon as its own estimate returns.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        with MockClearSkyServer(latency_seconds=0.05, composite_size_bytes=composite_size_bytes, bandwidth_bytes_per_second=bandwidth_bytes_per_second) as mock_server:
+            with ClearSkyVisionAPI(MOCK_API_KEY) as api_service:
+                api_service.BASE_URL = mock_server.url
+                concurrent_requests = api_service.max_concurrent_connections
+                commands = _composite_dtos(job_count)
+
+                print(f"\nEstimate and download of {job_count} composites over {concurrent_requests} connections")
+                start = time.perf_counter()
+                process_estimates(api_service, concurrent_requests, commands)
+                process_composite_images(api_service, concurrent_requests, commands, directory)
+                print(f"estimates, then composites: {time.perf_counter() - start:.2f} seconds")
+
+                start = time.perf_counter()
+                jobs = tools.run_composite_pipeline(api_service, directory, commands, max_concurrency=concurrent_requests)
+                assert all(job.file_path is not None for job in jobs)
+                print(f"pipelined: {time.perf_counter() - start:.2f} seconds")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_shared_connection_limit(worker_count: int = 3, jobs_per_worker: int = 40, max_concurrent_connections: int = 4):
+    """
+    Compares workers on one API key each using the full MaxConcurrentConnections with workers sharing a
+    FileLockConnectionLimiter or an HttpConnectionLimiter served by the stand-in server.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        with MockClearSkyServer(latency_seconds=0.02, max_concurrent_connections=max_concurrent_connections) as mock_server:
+            limiters = {
+                "no shared limit": lambda: None,
+                "file lock limiter": lambda: tools.FileLockConnectionLimiter(directory, max_concurrent_connections),
+                "http limiter": lambda: tools.HttpConnectionLimiter(mock_server.url, MOCK_API_KEY, max_concurrent_connections),
+            }
+
+            print(f"\n{worker_count} workers on one API key with {max_concurrent_connections} concurrent connections, {jobs_per_worker} estimates each")
+            for title, make_limiter in limiters.items():
+                mock_server.status_counts.clear()
+                mock_server.max_in_flight = 0
+
+                def run_worker(worker_index: int):
+                    with ClearSkyVisionAPI(MOCK_API_KEY, max_concurrent_connections=max_concurrent_connections, connection_limiter=make_limiter()) as api_service:
+                        api_service.BASE_URL = mock_server.url
+                        dtos = _estimate_dtos(jobs_per_worker)
+                        jobs = [tools.BatchJob(api_service.retrieve_estimate_for_process_composite_of_satellite_imagery, args=(dto,)) for dto in dtos]
+                        return sum(outcome.succeeded for outcome in api_service.execute_batch(jobs))
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=worker_count) as executor:
+                    succeeded = sum(executor.map(run_worker, range(worker_count)))
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{title}: {succeeded} of {worker_count * jobs_per_worker} succeeded in {elapsed:.2f}s, max in flight {mock_server.max_in_flight}, "
+                    f"429 responses {mock_server.status_counts.get(429, 0)}"
+                )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_api_key_pool(key_counts=(1, 3), job_count: int = 36, max_concurrent_connections: int = 3, bandwidth_bytes_per_second: float = 4 * 2**20):
+    """
+    Measures composite throughput of tools.ApiKeyPool with one and several API keys, every key served by its own
+    stand-in server limited to max_concurrent_connections.
+    """
+    directory = tempfile.mkdtemp()
+    print(f"\nEstimate and download of {job_count} composites over API keys with {max_concurrent_connections} concurrent connections each")
+    try:
+        for key_count in key_counts:
+            mock_servers = [
+                MockClearSkyServer(
+                    latency_seconds=0.02,
+                    api_key=f"mock-api-key-{index}",
+                    max_concurrent_connections=max_concurrent_connections,
+                    bandwidth_bytes_per_second=bandwidth_bytes_per_second,
+                ).start()
+                for index in range(key_count)
+            ]
+            api_services = [ClearSkyVisionAPI(mock_server.api_key) for mock_server in mock_servers]
+            for api_service, mock_server in zip(api_services, mock_servers):
+                api_service.BASE_URL = mock_server.url
+
+            try:
+                pool = tools.ApiKeyPool(api_services)
+                start = time.perf_counter()
+                jobs = pool.process_composites(directory, _composite_dtos(job_count))
+                elapsed = time.perf_counter() - start
+                assert all(job.file_path is not None for job in jobs)
+                print(f"{key_count} keys: {job_count / elapsed:.1f} composites/sec, jobs per key {[key.completed_jobs for key in pool.keys]}")
+            finally:
+                for api_service, mock_server in zip(api_services, mock_servers):
+                    api_service.close()
+                    mock_server.stop()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_segmented_download(segment_counts=(1, 2, 4, 8), composite_size_bytes: int = 64 * 2**20, bandwidth_bytes_per_second: float = 16 * 2**20):
+    """
+    Compares the throughput of a single stream download with segmented downloads of the same composite,
+    on a server throttled per connection to simulate a single high-latency TCP stream.
+    """
+    directory = tempfile.mkdtemp()
+    command = _composite_dtos(1)[0]
+
+    try:
+        with MockClearSkyServer(
+            composite_size_bytes=composite_size_bytes, bandwidth_bytes_per_second=bandwidth_bytes_per_second, max_concurrent_connections=max(segment_counts)
+        ) as mock_server:
+            with ClearSkyVisionAPI(MOCK_API_KEY, max_concurrent_connections=max(segment_counts)) as api_service:
+                api_service.BASE_URL = mock_server.url
+
+                print(f"\nSegmented download of a {composite_size_bytes / 2**20:.0f} MB composite, {bandwidth_bytes_per_second / 2**20:.0f} MB/s per connection")
+                for segment_count in segment_counts:
+                    start = time.perf_counter()
+                    file_path = api_service.process_composite_of_satellite_imagery(directory, command, show_progress=False, segments=segment_count, allow_segment_requests=True)
+                    elapsed = time.perf_counter() - start
+
+                    assert isinstance(file_path, str)
+                    with open(file_path, "rb") as file:
+                        assert file.read() == mock_server.composite, "downloaded composite differs from the served composite"
+                    os.remove(file_path)
+
+                    print(f"segments={segment_count}: {elapsed:.2f} seconds, {composite_size_bytes / 2**20 / elapsed:.1f} MB/s")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_response_decoding(item_count: int = 20000, repeats: int = 3):
+    """
+    Compares decoding large tasking responses with json.loads followed by validation of the decoded objects, with a new
+    TypeAdapter for Data per response, against model_validate_json on the raw response bytes.
+    """
+    task_order = {
+        "TaskOrderGuid": "00000000-0000-0000-0000-000000000000",
+        "BillingCycle": "Monthly",
+        "OrderingProcessStatus": "Active",
+        "StorageMonths": 12,
+        "ApiRequests": 100,
+        "ImageFrequency": 1,
+        "TaskOrderAreaKm2": 1.5,
+        "Model": models.Model.Stratus2.value,
+        "ReferenceDate": "2024-11-01",
+        "From": "2024-11-01",
+        "To": None,
+        "SatelliteConstellations": [models.SatelliteConstellation.Sentinel2.value],
+        "Tiles": ["32VNH"],
+        "Wkt": TEST_WKT,
+    }
+    tile = {"Guid": "00000000-0000-0000-0000-000000000000", "Epsg": "32632", "DataGeogWkt": TEST_WKT}
+    payloads = (
+        (models.TaskingOrdersQueryResponseDto, models.TaskingOrdersData, {"TaskOrders": [task_order] * item_count}),
+        (models.TaskingTileSearchQueryResponseDto, models.TaskingTileSearchQueryResponseData, {"Tiles": [tile] * item_count}),
+    )
+
+    print(f"\nDecoding responses with {item_count} items, best of {repeats}")
+    for response_dto, data_type, data in payloads:
+        response_content = json.dumps({"Succeeded": True, "Error": None, "Data": data}).encode("utf-8")
+
+        def decode_legacy():
+            response_json = json.loads(response_content)
+            response_json["Data"] = TypeAdapter(data_type).validate_python(response_json["Data"])
+            return response_dto.model_validate(response_json)
+
+        def decode_raw():
+            return response_dto.model_validate_json(response_content)
+
+        timings = []
+        for decode in (decode_legacy, decode_raw):
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                decode()
+                best = min(best, time.perf_counter() - start)
+            timings.append(best)
+
+        print(f"{response_dto.__name__}: json.loads + validation {timings[0]:.3f}s, model_validate_json {timings[1]:.3f}s ({timings[0] / timings[1]:.1f}x)")
+
+
+def benchmark_geojson_loading(polygon_count: int = 200, vertices_per_ring: int = 500, repeats: int = 3):
+    """
+    Compares loading a large MultiPolygon GeoJSON dictionary and converting it to WKT with GeoJsonModel and
+    with the array-backed CompactGeoJsonModel.
+    """
+    polygons = []
+    for index in range(polygon_count):
+        ring = [[index + 0.4 * math.cos(2 * math.pi * vertex / vertices_per_ring), 0.4 * math.sin(2 * math.pi * vertex / vertices_per_ring)] for vertex in range(vertices_per_ring)]
+        polygons.append([ring + [ring[0]]])
+    geojson_data = {"type": "MultiPolygon", "coordinates": polygons}
+
+    print(f"\nLoading a MultiPolygon with {polygon_count * (vertices_per_ring + 1)} vertices and converting it to WKT, best of {repeats}")
+    for geojson_model in (models.GeoJsonModel, models.CompactGeoJsonModel):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            geojson_model.from_geojson(geojson_data).to_wkt()
+            best = min(best, time.perf_counter() - start)
+        print(f"{geojson_model.__name__}: {best:.3f}s")
+
+
+if __name__ == "__main__":
+    benchmark_json_requests()
+    benchmark_example_fan_out()
+    benchmark_composite_pipeline()
+    benchmark_shared_connection_limit()
+    benchmark_api_key_pool()
+    benchmark_segmented_download()
+    benchmark_response_decoding()
+    benchmark_geojson_loading()
@@ -1,5 +1,5 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import date, datetime
+from datetime import date
 import json
 from typing import Any, Dict, List
 import os
@@ -225,24 +225,13 @@ def main():
         search_imagery_available_result.raise_issues()
 
     assert isinstance(search_imagery_available_result.Data, models.SearchAvailableImageryData)
+
+    # dates with imagery for every geography in the search, per model
+    availability_index = tools.AvailabilityIndex.from_search_result(search_imagery_available_result.Data)
     available_imagery_dates = []
 
     for model in search_imagery_available_result.Data.ModelImageDates:
-        dates_available = []
-        if len(model.DatesByGeog) > 1:
-            # we determine which dates are common between all elements in DatesByGeog, and allow use of those
-            dates_by_geog = []
-            for geog in model.DatesByGeog:
-                dates_by_geog.append([datetime.strptime(datestr, "%Y-%m-%d").date() for datestr in geog.Dates])
-
-            all_dates = set(geog_date for dates in dates_by_geog for geog_date in dates)
-            for image_date in all_dates:
-                geogs_with_date = sum(1 for dates in dates_by_geog if image_date in dates)
-                if geogs_with_date == len(model.DatesByGeog):
-                    dates_available.append(image_date)
-        else:
-            for geog in model.DatesByGeog:
-                available_imagery_dates.extend([datetime.strptime(datestr, "%Y-%m-%d").date() for datestr in geog.Dates])
+        available_imagery_dates.extend(availability_index.filter(model=model.Model).dates_in_all())
 
     print(f"\nFound {len(available_imagery_dates)} available imagery dates for composite processing")
 
@@ -278,22 +267,20 @@ def main():
                 )
                 composite_dtos.append(dto)
 
-        process_composite_results = process_composite_images(api_service, concurrent_requests, composite_dtos)
-
-        for index, composite_result in process_composite_results.items():
+        # every composite is requested as soon as its own estimate returns and fits within the credits of the api key
+        credit_budget = apikey_info.Data.CreditAmount + apikey_info.Data.CreditLimit
+        pipeline_jobs = tools.run_composite_pipeline(api_service, "./files/", composite_dtos, credit_budget=credit_budget, max_concurrency=concurrent_requests)
 
-            composite_succeeded = isinstance(composite_result[1], str) or composite_result[1].Succeeded
+        for job in pipeline_jobs:
 
-            if not composite_succeeded:
-                print(f"process composite job {index} failed: " + str(composite_result[1].Error.Message))
+            if job.file_path is None:
+                print(f"process composite job {job.index} {job.stage}: {job.error}")
                 continue
 
-            file_path = composite_result[1]
-
-            if not os.path.isfile(file_path):
+            if not os.path.isfile(job.file_path):
                 raise Exception("???")
 
-            print("check file " + file_path)
+            print("check file " + job.file_path)
 
 
 def process_composite_images(api_service: ClearSkyVisionAPI, concurrent_requests: int, dtos: List[models.ProcessCompositeCommandDto], composite_results_directory="./files/"):
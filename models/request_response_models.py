@@ -2,13 +2,16 @@
 Collection of Request and Response models used by the ClearSKY Vision API
 """
 
-from typing import Dict, Generic, List, Optional, TypeVar, Union
+from typing import Any, Dict, Generic, List, Optional, TypeVar, Union, get_args
 import uuid
-from pydantic import BaseModel, TypeAdapter, field_validator, model_validator
+from pydantic import BaseModel, PrivateAttr, TypeAdapter, model_serializer, model_validator
 from datetime import date
 
 T = TypeVar("T")
 
+# TypeAdapters of Data per response class, None where the Data type is already compiled into the class validator
+_data_type_adapters: Dict[type, Optional[TypeAdapter]] = {}
+
 
 class ErrorModel(BaseModel):
     Message: str
@@ -20,20 +23,38 @@ class ServiceResult(BaseModel, Generic[T]):
     Error: Optional["ErrorModel"]
     Data: Optional[T]
 
-    @field_validator("Data", mode="before")
+    @model_validator(mode="after")
+    def validate_data(self):
+        # an after validator leaves the compiled schema free to decode JSON in a single pass, unlike a before validator on Data
+        type_adapter = type(self)._get_data_type_adapter()
+        if type_adapter is not None and self.Data is not None:
+            self.Data = type_adapter.validate_python(self.Data)
+
+        return self
+
     @classmethod
-    def validate_data(cls, value, info):
+    def _get_data_type_adapter(cls) -> Optional[TypeAdapter]:
+        """
+        Returns the TypeAdapter validating Data, built once per response class.
+
+        Parametrized classes such as ServiceResult[ApiKeyData] already validate Data as part of their compiled schema,
+        which also lets model_validate_json decode raw JSON bytes in a single pass, so no adapter is needed.
+        """
+        if cls in _data_type_adapters:
+            return _data_type_adapters[cls]
+
         generic_type = getattr(cls, "__generic_type__", None)
         if generic_type is None and hasattr(cls, "__parameters__"):
             parameters = cls.__parameters__  # type: ignore
             if parameters and len(parameters) == 1:
                 generic_type = parameters[0]
 
-        if generic_type and value is not None:
-            type_adapter = TypeAdapter(generic_type)
-            return type_adapter.validate_python(value)
+        data_annotation: Any = cls.model_fields["Data"].annotation
+        data_type_is_generic = any(isinstance(argument, TypeVar) for argument in get_args(data_annotation))
 
-        return value
+        type_adapter = TypeAdapter(generic_type) if generic_type is not None and data_type_is_generic else None
+        _data_type_adapters[cls] = type_adapter
+        return type_adapter
 
 
 class ServiceResultError(BaseModel):
@@ -72,6 +93,224 @@ class GeoJsonModel(BaseModel):
         shapely_geometry = shape(self.to_geojson())
         return shapely_geometry.wkt
 
+    @model_serializer(mode="wrap")
+    def serialize_geojson(self, handler):
+        # runs for subclasses too where a field is annotated as GeoJsonModel, so CompactGeoJsonModel serializes its coordinates
+        data = handler(self)
+        coordinates = self._get_coordinates_to_serialize()
+        if coordinates is not None:
+            data["coordinates"] = coordinates
+
+        return data
+
+    def _get_coordinates_to_serialize(self) -> Optional[list]:
+        return None
+
+
+class CompactGeoJsonModel(GeoJsonModel):
+    """
+    GeoJsonModel keeping the coordinates of Polygons and MultiPolygons in NumPy arrays instead of nested float lists.
+
+    All vertices are stored in one (N, 2) array, with ring offsets into the vertices and polygon offsets into the rings,
+    the layout of shapely.to_ragged_array. It is accepted anywhere a GeoJsonModel is, e.g. the GeoJson field of the query
+    DTOs, and is much faster to load and convert to WKT for geometries with many vertices.
+    """
+
+    _coordinate_array: Any = PrivateAttr(default=None)
+    _offsets: Any = PrivateAttr(default=None)
+
+    @staticmethod
+    def from_geojson(geojson_data: dict) -> "CompactGeoJsonModel":
+        """
+        Creates the model from a Polygon, MultiPolygon or GeometryCollection GeoJSON dictionary.
+        """
+        import numpy as np
+
+        geometry_type = geojson_data["type"]
+        if geometry_type == "GeometryCollection":
+            return CompactGeoJsonModel(type=geometry_type, geometries=[CompactGeoJsonModel.from_geojson(geometry) for geometry in geojson_data["geometries"]])
+        if geometry_type not in ("Polygon", "MultiPolygon"):
+            raise ValueError(f"Unsupported GeoJSON type {geometry_type}, only Polygon, MultiPolygon and GeometryCollection are supported")
+
+        polygons = [geojson_data["coordinates"]] if geometry_type == "Polygon" else geojson_data["coordinates"]
+        rings = [np.asarray(ring, dtype=np.float64).reshape(len(ring), -1)[:, :2] for polygon in polygons for ring in polygon]
+
+        ring_offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+        np.cumsum([len(ring) for ring in rings], out=ring_offsets[1:])
+        polygon_offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+        np.cumsum([len(polygon) for polygon in polygons], out=polygon_offsets[1:])
+
+        offsets = (ring_offsets, polygon_offsets)
+        if geometry_type == "MultiPolygon":
+            offsets += (np.array([0, len(polygons)], dtype=np.int64),)
+
+        coordinate_array = np.concatenate(rings) if rings else np.empty((0, 2), dtype=np.float64)
+        return CompactGeoJsonModel._from_arrays(geometry_type, coordinate_array, offsets)
+
+    @staticmethod
+    def from_geojson_text(geojson_text: Union[str, bytes]) -> "CompactGeoJsonModel":
+        """
+        Creates the model from GeoJSON text, parsed by GEOS without building Python lists.
+        """
+        import shapely
+
+        return CompactGeoJsonModel.from_shapely(shapely.from_geojson(geojson_text))
+
+    @staticmethod
+    def from_wkt(wkt: str) -> "CompactGeoJsonModel":
+        import shapely
+
+        return CompactGeoJsonModel.from_shapely(shapely.from_wkt(wkt))
+
+    @staticmethod
+    def from_shapely(geometry) -> "CompactGeoJsonModel":
+        """
+        Creates the model from a shapely Polygon, MultiPolygon or GeometryCollection.
+        """
+        import shapely
+
+        if geometry.geom_type == "GeometryCollection":
+            return CompactGeoJsonModel(type=geometry.geom_type, geometries=[CompactGeoJsonModel.from_shapely(part) for part in geometry.geoms])
+        if geometry.geom_type not in ("Polygon", "MultiPolygon"):
+            raise ValueError(f"Unsupported geometry type {geometry.geom_type}, only Polygon, MultiPolygon and GeometryCollection are supported")
+
+        _, coordinate_array, offsets = shapely.to_ragged_array([geometry])
+        return CompactGeoJsonModel._from_arrays(geometry.geom_type, coordinate_array, offsets)
+
+    @staticmethod
+    def _from_arrays(
+        geometry_type: str,
+        coordinate_array,
+        offsets: tuple,
+    ) -> "CompactGeoJsonModel":
+        model = CompactGeoJsonModel(type=geometry_type)
+        model._coordinate_array = coordinate_array
+        model._offsets = offsets
+        return model
+
+    @property
+    def coordinate_array(self):
+        """
+        (N, 2) array of all vertices, None for a GeometryCollection.
+        """
+        return self._coordinate_array
+
+    @property
+    def ring_offsets(self):
+        """
+        Start of every ring in coordinate_array, followed by the total number of vertices.
+        """
+        return None if self._offsets is None else self._offsets[0]
+
+    def to_shapely(self):
+        """
+        Builds the shapely geometry with the vectorized shapely.from_ragged_array constructor.
+        """
+        import shapely
+
+        if self.type == "GeometryCollection":
+            return shapely.geometrycollections([geometry.to_shapely() for geometry in self.geometries or []])
+
+        geometry_type = shapely.GeometryType.POLYGON if self.type == "Polygon" else shapely.GeometryType.MULTIPOLYGON
+        return shapely.from_ragged_array(geometry_type, self._coordinate_array, self._offsets)[0]
+
+    def to_wkt(self) -> str:
+        return self.to_shapely().wkt
+
+    def to_geojson_text(
+        self,
+        indent: Optional[int] = None,
+    ) -> str:
+        """
+        Serializes the model to GeoJSON text with GEOS, without building Python lists.
+        """
+        import shapely
+
+        return shapely.to_geojson(self.to_shapely(), indent=indent)
+
+    def model_dump_json(
+        self,
+        *,
+        indent: Optional[int] = None,
+        include=None,
+        exclude=None,
+        **kwargs,
+    ) -> str:
+        """
+        Serializes the model with to_geojson_text, which leaves out None members and has no aliases, so by_alias,
+        exclude_none, exclude_unset, exclude_defaults, round_trip and warnings do not change the output.
+        include, exclude and other options fall back to the pydantic serializer.
+        """
+        if include is not None or exclude is not None or any(value for name, value in kwargs.items() if name not in _GEOJSON_TEXT_OPTIONS):
+            return super().model_dump_json(indent=indent, include=include, exclude=exclude, **kwargs)
+        return self.to_geojson_text(indent=indent)
+
+    def _get_coordinates_to_serialize(self) -> Optional[list]:
+        # only reached by model_dump and dumps with arguments, the query DTOs splice in to_geojson_text instead
+        if self._coordinate_array is None:
+            return None
+
+        ring_offsets, polygon_offsets = self._offsets[0], self._offsets[1]
+        rings = [self._coordinate_array[start:end].tolist() for start, end in zip(ring_offsets[:-1], ring_offsets[1:])]
+        polygons = [rings[start:end] for start, end in zip(polygon_offsets[:-1], polygon_offsets[1:])]
+        return polygons[0] if self.type == "Polygon" else polygons
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactGeoJsonModel):
+            return False
+        if self._coordinate_array is None or other._coordinate_array is None:
+            return self.type == other.type and self._coordinate_array is other._coordinate_array and self.geometries == other.geometries
+
+        import numpy as np
+
+        return (
+            self.type == other.type
+            and np.array_equal(self._coordinate_array, other._coordinate_array)
+            and all(np.array_equal(offsets, other_offsets) for offsets, other_offsets in zip(self._offsets, other._offsets))
+        )
+
+
+class _GeoJsonQueryModel(BaseModel):
+    """
+    Base of the query DTOs with a GeoJson field. A CompactGeoJsonModel GeoJson is serialized by GEOS with
+    to_geojson_text and spliced into the JSON, so its vertices never become Python floats.
+
+    include and exclude are merged with the GeoJson field. With indent, or when only parts of GeoJson are selected,
+    the pydantic serializer is used instead.
+    """
+
+    def model_dump_json(
+        self,
+        *,
+        indent: Optional[int] = None,
+        include=None,
+        exclude=None,
+        **kwargs,
+    ) -> str:
+        geojson = getattr(self, "GeoJson", None)
+        include_fields = None if include is None else _field_selection(include)
+        exclude_fields = {} if exclude is None else _field_selection(exclude)
+        whole_geojson_selected = (include_fields is None or include_fields.get("GeoJson") is True) and "GeoJson" not in exclude_fields
+        if not isinstance(geojson, CompactGeoJsonModel) or indent is not None or not whole_geojson_selected:
+            return super().model_dump_json(indent=indent, include=include, exclude=exclude, **kwargs)
+
+        if include_fields is not None:
+            include_fields = {name: selection for name, selection in include_fields.items() if name != "GeoJson"}
+        json_text = super().model_dump_json(include=include_fields, exclude={**exclude_fields, "GeoJson": True}, **kwargs)
+        separator = "," if json_text != "{}" else ""
+        return f'{json_text[:-1]}{separator}"GeoJson":{geojson.to_geojson_text()}}}'
+
+
+# options of model_dump_json which do not change the GeoJSON text written by GEOS
+_GEOJSON_TEXT_OPTIONS = ("by_alias", "exclude_none", "exclude_unset", "exclude_defaults", "round_trip", "warnings")
+
+
+def _field_selection(selection) -> dict:
+    """
+    Returns an include or exclude argument of model_dump_json as a dictionary of field names.
+    """
+    return dict(selection) if isinstance(selection, dict) else dict.fromkeys(selection, True)
+
 
 # -----------------------------------
 # Get API Key Info Models
@@ -102,7 +341,7 @@ class ApiKeyInfoQueryResponseDto(ServiceResult[ApiKeyData]):
 # --------------------------------------------------
 
 
-class SearchAvailableImageryQueryDto(BaseModel):
+class SearchAvailableImageryQueryDto(_GeoJsonQueryModel):
     Wkt: Optional[str] = None
     GeoJson: Optional[GeoJsonModel] = None
     From: Optional[date] = None
@@ -147,7 +386,7 @@ class SearchAvailableImageryQueryResponseDto(ServiceResult[SearchAvailableImager
 # ----------------------------------------------------
 
 
-class ProcessCompositeEstimateQueryDto(BaseModel):
+class ProcessCompositeEstimateQueryDto(_GeoJsonQueryModel):
     Wkt: Optional[str] = None
     GeoJson: Optional[GeoJsonModel] = None
     Resolution: int = 10  # pixel resolution in meters, check api documentation for available options
@@ -269,7 +508,7 @@ class TaskingOrdersQueryResponseDto(ServiceResult[TaskingOrdersData]):
 # -------------------------------------------------
 
 
-class CreateTaskingOrderEstimateQueryAndCreateCommandDto(BaseModel):
+class CreateTaskingOrderEstimateQueryAndCreateCommandDto(_GeoJsonQueryModel):
     StorageMonths: int
     ApiRequests: int
     ImageFrequency: int
@@ -334,7 +573,7 @@ class TaskingOrderCreateCommandResponseDto(ServiceResult[TaskOrderDto]):
 # -------------------------------------------------
 
 
-class TaskingTileSearchQueryDto(BaseModel):
+class TaskingTileSearchQueryDto(_GeoJsonQueryModel):
     Wkt: Optional[str] = None
     GeoJson: Optional[GeoJsonModel] = None
     TileGuids: Optional[List[uuid.UUID]] = None
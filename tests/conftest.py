@@ -0,0 +1,58 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models  # noqa: E402
+from api_service import ClearSkyVisionAPI  # noqa: E402
+from tools.connection_limiter import FileLockConnectionLimiter  # noqa: E402
+from tools.mock_server import MOCK_API_KEY, MockClearSkyServer  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    with MockClearSkyServer(composite_size_bytes=4 * 2**20 + 123) as server:
+        yield server
+
+
+@pytest.fixture
+def api_service(mock_server) -> ClearSkyVisionAPI:
+    api_service = ClearSkyVisionAPI(MOCK_API_KEY)
+    api_service.BASE_URL = mock_server.url
+    return api_service
+
+
+@pytest.fixture
+def composite_command() -> models.ProcessCompositeCommandDto:
+    return models.ProcessCompositeCommandDto(
+        Wkt="POLYGON ((10.0 56.0, 10.05 56.0, 10.05 56.05, 10.0 56.05, 10.0 56.0))",
+        EpsgProjection=32632,
+        Date=date(2024, 11, 1),
+        PixelSelectionMode="intersect",
+        SatelliteConstellations=[models.SatelliteConstellation.Sentinel2.value],
+        Model=models.Model.Stratus2.value,
+        UtmGridForcePixelResolutionSize=False,
+    )
+
+
+class _TimingOutConnectionLimiter(FileLockConnectionLimiter):
+    """
+    FileLockConnectionLimiter raising when no slot becomes free, so a leaked slot fails the test instead of hanging it.
+    """
+
+    def acquire(self, timeout=None):
+        token = super().acquire(timeout=10)
+        if token is None:
+            raise TimeoutError("no connection slot became free within 10 seconds")
+        return token
+
+
+@pytest.fixture
+def timing_out_connection_limiter(tmp_path):
+    """
+    Returns a function creating a connection limiter with max_connections slots, raising instead of waiting forever.
+    """
+    return lambda max_connections: _TimingOutConnectionLimiter(str(tmp_path / "slots"), max_connections)
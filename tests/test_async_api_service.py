@@ -0,0 +1,50 @@
+import asyncio
+
+from async_api_service import AsyncClearSkyVisionAPI
+from tools.composite_pipeline import estimate_query_for_command
+from tools.mock_server import MOCK_API_KEY, MockClearSkyServer
+
+
+def test_process_composite_downloads_the_composite(mock_server, composite_command, tmp_path):
+    async def run():
+        async with AsyncClearSkyVisionAPI(MOCK_API_KEY) as api_service:
+            api_service.BASE_URL = mock_server.url
+            return await api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False)
+
+    file_path = asyncio.run(run())
+
+    with open(file_path, "rb") as file:
+        assert file.read() == mock_server.composite
+
+
+def test_session_has_no_total_timeout():
+    async def run():
+        async with AsyncClearSkyVisionAPI(MOCK_API_KEY) as api_service:
+            return api_service._get_session().timeout
+
+    timeout = asyncio.run(run())
+
+    assert timeout.total is None
+    assert timeout.sock_connect == AsyncClearSkyVisionAPI.CONNECT_TIMEOUT_SECONDS
+    assert timeout.sock_read == AsyncClearSkyVisionAPI.READ_TIMEOUT_SECONDS
+
+
+def test_shrinking_the_limit_waits_for_requests_in_flight(composite_command):
+    with MockClearSkyServer(latency_seconds=0.2, max_concurrent_connections=6) as mock_server:
+
+        async def run():
+            async with AsyncClearSkyVisionAPI(MOCK_API_KEY, max_concurrent_connections=6) as api_service:
+                api_service.BASE_URL = mock_server.url
+                query = estimate_query_for_command(composite_command)
+                first_requests = [asyncio.ensure_future(api_service.retrieve_estimate_for_process_composite_of_satellite_imagery(query)) for _ in range(6)]
+                await asyncio.sleep(0.05)
+
+                await api_service._set_max_concurrent_connections(2)
+                later_requests = [api_service.retrieve_estimate_for_process_composite_of_satellite_imagery(query) for _ in range(6)]
+                return await asyncio.gather(*first_requests, *later_requests)
+
+        estimates = asyncio.run(run())
+
+    assert all(estimate.Succeeded for estimate in estimates)
+    assert mock_server.max_in_flight <= 6
+    assert 429 not in mock_server.status_counts
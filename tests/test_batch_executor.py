@@ -0,0 +1,50 @@
+from tools.batch_executor import AdaptiveConcurrencyLimiter, BatchJob, ThrottledError, execute_batch
+from tools.composite_pipeline import estimate_query_for_command
+
+
+def test_limiter_increases_additively_and_decreases_multiplicatively():
+    limiter = AdaptiveConcurrencyLimiter(8, initial_concurrency=4, cooldown_seconds=60)
+
+    limiter.acquire()
+    limiter.release(0.1, throttled=False)
+    assert limiter.limit == 4.25
+
+    limiter.acquire()
+    limiter.release(0.1, throttled=True)
+    assert limiter.limit == 2.125
+
+    # failures of the same round within the cooldown only count once
+    limiter.acquire()
+    limiter.release(0.1, throttled=True)
+    assert limiter.limit == 2.125
+    assert limiter.in_flight == 0
+
+
+def test_job_reports_throttled_request_before_its_last_request(mock_server, api_service, composite_command):
+    def estimate_then_get_models():
+        try:
+            api_service.retrieve_estimate_for_process_composite_of_satellite_imagery(estimate_query_for_command(composite_command))
+        finally:
+            mock_server.max_concurrent_connections = 10
+        return api_service.get_tasking_models()
+
+    mock_server.max_concurrent_connections = 0
+    (outcome,) = execute_batch(api_service, [BatchJob(estimate_then_get_models, idempotent=True)], max_concurrency=1, max_retries=0)
+
+    assert isinstance(outcome.error, ThrottledError)
+    assert outcome.status_code == 429
+    assert outcome.error.retry_after_seconds == 1
+    assert not outcome.succeeded
+
+
+def test_batch_backs_off_on_429_and_completes_every_job(mock_server, api_service):
+    mock_server.max_concurrent_connections = 2
+    mock_server.latency_seconds = 0.2
+
+    jobs = [BatchJob(api_service.get_tasking_models) for _ in range(8)]
+    outcomes = execute_batch(api_service, jobs, max_concurrency=8, max_retries=10, backoff_base_seconds=0.01)
+
+    assert mock_server.status_counts.get(429, 0) > 0
+    assert all(outcome.succeeded for outcome in outcomes)
+    assert all(outcome.status_code == 200 for outcome in outcomes)
+    assert any(outcome.attempts > 1 for outcome in outcomes)
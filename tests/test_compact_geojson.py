@@ -0,0 +1,78 @@
+import json
+
+import pytest
+import shapely
+
+import models
+
+
+@pytest.fixture
+def geometries():
+    polygon = shapely.Polygon(shapely.box(10.0, 56.0, 10.1, 56.1).exterior.segmentize(0.001), holes=[shapely.box(10.04, 56.04, 10.06, 56.06).exterior])
+    multipolygon = shapely.multipolygons([polygon, shapely.box(11.0, 56.0, 11.1, 56.1)])
+    return [polygon, multipolygon, shapely.geometrycollections([polygon, multipolygon])]
+
+
+def test_command_json_is_written_from_the_arrays(composite_command, geometries, monkeypatch):
+    def fail(self):
+        raise AssertionError("coordinates were serialized as Python lists")
+
+    monkeypatch.setattr(models.CompactGeoJsonModel, "_get_coordinates_to_serialize", fail)
+    for geometry in geometries:
+        command = composite_command.model_copy(update={"Wkt": None, "GeoJson": models.CompactGeoJsonModel.from_shapely(geometry)})
+
+        command_json = json.loads(command.model_dump_json())
+
+        assert command_json["GeoJson"] == json.loads(shapely.to_geojson(geometry))
+        assert command_json["Date"] == "2024-11-01" and command_json["Wkt"] is None
+
+
+def test_command_json_round_trips(composite_command, geometries):
+    for geometry in geometries:
+        command = composite_command.model_copy(update={"Wkt": None, "GeoJson": models.CompactGeoJsonModel.from_shapely(geometry)})
+
+        decoded_command = models.ProcessCompositeCommandDto.model_validate_json(command.model_dump_json())
+
+        assert shapely.equals_exact(shapely.from_wkt(decoded_command.GeoJson.to_wkt()), geometry, tolerance=0)
+
+
+def test_model_dump_keeps_nested_lists(geometries):
+    polygon = geometries[0]
+
+    geojson = models.CompactGeoJsonModel.from_shapely(polygon).model_dump(exclude_none=True)
+
+    assert geojson == json.loads(shapely.to_geojson(polygon))
+
+
+@pytest.mark.parametrize(
+    "arguments, expected_fields",
+    [
+        ({"exclude": None}, None),
+        ({"exclude": {"Wkt"}}, None),
+        ({"exclude": {"Wkt": True}, "exclude_none": True}, None),
+        ({"include": {"Date", "GeoJson"}}, {"Date", "GeoJson"}),
+        ({"include": {"Date"}}, {"Date"}),
+        ({"indent": 2}, None),
+    ],
+)
+def test_command_json_honours_dump_arguments(composite_command, geometries, arguments, expected_fields):
+    command = composite_command.model_copy(update={"Wkt": None, "GeoJson": models.CompactGeoJsonModel.from_shapely(geometries[1])})
+    plain_command = composite_command.model_copy(update={"Wkt": None, "GeoJson": models.GeoJsonModel.from_geojson(json.loads(shapely.to_geojson(geometries[1])))})
+
+    command_json = json.loads(command.model_dump_json(**arguments))
+    plain_command_json = json.loads(plain_command.model_dump_json(**arguments))
+
+    # GEOS leaves out the None geometries member
+    for dumped_json in (command_json, plain_command_json):
+        if "GeoJson" in dumped_json:
+            dumped_json["GeoJson"] = {name: value for name, value in dumped_json["GeoJson"].items() if value is not None}
+    assert command_json == plain_command_json
+    assert expected_fields is None or set(command_json) == expected_fields
+
+
+def test_geojson_json_honours_dump_arguments(geometries):
+    geojson = models.CompactGeoJsonModel.from_shapely(geometries[0])
+
+    assert geojson.model_dump_json(indent=2) == shapely.to_geojson(geometries[0], indent=2)
+    assert json.loads(geojson.model_dump_json(by_alias=True, exclude_none=True)) == json.loads(shapely.to_geojson(geometries[0]))
+    assert set(json.loads(geojson.model_dump_json(exclude={"geometries"}))) == {"type", "coordinates"}
@@ -0,0 +1,75 @@
+import pytest
+import shapely
+
+from tools import process_coalesced_composites
+from tools.composite_planner import coalesce_composite_commands, split_composite_command, transform_geometries
+
+# 6 km x 4 km in EPSG:32632, i.e. a raster of 600 x 400 pixels at 10 m resolution
+UTM_BOUNDS = (560000, 6200000, 566000, 6204000)
+
+
+@pytest.fixture
+def large_command(composite_command):
+    geometry = transform_geometries(shapely.segmentize(shapely.box(*UTM_BOUNDS), 100), 32632, 4326)
+    return composite_command.model_copy(update={"Wkt": shapely.to_wkt(geometry, rounding_precision=-1)})
+
+
+def test_split_partitions_geometry_into_pixel_aligned_pieces(large_command):
+    pieces = split_composite_command(large_command, max_area_km2=4.0)
+
+    assert len(pieces) == 12
+    assert all(piece.grid_epsg == 32632 for piece in pieces)
+    assert all(piece.area_km2 <= 4.0 * 0.95 for piece in pieces)
+    assert sum(piece.area_km2 for piece in pieces) == pytest.approx(24.0)
+    assert all(bound % large_command.Resolution == 0 for piece in pieces for bound in piece.grid_bounds)
+
+
+def test_split_then_coalesce_windows_tile_the_raster(large_command):
+    pieces = split_composite_command(large_command, max_area_km2=4.0)
+    (coalesced_composite,) = coalesce_composite_commands([piece.command for piece in pieces], max_area_km2=100.0)
+
+    assert coalesced_composite.indices == list(range(len(pieces)))
+    assert shapely.area(transform_geometries(shapely.from_wkt(coalesced_composite.command.Wkt), 4326, 32632)) == pytest.approx(24e6)
+
+    # the pieces follow the split grid, with cells of 1940 m, i.e. 194 pixels, starting at x 558720 and y 6198300
+    assert coalesced_composite.window_of(0) == (0, 376, 66, 24)
+    assert coalesced_composite.window_of(5) == (66, 182, 194, 194)
+    assert coalesced_composite.window_of(11) == (454, 0, 146, 182)
+
+    covered = set()
+    for column_offset, row_offset, width, height in coalesced_composite.windows:
+        pixels = {(column, row) for column in range(column_offset, column_offset + width) for row in range(row_offset, row_offset + height)}
+        assert not covered & pixels
+        covered |= pixels
+    assert covered == {(column, row) for column in range(600) for row in range(400)}
+
+
+def test_windows_in_raster_follow_the_raster_geotransform(large_command):
+    pieces = split_composite_command(large_command, max_area_km2=4.0)
+    (coalesced_composite,) = coalesce_composite_commands([piece.command for piece in pieces], max_area_km2=100.0)
+
+    # a raster returned with one extra pixel on the west and north sides
+    windows = coalesced_composite.windows_in_raster((559990.0, 10.0, 0.0, 6204010.0, 0.0, -10.0))
+
+    assert windows == [(column_offset + 1, row_offset + 1, width, height) for column_offset, row_offset, width, height in coalesced_composite.windows]
+
+
+def test_coalesce_keeps_distant_geometries_apart(composite_command):
+    near = composite_command.model_copy(update={"Wkt": "POLYGON ((10.0 56.0, 10.01 56.0, 10.01 56.01, 10.0 56.01, 10.0 56.0))"})
+    far = composite_command.model_copy(update={"Wkt": "POLYGON ((10.5 56.0, 10.51 56.0, 10.51 56.01, 10.5 56.01, 10.5 56.0))"})
+
+    coalesced_composites = coalesce_composite_commands([near, far, near], max_area_km2=100.0)
+
+    assert [coalesced_composite.indices for coalesced_composite in coalesced_composites] == [[0, 2], [1]]
+
+
+def test_process_coalesced_composites_downloads_one_composite_per_cluster(mock_server, api_service, composite_command, tmp_path):
+    near = composite_command.model_copy(update={"Wkt": "POLYGON ((10.0 56.0, 10.01 56.0, 10.01 56.01, 10.0 56.01, 10.0 56.0))"})
+    adjacent = composite_command.model_copy(update={"Wkt": "POLYGON ((10.01 56.0, 10.02 56.0, 10.02 56.01, 10.01 56.01, 10.01 56.0))"})
+    far = composite_command.model_copy(update={"Wkt": "POLYGON ((10.5 56.0, 10.51 56.0, 10.51 56.01, 10.5 56.01, 10.5 56.0))"})
+
+    coalesced_composites = process_coalesced_composites(api_service, str(tmp_path), [near, far, adjacent], max_area_km2=100.0)
+
+    assert [coalesced_composite.indices for coalesced_composite in coalesced_composites] == [[0, 2], [1]]
+    assert all(coalesced_composite.file_path is not None for coalesced_composite in coalesced_composites)
+    assert mock_server.request_counts["/api/satelliteimages/process/composite"] == 2
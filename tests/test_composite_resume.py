@@ -0,0 +1,75 @@
+import os
+
+import pytest
+import requests
+
+
+def _read(file_path: str) -> bytes:
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+def _leftover_files(directory: str):
+    return [name for name in os.listdir(directory) if name.endswith((".incomplete", ".resume"))]
+
+
+# downloads are written in 1 MiB chunks, a partial chunk is lost when the connection drops
+def _interrupt_download(api_service, mock_server, directory: str, command, drop_after_bytes: int):
+    mock_server.drop_after_bytes, mock_server.drop_count = drop_after_bytes, 1
+    with pytest.raises((requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        api_service.process_composite_of_satellite_imagery(directory, command, show_progress=False)
+    assert len(_leftover_files(directory)) == 2
+
+
+@pytest.mark.parametrize("pipelined_writes", [False, True])
+def test_resume_after_dropped_connections_is_byte_identical(api_service, mock_server, composite_command, tmp_path, pipelined_writes):
+    mock_server.drop_after_bytes, mock_server.drop_count = 1_500_000, 2
+
+    file_path = api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False, resume_attempts=2, pipelined_writes=pipelined_writes)
+
+    assert _read(file_path) == mock_server.composite
+    assert mock_server.status_counts == {200: 1, 206: 2}
+    assert _leftover_files(str(tmp_path)) == []
+
+
+def test_resume_in_a_later_call_is_byte_identical(api_service, mock_server, composite_command, tmp_path):
+    _interrupt_download(api_service, mock_server, str(tmp_path), composite_command, 2_500_000)
+
+    file_path = api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False)
+
+    assert _read(file_path) == mock_server.composite
+    assert mock_server.status_counts == {200: 1, 206: 1}
+    assert _leftover_files(str(tmp_path)) == []
+
+
+def test_if_range_mismatch_restarts_from_zero(api_service, mock_server, composite_command, tmp_path):
+    _interrupt_download(api_service, mock_server, str(tmp_path), composite_command, 2_500_000)
+    mock_server.composite, mock_server.etag = os.urandom(len(mock_server.composite)), '"changed-composite"'
+
+    file_path = api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False)
+
+    assert _read(file_path) == mock_server.composite
+    assert mock_server.status_counts == {200: 2}
+    assert _leftover_files(str(tmp_path)) == []
+
+
+def test_range_not_satisfiable_discards_incomplete_file(api_service, mock_server, composite_command, tmp_path):
+    _interrupt_download(api_service, mock_server, str(tmp_path), composite_command, 3_500_000)
+    mock_server.composite = os.urandom(2_000_000)  # shorter than the partial download, same etag
+
+    file_path = api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False)
+
+    assert _read(file_path) == mock_server.composite
+    assert mock_server.status_counts == {200: 2, 416: 1}
+    assert _leftover_files(str(tmp_path)) == []
+
+
+def test_server_ignoring_range_restarts_from_zero(api_service, mock_server, composite_command, tmp_path):
+    mock_server.supports_ranges = False
+    _interrupt_download(api_service, mock_server, str(tmp_path), composite_command, 2_500_000)
+
+    file_path = api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False)
+
+    assert _read(file_path) == mock_server.composite
+    assert mock_server.status_counts == {200: 2}
+    assert _leftover_files(str(tmp_path)) == []
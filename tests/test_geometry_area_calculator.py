@@ -0,0 +1,41 @@
+import numpy as np
+import pyproj
+import pytest
+import shapely
+
+from tools import crs_transformer
+from tools.geometry_area_calculator import DEFAULT_AEA_PARAMS, calculate_area_ratios, calculate_projected_areas
+
+
+def test_wkts_and_geometries_can_be_mixed():
+    box = shapely.box(10.0, 56.0, 10.1, 56.1)
+
+    areas = calculate_projected_areas([box, box.wkt, shapely.box(10.0, 56.0, 10.2, 56.1).wkt])
+
+    assert areas[0] == areas[1]
+    assert areas[2] == pytest.approx(2 * areas[0], rel=1e-3)
+
+
+def test_invalid_geometries_raise():
+    with pytest.raises(TypeError):
+        calculate_projected_areas([shapely.box(10.0, 56.0, 10.1, 56.1), 42])
+
+
+def test_area_ratios_of_pairs():
+    boxes = [shapely.box(10.0, 56.0, 10.1, 56.1), shapely.box(10.0, 56.0, 10.1, 56.1).wkt]
+
+    ratios = calculate_area_ratios(boxes, [shapely.box(10.0, 56.0, 10.2, 56.1), shapely.Polygon()])
+
+    assert ratios[0] == pytest.approx(0.5, rel=1e-3)
+    assert np.isnan(ratios[1])
+
+
+def test_dict_crs_keys_are_memoized(monkeypatch):
+    crs_transformer.crs_key(dict(DEFAULT_AEA_PARAMS))
+    from_user_input = pyproj.CRS.from_user_input
+
+    def fail(*args, **kwargs):
+        raise AssertionError("CRS built again for a known dictionary")
+
+    monkeypatch.setattr(crs_transformer.CRS, "from_user_input", fail)
+    assert crs_transformer.crs_key(dict(reversed(list(DEFAULT_AEA_PARAMS.items())))) == from_user_input(DEFAULT_AEA_PARAMS).to_wkt()
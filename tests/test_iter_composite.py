@@ -0,0 +1,48 @@
+import gc
+
+import pytest
+import requests
+
+from api_service import ClearSkyVisionAPI
+from tools.mock_server import MOCK_API_KEY
+
+
+@pytest.fixture
+def limited_api_service(mock_server, timing_out_connection_limiter):
+    api_service = ClearSkyVisionAPI(MOCK_API_KEY, connection_limiter=timing_out_connection_limiter(1))
+    api_service.BASE_URL = mock_server.url
+    return api_service
+
+
+def _read_all(api_service, command) -> bytes:
+    with api_service.iter_composite_of_satellite_imagery(command, chunk_size=2**16) as chunks:
+        return b"".join(chunks)
+
+
+def test_iterator_yields_the_composite(limited_api_service, mock_server, composite_command):
+    assert _read_all(limited_api_service, composite_command) == mock_server.composite
+    assert _read_all(limited_api_service, composite_command) == mock_server.composite
+
+
+def test_dropped_iterator_releases_its_slot(limited_api_service, mock_server, composite_command):
+    chunks = limited_api_service.iter_composite_of_satellite_imagery(composite_command)
+    del chunks
+    gc.collect()
+
+    assert _read_all(limited_api_service, composite_command) == mock_server.composite
+
+
+def test_context_manager_releases_a_partially_read_iterator(limited_api_service, mock_server, composite_command):
+    with limited_api_service.iter_composite_of_satellite_imagery(composite_command, chunk_size=2**16) as chunks:
+        assert next(chunks) == mock_server.composite[: 2**16]
+
+    assert list(chunks) == []
+    assert _read_all(limited_api_service, composite_command) == mock_server.composite
+
+
+def test_dropped_connection_raises(limited_api_service, mock_server, composite_command):
+    mock_server.drop_after_bytes, mock_server.drop_count = 300_000, 1
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        _read_all(limited_api_service, composite_command)
+    assert _read_all(limited_api_service, composite_command) == mock_server.composite
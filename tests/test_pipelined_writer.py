@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from api_service import ClearSkyVisionAPI
+from tools.mock_server import MOCK_API_KEY
+from tools.pipelined_writer import PipelinedFileWriter
+from tools.request_metrics import InMemoryMetricsExporter
+
+
+def _write(writer: PipelinedFileWriter, data: bytes):
+    for position in range(0, len(data), 1000):
+        buffer = writer.acquire_buffer()
+        chunk = data[position : position + 1000]
+        buffer[: len(chunk)] = chunk
+        writer.submit(buffer, len(chunk))
+
+
+def test_writer_resumes_at_offset(tmp_path):
+    file_path = str(tmp_path / "file.incomplete")
+    data = os.urandom(10_500)
+
+    with PipelinedFileWriter(file_path, preallocate_size=len(data), buffer_size=1000) as writer:
+        _write(writer, data[:4000])
+    with PipelinedFileWriter(file_path, offset=4000, preallocate_size=len(data) - 4000, buffer_size=1000) as writer:
+        _write(writer, data[4000:])
+
+    with open(file_path, "rb") as file:
+        assert file.read() == data
+
+
+@pytest.mark.parametrize("existing_size", [None, 100])
+def test_writer_refuses_to_resume_a_missing_or_shorter_file(tmp_path, existing_size):
+    file_path = str(tmp_path / "file.incomplete")
+    if existing_size is not None:
+        with open(file_path, "wb") as file:
+            file.write(b"\0" * existing_size)
+
+    with pytest.raises(ValueError):
+        PipelinedFileWriter(file_path, offset=4000)
+
+
+def test_pipelined_downloads_count_bytes_and_reuse_the_connection(mock_server, composite_command, tmp_path):
+    metrics = InMemoryMetricsExporter()
+    api_service = ClearSkyVisionAPI(MOCK_API_KEY, metrics_exporters=[metrics])
+    api_service.BASE_URL = mock_server.url
+
+    for index in range(3):
+        file_path = api_service.process_composite_of_satellite_imagery(
+            str(tmp_path / str(index)), composite_command, show_progress=False, pipelined_writes=True, fsync_policy="end"
+        )
+        with open(file_path, "rb") as file:
+            assert file.read() == mock_server.composite
+
+    composite_summary = [row for row in metrics.summary() if row["endpoint"] == "/api/satelliteimages/process/composite"]
+    assert composite_summary[0]["count"] == 3
+    assert composite_summary[0]["response_bytes"] == 3 * len(mock_server.composite)
+    pools = api_service._session.get_adapter(mock_server.url).poolmanager.pools
+    assert sum(pools[key].num_connections for key in pools.keys()) == 1
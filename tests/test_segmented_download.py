@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from api_service import ClearSkyVisionAPI
+from tools.mock_server import MOCK_API_KEY
+
+
+def _read(file_path: str) -> bytes:
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+@pytest.fixture
+def segmented_api_service(api_service):
+    api_service.MIN_SEGMENT_SIZE = 2**20
+    return api_service
+
+
+def test_segments_require_opt_in(segmented_api_service, mock_server, composite_command, tmp_path):
+    with pytest.raises(ValueError):
+        segmented_api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False, segments=4)
+
+    assert mock_server.status_counts == {}
+
+
+def test_segmented_download_is_byte_identical(segmented_api_service, mock_server, composite_command, tmp_path):
+    file_path = segmented_api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False, segments=4, allow_segment_requests=True)
+
+    assert _read(file_path) == mock_server.composite
+    # the first range confirms Range support and the size, the remaining 3 MiB are fetched as 3 ranges
+    assert mock_server.status_counts == {206: 4}
+
+
+def test_segments_are_requested_concurrently_on_throttled_server(segmented_api_service, mock_server, composite_command, tmp_path):
+    # the speedup itself is measured by benchmark_segmented_download in benchmark_clearsky_api.py
+    mock_server.bandwidth_bytes_per_second = 8 * 2**20
+
+    file_path = segmented_api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False, segments=4, allow_segment_requests=True)
+
+    assert _read(file_path) == mock_server.composite
+    assert mock_server.status_counts == {206: 4}
+    assert mock_server.max_in_flight == 4
+
+
+def test_server_ignoring_range_is_downloaded_as_single_stream(segmented_api_service, mock_server, composite_command, tmp_path):
+    mock_server.supports_ranges = False
+
+    file_path = segmented_api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False, segments=4, allow_segment_requests=True)
+
+    assert _read(file_path) == mock_server.composite
+    assert mock_server.status_counts == {200: 1}
+
+
+def test_composite_smaller_than_a_segment_is_one_request(api_service, mock_server, composite_command, tmp_path):
+    file_path = api_service.process_composite_of_satellite_imagery(str(tmp_path), composite_command, show_progress=False, segments=4, allow_segment_requests=True)
+
+    assert _read(file_path) == mock_server.composite
+    assert mock_server.status_counts == {206: 1}
+
+
+@pytest.mark.parametrize("download_count, max_connections", [(1, 1), (2, 2)])
+def test_segmented_downloads_with_fewer_limiter_slots_than_segments(mock_server, composite_command, tmp_path, timing_out_connection_limiter, download_count, max_connections):
+    limiter = timing_out_connection_limiter(max_connections)
+    file_paths, errors = [], []
+
+    def download(index: int):
+        api_service = ClearSkyVisionAPI(MOCK_API_KEY, connection_limiter=limiter)
+        api_service.BASE_URL, api_service.MIN_SEGMENT_SIZE = mock_server.url, 2**20
+        try:
+            file_paths.append(
+                api_service.process_composite_of_satellite_imagery(str(tmp_path / str(index)), composite_command, show_progress=False, segments=4, allow_segment_requests=True)
+            )
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=download, args=(index,)) for index in range(download_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(file_paths) == download_count
+    assert all(_read(file_path) == mock_server.composite for file_path in file_paths)
@@ -0,0 +1,37 @@
+import pytest
+
+from tools.tile_catalog import TileCatalog
+
+SEARCH_PATH = "/api/tasking/search/tiles"
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return TileCatalog(str(tmp_path / "tiles.sqlite"))
+
+
+def test_search_queries_the_api_once_per_uncovered_area(catalog, api_service, mock_server):
+    tiles = catalog.search(api_service, "POLYGON ((8.05 56.05, 8.35 56.05, 8.35 56.15, 8.05 56.15, 8.05 56.05))")
+
+    assert len(tiles) == 2 and len(catalog) == 2
+    assert catalog.search(api_service, "POINT (8.1 56.1)") == [tiles[0]]
+    assert mock_server.request_counts[SEARCH_PATH] == 1
+
+    assert [tile.Guid for tile in catalog.query_point(8.3, 56.1)] == [tiles[1].Guid]
+    assert len(catalog.query_bbox(8.0, 56.0, 8.5, 56.1)) == 2
+    assert catalog.query_geometries(["POINT (8.1 56.1)", "POINT (9.1 56.1)"]) == [[tiles[0].Guid], []]
+
+
+def test_refresh_removes_and_updates_tiles(catalog, api_service, mock_server, tmp_path):
+    removed_tile, changed_tile = catalog.search(api_service, "POLYGON ((8.05 56.05, 8.35 56.05, 8.35 56.15, 8.05 56.15, 8.05 56.05))")
+    del mock_server.tiles[removed_tile.Guid]
+    mock_server.tiles[changed_tile.Guid] = {**mock_server.tiles[changed_tile.Guid], "Epsg": "32633"}
+
+    assert catalog.refresh(api_service) == 2
+
+    assert removed_tile.Guid not in catalog
+    assert catalog.query_point(8.1, 56.1) == []
+    assert catalog.get(changed_tile.Guid).Epsg == "32633"
+    reloaded_catalog = TileCatalog(str(tmp_path / "tiles.sqlite"))
+    assert len(reloaded_catalog) == 1 and reloaded_catalog.get(changed_tile.Guid).Epsg == "32633"
+    assert catalog.refresh(api_service) == 0
@@ -1,2 +1,16 @@
 from tools.geometrycollection_wrapper import wrap_in_geometrycollection
-from tools.geometry_area_calculator import calculate_area_ratio
+from tools.geometry_area_calculator import calculate_area_ratio, calculate_area_ratios, calculate_projected_areas
+from tools.composite_cache import CompositeCache
+from tools.response_cache import MemoryResponseCache, SqliteResponseCache
+from tools.pipelined_writer import PipelinedFileWriter
+from tools.batch_executor import AdaptiveConcurrencyLimiter, BatchJob, BatchJobOutcome, ThrottledError
+from tools.composite_planner import CoalescedComposite, CompositeManifest, CompositePiece, coalesce_composite_commands, process_coalesced_composites, split_composite_command
+from tools.availability_index import AvailabilityIndex
+from tools.availability_cache import IncrementalAvailabilitySearch
+from tools.bulk_availability_search import search_available_imagery_in_bulk
+from tools.composite_pipeline import CompositePipelineJob, CreditBudget, run_composite_pipeline
+from tools.batch_journal import BatchJournal, run_journaled_batch
+from tools.connection_limiter import ConnectionLimiter, FileLockConnectionLimiter, HttpConnectionLimiter
+from tools.api_key_pool import ApiKeyPool, PooledApiKey, PooledCompositeJob
+from tools.tile_catalog import TileCatalog
+from tools.request_metrics import InMemoryMetricsExporter, MetricsExporter, PrometheusMetricsExporter, RequestMetrics
@@ -0,0 +1,264 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+import models
+from tools.composite_pipeline import (
+    STAGE_COMPLETED,
+    STAGE_DOWNLOADING,
+    STAGE_ESTIMATING,
+    STAGE_FAILED,
+    STAGE_REJECTED,
+    CompositePipelineJob,
+    estimate_query_for_command,
+)
+
+
+class PooledApiKey:
+    """
+    An API key of an ApiKeyPool, with the limits last reported by get_api_key_info and the connections and credits
+    currently taken by the pool.
+    """
+
+    def __init__(
+        self,
+        api_service,
+    ):
+        self.api_service = api_service
+        self.info: Optional[models.ApiKeyData] = None
+        self.error: Optional[str] = None
+        self.in_flight = 0
+        self.reserved_credits = 0.0
+        self.spent_credits = 0.0  # spent since info was retrieved
+        self.completed_jobs = 0
+
+    @property
+    def max_connections(self) -> int:
+        return self.info.MaxConcurrentConnections if self.info is not None else 0
+
+    @property
+    def free_slots(self) -> int:
+        return max(0, self.max_connections - self.in_flight)
+
+    @property
+    def available_credits(self) -> float:
+        if self.info is None:
+            return 0.0
+        return self.info.CreditAmount + self.info.CreditLimit - self.spent_credits - self.reserved_credits
+
+    def can_process(
+        self,
+        credits: Optional[float],
+        area_km2: float,
+    ) -> bool:
+        """
+        Returns whether the key can process a job of credits, None for requests not consuming credits, and area_km2.
+        """
+        if self.max_connections <= 0 or area_km2 > self.info.MaxCompositeAreaKm2:  # type: ignore
+            return False
+        return credits is None or credits <= self.available_credits
+
+    def __repr__(self):
+        return f"PooledApiKey(in_flight={self.in_flight}/{self.max_connections}, available_credits={self.available_credits}, completed_jobs={self.completed_jobs})"
+
+
+class PooledCompositeJob(CompositePipelineJob):
+    """
+    A CompositePipelineJob of an ApiKeyPool, recording the key the composite was processed with.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        command: models.ProcessCompositeCommandDto,
+    ):
+        super().__init__(index, command)
+        self.api_key: Optional[str] = None
+
+
+class ApiKeyPool:
+    """
+    Pool of ClearSkyVisionAPI services with different API keys, sharding composite jobs over the keys.
+
+    Every request is routed to the key with the most free connection slots, composites only to keys with enough
+    remaining credits (CreditAmount + CreditLimit) and a large enough MaxCompositeAreaKm2 for their estimate.
+    Limits are retrieved with get_api_key_info and refreshed every refresh_interval_seconds, so the pool rebalances
+    as limits or credits of keys change; keys failing to report their info are left out until the next refresh.
+
+    Usage:
+
+        pool = ApiKeyPool([ClearSkyVisionAPI(api_key) for api_key in api_keys])
+        jobs = pool.process_composites("./files/", commands)
+    """
+
+    def __init__(
+        self,
+        api_services: Sequence,
+        refresh_interval_seconds: float = 60.0,
+    ):
+        self.keys = [PooledApiKey(api_service) for api_service in api_services]
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._condition = threading.Condition()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at: Optional[float] = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Retrieves the limits and credits of every key. Keys failing to report them are left out until the next refresh.
+        """
+        for key in self.keys:
+            try:
+                api_key_info = key.api_service.get_api_key_info(use_cache=False)
+            except Exception as e:  # e.g. revoked keys or unreachable hosts, left out until the next refresh
+                with self._condition:
+                    key.info, key.error = None, str(e)
+                continue
+
+            with self._condition:
+                key.info, key.spent_credits = api_key_info.Data, 0.0
+                key.error = None if api_key_info.Data is not None else (api_key_info.Error.Message if api_key_info.Error else "no api key info")
+
+        with self._condition:
+            self._refreshed_at = time.monotonic()
+            self._condition.notify_all()
+
+    @property
+    def max_concurrent_connections(self) -> int:
+        return sum(key.max_connections for key in self.keys)
+
+    @property
+    def available_credits(self) -> float:
+        return sum(key.available_credits for key in self.keys)
+
+    def _refresh_if_due(self):
+        if self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.refresh_interval_seconds:
+            return
+        # one thread refreshes, the others continue with the current limits
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            finally:
+                self._refresh_lock.release()
+
+    def _acquire_key(
+        self,
+        credits: Optional[float] = None,
+        area_km2: float = 0.0,
+    ) -> Optional[PooledApiKey]:
+        """
+        Helper method taking a connection slot, and reserving credits, of the key with the most free slots able to
+        process the job, waiting for a free slot if necessary. Returns None if no key can process the job.
+        """
+        self._refresh_if_due()
+        with self._condition:
+            while True:
+                candidates = [key for key in self.keys if key.can_process(credits, area_km2)]
+                if not candidates:
+                    return None
+
+                key = max(candidates, key=lambda candidate: candidate.free_slots / candidate.max_connections)
+                if key.free_slots:
+                    key.in_flight += 1
+                    key.reserved_credits += credits or 0.0
+                    return key
+                self._condition.wait()
+
+    def _release_key(
+        self,
+        key: PooledApiKey,
+        reserved_credits: float = 0.0,
+        spent_credits: float = 0.0,
+    ):
+        with self._condition:
+            key.in_flight -= 1
+            key.reserved_credits -= reserved_credits
+            key.spent_credits += spent_credits
+            self._condition.notify_all()
+
+    def call(
+        self,
+        method_name: str,
+        *args,
+        **kwargs,
+    ):
+        """
+        Calls a method of ClearSkyVisionAPI not consuming credits, e.g. search_available_imagery, with the key with the
+        most free connection slots.
+        """
+        key = self._acquire_key()
+        if key is None:
+            raise Exception(f"no API key of the pool is available: {[pooled_key.error for pooled_key in self.keys]}")
+        try:
+            return getattr(key.api_service, method_name)(*args, **kwargs)
+        finally:
+            self._release_key(key)
+
+    def process_composites(
+        self,
+        directory_to_save_files: str,
+        commands: Sequence[models.ProcessCompositeCommandDto],
+        on_job_finished: Optional[Callable[[PooledCompositeJob], None]] = None,
+    ) -> List[PooledCompositeJob]:
+        """
+        Estimates and downloads composites over all keys of the pool, with as many concurrent jobs as the keys allow
+        together.
+
+        Jobs which no key has the credits or MaxCompositeAreaKm2 for are rejected. Failing jobs never abort the
+        others. on_job_finished is called from the worker threads with every finished job. Returns the jobs in the
+        order of commands, each with the key its composite was processed with.
+        """
+        jobs = [PooledCompositeJob(index, command) for index, command in enumerate(commands)]
+
+        def run_job(job: PooledCompositeJob):
+            try:
+                self._run_job(directory_to_save_files, job)
+            except Exception as e:
+                job.stage, job.error = STAGE_FAILED, str(e)
+
+            if on_job_finished is not None:
+                on_job_finished(job)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrent_connections)) as executor:
+            list(executor.map(run_job, jobs))
+
+        return jobs
+
+    def _run_job(
+        self,
+        directory_to_save_files: str,
+        job: PooledCompositeJob,
+    ):
+        """
+        Helper method estimating a job with any key, then processing its composite with a key able to pay for it.
+        """
+        job.stage = STAGE_ESTIMATING
+        job.estimate = self.call("retrieve_estimate_for_process_composite_of_satellite_imagery", estimate_query_for_command(job.command))
+        if job.credit_estimate is None or not job.estimate.Succeeded:
+            job.stage = STAGE_FAILED
+            job.error = job.estimate.Error.Message if job.estimate.Error else "estimate failed"
+            return
+
+        credits, area_km2 = job.credit_estimate, job.estimate.Data.AreaEstimateKm2
+        key = self._acquire_key(credits, area_km2)
+        if key is None:
+            job.stage, job.error = STAGE_REJECTED, f"no API key has {credits} credits available and a MaxCompositeAreaKm2 of at least {area_km2:.2f} km2"
+            return
+
+        job.stage = STAGE_DOWNLOADING
+        job.api_key = key.api_service.api_key
+        result = None
+        try:
+            result = key.api_service.process_composite_of_satellite_imagery(directory_to_save_files, job.command, show_progress=False)
+        finally:
+            succeeded = isinstance(result, str)
+            self._release_key(key, reserved_credits=credits, spent_credits=credits if succeeded else 0.0)
+
+        if not succeeded:
+            job.stage, job.error = STAGE_FAILED, result.Error.Message
+            return
+
+        with self._condition:
+            key.completed_jobs += 1
+        job.stage, job.file_path = STAGE_COMPLETED, result
@@ -0,0 +1,201 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import shapely
+
+import models
+from tools.composite_planner import command_geometry
+
+# first date of the sync window of queries without From
+EARLIEST_DATE = date(2015, 1, 1)
+
+
+def canonical_geometry_key(geometry: shapely.Geometry) -> str:
+    """
+    Returns the sha256 hex digest of the normalized WKT of a geometry.
+
+    Geometries with the same vertices are keyed the same, regardless of the order or orientation of their rings and parts.
+    """
+    canonical_wkt = shapely.to_wkt(shapely.normalize(geometry), rounding_precision=9)
+    return hashlib.sha256(canonical_wkt.encode("utf-8")).hexdigest()
+
+
+class IncrementalAvailabilitySearch:
+    """
+    Incremental search of available imagery, persisting the dates found per geometry in an SQLite database.
+
+    For every canonicalized query geometry, the date window already synced is recorded, so repeated searches with a
+    growing From/Until window only query the API for the dates outside of it, plus the last refresh_days of the synced
+    window, as imagery of recent dates can become available with a delay. Cached and fresh dates are merged into one
+    SearchAvailableImageryData.
+
+    Usage:
+
+        availability_search = IncrementalAvailabilitySearch("availability.sqlite")
+        search_result = availability_search.search(api_service, search_dto)
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        refresh_days: int = 3,
+    ):
+        self.database_path = database_path
+        self.refresh_days = refresh_days
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS syncs (geometry_key TEXT PRIMARY KEY, synced_from TEXT NOT NULL, synced_until TEXT NOT NULL, synced_at REAL NOT NULL)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS geographies (geometry_key TEXT NOT NULL, position INTEGER NOT NULL, model TEXT NOT NULL, satellite_constellations TEXT NOT NULL, wkt TEXT NOT NULL, "
+                "PRIMARY KEY (geometry_key, model, satellite_constellations, wkt))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS dates (geometry_key TEXT NOT NULL, model TEXT NOT NULL, satellite_constellations TEXT NOT NULL, wkt TEXT NOT NULL, date TEXT NOT NULL, "
+                "PRIMARY KEY (geometry_key, model, satellite_constellations, wkt, date))"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            with connection:  # commits on success, rolls back on exceptions
+                yield connection
+        finally:
+            connection.close()
+
+    def _get_lock(self, geometry_key: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(geometry_key, threading.Lock())
+
+    def search(
+        self,
+        api_service,
+        query: models.SearchAvailableImageryQueryDto,
+    ) -> Union[models.SearchAvailableImageryQueryResponseDto, models.ServiceResultError]:
+        """
+        Search Available Imagery, querying the API only for the dates of query not synced yet.
+
+        Until defaults to today and From to EARLIEST_DATE. If a query of the API fails, its error response is returned.
+        """
+        geometry_key = canonical_geometry_key(command_geometry(query))
+        query_from = query.From or EARLIEST_DATE
+        query_until = query.Until or date.today()
+
+        with self._get_lock(geometry_key):
+            synced_window = self._get_synced_window(geometry_key)
+            for window_from, window_until in self._windows_to_query(synced_window, query_from, query_until):
+                search_result = api_service.search_available_imagery(query.model_copy(update={"From": window_from, "Until": window_until}))
+                if not search_result.Succeeded or search_result.Data is None:
+                    return search_result
+
+                synced_window = self._store(geometry_key, synced_window, window_from, window_until, search_result.Data)
+
+            data = self._load(geometry_key, query_from, query_until)
+
+        return models.SearchAvailableImageryQueryResponseDto(Succeeded=True, Error=None, Data=data)
+
+    def _get_synced_window(
+        self,
+        geometry_key: str,
+    ) -> Optional[Tuple[date, date]]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT synced_from, synced_until FROM syncs WHERE geometry_key = ?", (geometry_key,)).fetchone()
+        return None if row is None else (date.fromisoformat(row[0]), date.fromisoformat(row[1]))
+
+    def _windows_to_query(
+        self,
+        synced_window: Optional[Tuple[date, date]],
+        query_from: date,
+        query_until: date,
+    ) -> List[Tuple[date, date]]:
+        """
+        Helper method returning the date windows of a query to request from the API, adjacent to the synced window.
+        """
+        if synced_window is None:
+            return [(query_from, query_until)]
+
+        # windows are adjacent to the synced window, also filling any gap to the query, so it stays contiguous
+        synced_from, synced_until = synced_window
+        windows = []
+        if query_from < synced_from:
+            windows.append((query_from, synced_from - timedelta(days=1)))
+
+        refresh_from = max(synced_from, synced_until - timedelta(days=self.refresh_days - 1))
+        if query_until >= refresh_from:
+            windows.append((refresh_from, query_until))
+        return windows
+
+    def _store(
+        self,
+        geometry_key: str,
+        synced_window: Optional[Tuple[date, date]],
+        window_from: date,
+        window_until: date,
+        data: models.SearchAvailableImageryData,
+    ) -> Tuple[date, date]:
+        """
+        Helper method storing the dates of a window, then returns the extended synced window.
+        """
+        geographies = []
+        dates = []
+        for model in data.ModelImageDates:
+            satellite_constellations = json.dumps(model.SatelliteConstellations)
+            for geog in model.DatesByGeog:
+                geographies.append((geometry_key, len(geographies), model.Model, satellite_constellations, geog.Wkt))
+                dates.extend((geometry_key, model.Model, satellite_constellations, geog.Wkt, date_string) for date_string in geog.Dates)
+
+        if synced_window is not None:
+            window_from, window_until = min(window_from, synced_window[0]), max(window_until, synced_window[1])
+
+        with self._connect() as connection:
+            position_offset = connection.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM geographies WHERE geometry_key = ?", (geometry_key,)).fetchone()[0]
+            connection.executemany(
+                "INSERT OR IGNORE INTO geographies (geometry_key, position, model, satellite_constellations, wkt) VALUES (?, ?, ?, ?, ?)",
+                [(key, position_offset + position, model, satellite_constellations, wkt) for key, position, model, satellite_constellations, wkt in geographies],
+            )
+            connection.executemany("INSERT OR IGNORE INTO dates (geometry_key, model, satellite_constellations, wkt, date) VALUES (?, ?, ?, ?, ?)", dates)
+            connection.execute(
+                "INSERT OR REPLACE INTO syncs (geometry_key, synced_from, synced_until, synced_at) VALUES (?, ?, ?, ?)",
+                (geometry_key, window_from.isoformat(), window_until.isoformat(), time.time()),
+            )
+
+        return window_from, window_until
+
+    def _load(
+        self,
+        geometry_key: str,
+        query_from: date,
+        query_until: date,
+    ) -> models.SearchAvailableImageryData:
+        """
+        Helper method building the SearchAvailableImageryData of a geometry from the stored dates within a window.
+        """
+        with self._connect() as connection:
+            geographies = connection.execute("SELECT model, satellite_constellations, wkt FROM geographies WHERE geometry_key = ? ORDER BY position", (geometry_key,)).fetchall()
+            date_rows = connection.execute(
+                "SELECT model, satellite_constellations, wkt, date FROM dates WHERE geometry_key = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (geometry_key, query_from.isoformat(), query_until.isoformat()),
+            ).fetchall()
+
+        dates_by_geography: Dict[tuple, List[str]] = {}
+        for model, satellite_constellations, wkt, date_string in date_rows:
+            dates_by_geography.setdefault((model, satellite_constellations, wkt), []).append(date_string)
+
+        model_image_dates: Dict[tuple, models.ModelImageDatesModel] = {}
+        for model, satellite_constellations, wkt in geographies:
+            model_images = model_image_dates.get((model, satellite_constellations))
+            if model_images is None:
+                model_images = models.ModelImageDatesModel(Model=model, SatelliteConstellations=json.loads(satellite_constellations), DatesByGeog=[])
+                model_image_dates[(model, satellite_constellations)] = model_images
+            model_images.DatesByGeog.append(models.DatesByGeogModel(Wkt=wkt, Dates=dates_by_geography.get((model, satellite_constellations, wkt), [])))
+
+        return models.SearchAvailableImageryData(ModelImageDates=list(model_image_dates.values()))
@@ -0,0 +1,149 @@
+from datetime import date
+from typing import List, Optional
+
+import numpy as np
+
+import models
+
+
+class AvailabilityIndex:
+    """
+    Index of the imagery dates of a SearchAvailableImageryData, with a date bitset per geography.
+
+    Every DatesByGeog entry becomes a row, a bitset over the sorted dates found in the search, so common dates,
+    all dates and date coverage are computed with vectorized bitwise operations instead of loops over date strings.
+    Rows of the same geography, e.g. of several models, are combined with a bitwise or where geographies are counted.
+
+    Usage:
+
+        index = AvailabilityIndex.from_search_result(search_result.Data).filter(model="Stratus2")
+        common_dates = index.dates_in_all()
+        first_date = index.first_date_covering(0.9)
+    """
+
+    def __init__(
+        self,
+        dates: np.ndarray,
+        model_names: np.ndarray,
+        satellite_constellations: List[tuple],
+        wkts: np.ndarray,
+        bitsets: np.ndarray,
+    ):
+        self.dates = dates
+        self.model_names = model_names
+        self.satellite_constellations = satellite_constellations
+        self.wkts = wkts
+        self._bitsets = bitsets
+
+    @staticmethod
+    def from_search_result(data: models.SearchAvailableImageryData) -> "AvailabilityIndex":
+        rows = [(model.Model, tuple(model.SatelliteConstellations), geog) for model in data.ModelImageDates for geog in model.DatesByGeog]
+        date_strings = [date_string for _, _, geog in rows for date_string in geog.Dates]
+
+        # numpy parses ISO dates in C, far faster than strptime per date
+        row_dates = np.array(date_strings, dtype="datetime64[D]")
+        dates = np.unique(row_dates)
+        row_indices = np.repeat(np.arange(len(rows)), [len(geog.Dates) for _, _, geog in rows])
+
+        bits = np.zeros((len(rows), len(dates)), dtype=bool)
+        bits[row_indices, np.searchsorted(dates, row_dates)] = True
+
+        return AvailabilityIndex(
+            dates,
+            np.array([model_name for model_name, _, _ in rows], dtype=object),
+            [satellite_constellations for _, satellite_constellations, _ in rows],
+            np.array([geog.Wkt for _, _, geog in rows], dtype=object),
+            np.packbits(bits, axis=1),
+        )
+
+    def __len__(self) -> int:
+        return len(self.wkts)
+
+    @property
+    def geography_count(self) -> int:
+        return len(np.unique(self.wkts))
+
+    def filter(
+        self,
+        model: Optional[str] = None,
+        satellite_constellation: Optional[str] = None,
+    ) -> "AvailabilityIndex":
+        """
+        Returns the index of the rows of a model and/or including a satellite constellation, compared case-insensitively.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if model is not None:
+            keep &= np.array([model_name.lower() == model.lower() for model_name in self.model_names], dtype=bool)
+        if satellite_constellation is not None:
+            keep &= np.array([satellite_constellation.lower() in (name.lower() for name in names) for names in self.satellite_constellations], dtype=bool)
+
+        return AvailabilityIndex(
+            self.dates,
+            self.model_names[keep],
+            [names for names, kept in zip(self.satellite_constellations, keep) if kept],
+            self.wkts[keep],
+            self._bitsets[keep],
+        )
+
+    def dates_of(
+        self,
+        wkt: str,
+    ) -> List[date]:
+        """
+        Returns the dates with imagery of a geography, over all of its rows.
+        """
+        rows = self._bitsets[self.wkts == wkt]
+        return self._to_dates(np.bitwise_or.reduce(rows, axis=0) if len(rows) else None)
+
+    def dates_in_all(self) -> List[date]:
+        """
+        Returns the dates with imagery for every geography.
+        """
+        geography_bitsets = self._geography_bitsets()
+        return self._to_dates(np.bitwise_and.reduce(geography_bitsets, axis=0) if len(geography_bitsets) else None)
+
+    def dates_in_any(self) -> List[date]:
+        """
+        Returns the dates with imagery for at least one geography.
+        """
+        geography_bitsets = self._geography_bitsets()
+        return self._to_dates(np.bitwise_or.reduce(geography_bitsets, axis=0) if len(geography_bitsets) else None)
+
+    def coverage(self) -> np.ndarray:
+        """
+        Returns the fraction of geographies with imagery on each of self.dates.
+        """
+        geography_bitsets = self._geography_bitsets()
+        if not len(geography_bitsets):
+            return np.zeros(len(self.dates))
+        return np.unpackbits(geography_bitsets, axis=1, count=len(self.dates)).sum(axis=0) / len(geography_bitsets)
+
+    def first_date_covering(
+        self,
+        fraction: float,
+        on_or_after: Optional[date] = None,
+    ) -> Optional[date]:
+        """
+        Returns the first date with imagery for at least fraction (0-1) of the geographies, optionally not before on_or_after.
+        """
+        candidates = self.coverage() >= fraction
+        if on_or_after is not None:
+            candidates &= self.dates >= np.datetime64(on_or_after, "D")
+
+        matches = np.flatnonzero(candidates)
+        return self.dates[matches[0]].item() if len(matches) else None
+
+    def _geography_bitsets(self) -> np.ndarray:
+        """
+        Helper method combining the rows of each geography with a bitwise or.
+        """
+        if not len(self):
+            return self._bitsets
+        order = np.argsort(self.wkts, kind="stable")
+        _, starts = np.unique(self.wkts[order], return_index=True)
+        return np.bitwise_or.reduceat(self._bitsets[order], starts, axis=0)
+
+    def _to_dates(self, bitset: Optional[np.ndarray]) -> List[date]:
+        if bitset is None:
+            return []
+        return self.dates[np.unpackbits(bitset, count=len(self.dates)).astype(bool)].tolist()
@@ -0,0 +1,226 @@
+from concurrent.futures import ThreadPoolExecutor
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import requests
+
+# endpoints which can be repeated without side effects, the others (composites, tasking order creation and
+# cancellation) consume API requests or credits and are never retried
+IDEMPOTENT_METHODS = {
+    "get_api_key_info",
+    "search_available_imagery",
+    "retrieve_estimate_for_process_composite_of_satellite_imagery",
+    "get_tasking_models",
+    "get_tasking_orders",
+    "search_orderable_tiles",
+    "retrieve_estimate_for_tasking_order",
+}
+
+THROTTLING_STATUS_CODES = {429, 503}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ThrottledError(Exception):
+    """
+    Raised for throttling responses of requests made by batch jobs, see ClearSkyVisionAPI.raising_on_throttling.
+    """
+
+    def __init__(
+        self,
+        status_code: int,
+        headers=None,
+    ):
+        super().__init__(f"request throttled with status {status_code}")
+        self.status_code = status_code
+        self.retry_after_seconds = _parse_retry_after(headers)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD (additive increase, multiplicative decrease) concurrency limit.
+
+    Every successful request raises the limit by additive_increase / limit, i.e. by additive_increase per round of
+    requests, up to max_concurrency. Throttling responses, or latencies above latency_target_seconds when set,
+    multiply the limit by decrease_factor, at most once per cooldown_seconds so a burst of failures from the same
+    round only counts once.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        initial_concurrency: Optional[int] = None,
+        additive_increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_target_seconds: Optional[float] = None,
+        cooldown_seconds: float = 1.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(max_concurrency, initial_concurrency or max(1, max_concurrency // 2)))
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.latency_target_seconds = latency_target_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(
+        self,
+        latency_seconds: float,
+        throttled: bool,
+    ):
+        with self._condition:
+            self.in_flight -= 1
+            too_slow = self.latency_target_seconds is not None and latency_seconds > self.latency_target_seconds
+
+            if throttled or too_slow:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown_seconds:
+                    self.limit = max(1.0, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + self.additive_increase / self.limit)
+
+            self._condition.notify_all()
+
+
+class BatchJob:
+    """
+    A call of a ClearSkyVisionAPI method as part of a batch.
+
+    idempotent: whether the call may be retried, defaults to whether the method is in IDEMPOTENT_METHODS.
+    request_parameters: optional value identifying the job in its outcome, e.g. the request DTO.
+    """
+
+    def __init__(
+        self,
+        function: Callable,
+        args: Sequence = (),
+        kwargs: Optional[Dict[str, Any]] = None,
+        idempotent: Optional[bool] = None,
+        request_parameters: Any = None,
+    ):
+        self.function = function
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.idempotent = getattr(function, "__name__", None) in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        self.request_parameters = request_parameters
+
+
+class BatchJobOutcome:
+    """
+    Outcome of a BatchJob.
+
+    result is the return value of the last attempt, error the exception it raised, status_code the HTTP status of
+    its throttled response, or else of its last response (None when served from a cache).
+    """
+
+    def __init__(
+        self,
+        index: int,
+        request_parameters: Any,
+    ):
+        self.index = index
+        self.request_parameters = request_parameters
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.status_code: Optional[int] = None
+        self.attempts = 0
+        self.elapsed_seconds = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        if self.error is not None:
+            return False
+        return getattr(self.result, "Succeeded", True) is not False
+
+    def __repr__(self):
+        return f"BatchJobOutcome(index={self.index}, succeeded={self.succeeded}, status_code={self.status_code}, attempts={self.attempts})"
+
+
+def execute_batch(
+    api_service,
+    jobs: List[BatchJob],
+    max_concurrency: Optional[int] = None,
+    max_retries: int = 4,
+    backoff_base_seconds: float = 0.5,
+    backoff_max_seconds: float = 30.0,
+    latency_target_seconds: Optional[float] = None,
+    on_outcome: Optional[Callable[[BatchJobOutcome], None]] = None,
+) -> List[BatchJobOutcome]:
+    """
+    Runs jobs against api_service with adaptive concurrency, returning an outcome per job in the order of jobs.
+
+    Concurrency is tuned by an AdaptiveConcurrencyLimiter up to max_concurrency, which defaults to the
+    max_concurrent_connections of the service. Jobs run within api_service.raising_on_throttling, so a throttled
+    request ends its job with a ThrottledError, also when the job makes several requests. Idempotent jobs failing
+    with a connection error or a 429/5xx response are retried up to max_retries times with full jitter exponential
+    backoff, honoring Retry-After headers.
+    Failing jobs never abort the batch, their outcome holds the error instead. on_outcome is called from the worker
+    threads with the outcome of every finished job, e.g. to record progress while the batch is running.
+    """
+    max_concurrency = max_concurrency or api_service.max_concurrent_connections
+    limiter = AdaptiveConcurrencyLimiter(max_concurrency, latency_target_seconds=latency_target_seconds)
+    outcomes = [BatchJobOutcome(index, job.request_parameters) for index, job in enumerate(jobs)]
+
+    def run_job(index: int):
+        job = jobs[index]
+        outcome = outcomes[index]
+        job_start = time.perf_counter()
+
+        while True:
+            outcome.attempts += 1
+            outcome.result, outcome.error = None, None
+            api_service.clear_last_response()
+
+            throttled_error: Optional[ThrottledError] = None
+            limiter.acquire()
+            request_start = time.perf_counter()
+            try:
+                with api_service.raising_on_throttling():
+                    outcome.result = job.function(*job.args, **job.kwargs)
+            except ThrottledError as e:
+                outcome.error = throttled_error = e
+            except Exception as e:
+                outcome.error = e
+            finally:
+                outcome.status_code = throttled_error.status_code if throttled_error is not None else api_service.last_response_status_code
+                limiter.release(time.perf_counter() - request_start, throttled_error is not None)
+
+            failed_transiently = outcome.status_code in RETRYABLE_STATUS_CODES or (outcome.error is not None and _is_connection_error(outcome.error))
+            if not failed_transiently or not job.idempotent or outcome.attempts > max_retries:
+                break
+
+            backoff_seconds = random.uniform(0, min(backoff_max_seconds, backoff_base_seconds * 2 ** (outcome.attempts - 1)))
+            retry_after = throttled_error.retry_after_seconds if throttled_error is not None else _parse_retry_after(api_service.last_response_headers)
+            time.sleep(max(backoff_seconds, retry_after or 0))
+
+        outcome.elapsed_seconds = time.perf_counter() - job_start
+        if on_outcome is not None:
+            on_outcome(outcome)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        list(executor.map(run_job, range(len(jobs))))
+
+    return outcomes
+
+
+def _is_connection_error(error: BaseException) -> bool:
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError))
+
+
+def _parse_retry_after(headers) -> Optional[float]:
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,203 @@
+from contextlib import contextmanager
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import models
+from tools.batch_executor import BatchJob, BatchJobOutcome
+from tools.composite_cache import canonical_command_key
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# commands per transaction when adding commands to the journal
+INSERT_BATCH_SIZE = 1000
+
+
+class BatchJournal:
+    """
+    SQLite journal of the composite commands of a batch, recording the state, output path and error of every job.
+
+    Jobs are keyed on the canonical key of their command, so adding the commands of a manifest again after a crash
+    or restart keeps the recorded state, and incomplete_jobs returns only the work remaining. Every state change is
+    committed immediately, so the journal is never behind by more than the jobs in flight.
+
+    Usage:
+
+        journal = BatchJournal("batch.sqlite")
+        journal.add_commands(commands)
+        run_journaled_batch(api_service, journal, "./files/")
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+    ):
+        self.database_path = database_path
+        self._lock = threading.Lock()
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_key TEXT PRIMARY KEY, position INTEGER NOT NULL, command TEXT NOT NULL, state TEXT NOT NULL, "
+                "file_path TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, position)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            with connection:  # commits on success, rolls back on exceptions
+                yield connection
+        finally:
+            connection.close()
+
+    def add_commands(
+        self,
+        commands: Iterable[models.ProcessCompositeCommandDto],
+    ) -> int:
+        """
+        Adds commands as pending jobs, ignoring commands already in the journal.
+
+        Returns the number of jobs added.
+        """
+        with self._connect() as connection:
+            position = connection.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM jobs").fetchone()[0]
+            changes_before = connection.total_changes
+            rows = []
+            for command in commands:
+                rows.append((canonical_command_key(command), position, command.model_dump_json(), JOB_PENDING, time.time()))
+                position += 1
+                if len(rows) >= INSERT_BATCH_SIZE:
+                    connection.executemany("INSERT OR IGNORE INTO jobs (job_key, position, command, state, updated_at) VALUES (?, ?, ?, ?, ?)", rows)
+                    rows = []
+            connection.executemany("INSERT OR IGNORE INTO jobs (job_key, position, command, state, updated_at) VALUES (?, ?, ?, ?, ?)", rows)
+            return connection.total_changes - changes_before
+
+    def recover(self) -> int:
+        """
+        Returns jobs left running by an interrupted run, and completed jobs whose file no longer exists, to pending.
+
+        Returns the number of jobs recovered.
+        """
+        with self._connect() as connection:
+            completed_jobs = connection.execute("SELECT job_key, file_path FROM jobs WHERE state = ?", (JOB_COMPLETED,)).fetchall()
+            missing_files = [(JOB_PENDING, job_key) for job_key, file_path in completed_jobs if not os.path.exists(file_path)]
+            connection.executemany("UPDATE jobs SET state = ?, file_path = NULL WHERE job_key = ?", missing_files)
+            interrupted = connection.execute("UPDATE jobs SET state = ? WHERE state = ?", (JOB_PENDING, JOB_RUNNING)).rowcount
+        return len(missing_files) + interrupted
+
+    def incomplete_jobs(
+        self,
+        max_attempts: Optional[int] = None,
+    ) -> List[Tuple[str, models.ProcessCompositeCommandDto]]:
+        """
+        Returns the job keys and commands of the pending and failed jobs, in the order they were added.
+
+        Failed jobs with max_attempts attempts or more are left out.
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT job_key, command FROM jobs WHERE (state = ? OR (state = ? AND attempts < ?)) ORDER BY position",
+                (JOB_PENDING, JOB_FAILED, max_attempts if max_attempts is not None else 2**62),
+            ).fetchall()
+        return [(job_key, models.ProcessCompositeCommandDto.model_validate_json(command)) for job_key, command in rows]
+
+    def mark_running(
+        self,
+        job_key: str,
+    ):
+        self._update(job_key, "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE job_key = ?", (JOB_RUNNING, time.time(), job_key))
+
+    def mark_completed(
+        self,
+        job_key: str,
+        file_path: str,
+    ):
+        self._update(job_key, "UPDATE jobs SET state = ?, file_path = ?, error = NULL, updated_at = ? WHERE job_key = ?", (JOB_COMPLETED, file_path, time.time(), job_key))
+
+    def mark_failed(
+        self,
+        job_key: str,
+        error: str,
+    ):
+        self._update(job_key, "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE job_key = ?", (JOB_FAILED, error, time.time(), job_key))
+
+    def _update(
+        self,
+        job_key: str,
+        statement: str,
+        parameters: tuple,
+    ):
+        with self._lock, self._connect() as connection:
+            connection.execute(statement, parameters)
+
+    def state_counts(self) -> Dict[str, int]:
+        """
+        Returns the number of jobs per state.
+        """
+        with self._connect() as connection:
+            return dict(connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def jobs(
+        self,
+        state: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Returns the job_key, state, file_path, error and attempts of the jobs, optionally only those in state.
+        """
+        query = "SELECT job_key, state, file_path, error, attempts FROM jobs"
+        parameters: tuple = ()
+        if state is not None:
+            query, parameters = query + " WHERE state = ?", (state,)
+
+        with self._connect() as connection:
+            rows = connection.execute(query + " ORDER BY position", parameters).fetchall()
+        return [dict(zip(("job_key", "state", "file_path", "error", "attempts"), row)) for row in rows]
+
+
+def run_journaled_batch(
+    api_service,
+    journal: BatchJournal,
+    directory_to_save_files: str,
+    max_concurrency: Optional[int] = None,
+    max_attempts: Optional[int] = None,
+    resume_attempts: int = 0,
+    on_job_finished: Optional[Callable[[str, BatchJobOutcome], None]] = None,
+) -> Dict[str, int]:
+    """
+    Runs the incomplete jobs of a journal with api_service.execute_batch, recording every job as it starts and finishes.
+
+    Jobs interrupted by a previous run are run again, continuing partial downloads from their .incomplete files, and
+    failed jobs until they reach max_attempts attempts. Composites are saved in directory_to_save_files. Every finished
+    job is passed to on_job_finished with its job key, e.g. to report progress.
+
+    Returns the number of jobs per state afterwards.
+    """
+    journal.recover()
+    incomplete_jobs = journal.incomplete_jobs(max_attempts)
+
+    def process_composite(job_key: str, command: models.ProcessCompositeCommandDto):
+        journal.mark_running(job_key)
+        return api_service.process_composite_of_satellite_imagery(directory_to_save_files, command, show_progress=False, resume_attempts=resume_attempts)
+
+    def record_outcome(outcome: BatchJobOutcome):
+        job_key = outcome.request_parameters
+        if outcome.error is not None:
+            journal.mark_failed(job_key, str(outcome.error) or type(outcome.error).__name__)
+        elif isinstance(outcome.result, str):
+            journal.mark_completed(job_key, outcome.result)
+        else:
+            journal.mark_failed(job_key, outcome.result.Error.Message if outcome.result.Error else f"status code {outcome.status_code}")
+
+        if on_job_finished is not None:
+            on_job_finished(job_key, outcome)
+
+    jobs = [BatchJob(process_composite, args=(job_key, command), idempotent=False, request_parameters=job_key) for job_key, command in incomplete_jobs]
+    api_service.execute_batch(jobs, max_concurrency=max_concurrency, on_outcome=record_outcome)
+    return journal.state_counts()
@@ -0,0 +1,119 @@
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import shapely
+
+import models
+from tools.availability_cache import canonical_geometry_key
+from tools.batch_executor import BatchJob
+
+# bytes of the query JSON besides the geometry WKTs
+QUERY_OVERHEAD_BYTES = 128
+
+
+def search_available_imagery_in_bulk(
+    api_service,
+    geometries: Sequence[Union[str, shapely.Geometry]],
+    from_date: Optional[date] = None,
+    until_date: Optional[date] = None,
+    max_payload_bytes: int = 512 * 2**10,
+    max_geometries_per_request: int = 500,
+    max_concurrency: Optional[int] = None,
+) -> List[Union[models.SearchAvailableImageryData, models.ServiceResultError]]:
+    """
+    Search Available Imagery for many geometries with few requests.
+
+    Geometries (Polygons or MultiPolygons in EPSG:4326) are deduplicated and packed into GeometryCollection queries of
+    at most max_payload_bytes and max_geometries_per_request geometries, which are sent concurrently with
+    api_service.execute_batch. The DatesByGeog entries of the responses are mapped back to the geometries they
+    belong to.
+
+    Returns, in the order of geometries, a SearchAvailableImageryData holding only the DatesByGeog of each geometry,
+    or the error of the request it was part of.
+    """
+    wkts: List[str] = []
+    key_indices: Dict[str, int] = {}
+    unique_indices: List[int] = []
+    for geometry in geometries:
+        parsed_geometry = shapely.from_wkt(geometry) if isinstance(geometry, str) else geometry
+        if parsed_geometry.geom_type not in ("Polygon", "MultiPolygon"):
+            raise ValueError(f"Unsupported geometry type {parsed_geometry.geom_type}, only Polygon and MultiPolygon are supported")
+
+        key = canonical_geometry_key(parsed_geometry)
+        if key not in key_indices:
+            key_indices[key] = len(wkts)
+            wkts.append(geometry if isinstance(geometry, str) else shapely.to_wkt(geometry, rounding_precision=-1))
+        unique_indices.append(key_indices[key])
+
+    chunks: List[List[int]] = []
+    chunk_bytes = 0
+    for index, wkt in enumerate(wkts):
+        wkt_bytes = len(wkt) + 2
+        if not chunks or len(chunks[-1]) >= max_geometries_per_request or chunk_bytes + wkt_bytes > max_payload_bytes - QUERY_OVERHEAD_BYTES:
+            chunks.append([])
+            chunk_bytes = 0
+        chunks[-1].append(index)
+        chunk_bytes += wkt_bytes
+
+    jobs = [
+        BatchJob(
+            api_service.search_available_imagery,
+            args=(models.SearchAvailableImageryQueryDto(Wkt=f"GEOMETRYCOLLECTION ({', '.join(wkts[index] for index in chunk)})", From=from_date, Until=until_date),),
+            request_parameters=chunk,
+        )
+        for chunk in chunks
+    ]
+
+    unique_results: List[Union[models.SearchAvailableImageryData, models.ServiceResultError, None]] = [None] * len(wkts)
+    for chunk, outcome in zip(chunks, api_service.execute_batch(jobs, max_concurrency=max_concurrency)):
+        if outcome.succeeded and outcome.result.Data is not None:
+            for index, data in zip(chunk, _split_by_geometry([wkts[index] for index in chunk], outcome.result.Data)):
+                unique_results[index] = data
+        else:
+            error = outcome.result if isinstance(outcome.result, models.ServiceResultError) else _error_result(outcome)
+            for index in chunk:
+                unique_results[index] = error
+
+    return [unique_results[index] for index in unique_indices]  # type: ignore
+
+
+def _split_by_geometry(
+    wkts: List[str],
+    data: models.SearchAvailableImageryData,
+) -> List[models.SearchAvailableImageryData]:
+    """
+    Helper method distributing the DatesByGeog entries of the response to a packed query over its geometries.
+
+    Entries are matched on their normalized geometry, or else to the geometry they overlap the most.
+    """
+    geometries = shapely.from_wkt(wkts)
+    key_indices = {canonical_geometry_key(geometry): index for index, geometry in enumerate(geometries)}
+    tree: Optional[shapely.STRtree] = None
+
+    model_image_dates: List[Dict[tuple, models.ModelImageDatesModel]] = [{} for _ in wkts]
+    for model in data.ModelImageDates:
+        for geog in model.DatesByGeog:
+            geog_geometry = shapely.from_wkt(geog.Wkt)
+            index = key_indices.get(canonical_geometry_key(geog_geometry))
+            if index is None:
+                tree = tree or shapely.STRtree(geometries)
+                candidates = tree.query(geog_geometry, predicate="intersects")
+                if not len(candidates):
+                    continue
+                overlaps = shapely.area(shapely.intersection(geometries[candidates], geog_geometry)) / shapely.area(shapely.union(geometries[candidates], geog_geometry))
+                index = int(candidates[np.argmax(overlaps)])
+
+            group_key = (model.Model, tuple(model.SatelliteConstellations))
+            model_images = model_image_dates[index].get(group_key)
+            if model_images is None:
+                model_images = models.ModelImageDatesModel(Model=model.Model, SatelliteConstellations=model.SatelliteConstellations, DatesByGeog=[])
+                model_image_dates[index][group_key] = model_images
+            model_images.DatesByGeog.append(geog)
+
+    return [models.SearchAvailableImageryData(ModelImageDates=list(model_images.values())) for model_images in model_image_dates]
+
+
+def _error_result(outcome) -> models.ServiceResultError:
+    message = str(outcome.error) if outcome.error is not None else "search of available imagery failed"
+    return models.ServiceResultError(Succeeded=False, Error=models.ErrorModel(Message=message, Code=outcome.status_code or 0), Data=None)
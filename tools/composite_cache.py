@@ -0,0 +1,165 @@
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import uuid
+from typing import Iterator, Optional
+
+from pydantic import BaseModel
+
+FICLONE = 0x40049409  # linux ioctl for reflinking a file on copy-on-write filesystems (btrfs, xfs)
+
+
+def canonical_command_key(command: BaseModel) -> str:
+    """
+    Returns the sha256 hex digest of the canonical JSON of a command.
+
+    Byte-identical commands, regardless of field order, produce the same key.
+    """
+    canonical_json = json.dumps(command.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical_json.encode("utf-8")).hexdigest()
+
+
+def link_or_copy_file(source_path: str, target_path: str):
+    """
+    Places source_path at target_path without copying data where the filesystem allows it.
+
+    Tries a hard link, then a reflink, and falls back to a regular copy. An existing target_path is replaced.
+    """
+    temporary_path = f"{target_path}.{uuid.uuid4()}.tmp"
+    try:
+        os.link(source_path, temporary_path)
+    except OSError:
+        if not _reflink(source_path, temporary_path):
+            shutil.copyfile(source_path, temporary_path)
+    os.replace(temporary_path, target_path)
+
+
+def _reflink(source_path: str, target_path: str) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+
+    import fcntl
+
+    try:
+        with open(source_path, "rb") as source, open(target_path, "wb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        return True
+    except OSError:
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        return False
+
+
+class CompositeCache:
+    """
+    Content-addressed on-disk cache of downloaded composites.
+
+    Composites are keyed on the canonical JSON of the ProcessCompositeCommandDto, so re-running an identical command
+    costs neither bandwidth nor credits. The index is an SQLite database in the cache directory, which survives
+    restarts and can be shared by several processes. When the total size exceeds max_size_bytes, the least recently
+    used composites are evicted.
+
+    Cached files are handed out as hard links where possible, treat them as read-only.
+    """
+
+    def __init__(
+        self,
+        cache_directory: str,
+        max_size_bytes: int = 50 * 2**30,
+    ):
+        self.cache_directory = cache_directory
+        self.max_size_bytes = max_size_bytes
+        self._objects_directory = os.path.join(cache_directory, "objects")
+        self._index_path = os.path.join(cache_directory, "index.sqlite")
+
+        os.makedirs(self._objects_directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS composites (key TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS composites_last_access ON composites (last_access)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self._index_path, timeout=30)
+        try:
+            with connection:  # commits on success, rolls back on exceptions
+                yield connection
+        finally:
+            connection.close()
+
+    def _object_path(self, key: str) -> str:
+        return os.path.join(self._objects_directory, key[:2], key)
+
+    def get(
+        self,
+        command: BaseModel,
+        directory_to_save_file: str,
+    ) -> Optional[str]:
+        """
+        Places the cached composite for command in directory_to_save_file.
+
+        Returns the path of the file, or None if the command is not cached.
+        """
+        key = canonical_command_key(command)
+        with self._connect() as connection:
+            row = connection.execute("SELECT filename FROM composites WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            object_path = self._object_path(key)
+            if not os.path.isfile(object_path):
+                connection.execute("DELETE FROM composites WHERE key = ?", (key,))
+                return None
+
+            connection.execute("UPDATE composites SET last_access = ? WHERE key = ?", (time.time(), key))
+
+        os.makedirs(directory_to_save_file, exist_ok=True)
+        file_path = os.path.join(directory_to_save_file, row[0])
+        link_or_copy_file(object_path, file_path)
+        return file_path
+
+    def put(
+        self,
+        command: BaseModel,
+        file_path: str,
+    ):
+        """
+        Adds the composite downloaded for command to the cache, then evicts least recently used composites if needed.
+        """
+        key = canonical_command_key(command)
+        object_path = self._object_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        link_or_copy_file(file_path, object_path)
+
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO composites (key, filename, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, os.path.basename(file_path), os.path.getsize(object_path), time.time()),
+            )
+
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used composites until the cache fits within max_size_bytes.
+        """
+        with self._connect() as connection:
+            total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM composites").fetchone()[0]
+            if total_size <= self.max_size_bytes:
+                return
+
+            for key, size in connection.execute("SELECT key, size FROM composites ORDER BY last_access").fetchall():
+                if total_size <= self.max_size_bytes:
+                    break
+                connection.execute("DELETE FROM composites WHERE key = ?", (key,))
+                if os.path.exists(self._object_path(key)):
+                    os.remove(self._object_path(key))
+                total_size -= size
+
+    def size_bytes(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COALESCE(SUM(size), 0) FROM composites").fetchone()[0]
@@ -0,0 +1,167 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import Callable, List, Optional, Sequence
+
+import models
+
+STAGE_PENDING = "pending"
+STAGE_ESTIMATING = "estimating"
+STAGE_DOWNLOADING = "downloading"
+STAGE_COMPLETED = "completed"
+STAGE_REJECTED = "rejected"  # the estimate exceeded the budget, no composite was requested
+STAGE_FAILED = "failed"
+
+
+class CompositePipelineJob:
+    """
+    A composite command moving through the estimate, budget check, composite and download stages of run_composite_pipeline.
+
+    estimate: response of the estimate request.
+    file_path: path of the downloaded composite once completed.
+    error: error message of a rejected or failed job.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        command: models.ProcessCompositeCommandDto,
+    ):
+        self.index = index
+        self.command = command
+        self.stage = STAGE_PENDING
+        self.estimate: Optional[models.ProcessCompositeEstimateQueryResponseDto] = None
+        self.file_path: Optional[str] = None
+        self.error: Optional[str] = None
+
+    @property
+    def credit_estimate(self) -> Optional[float]:
+        if self.estimate is None or self.estimate.Data is None:
+            return None
+        return self.estimate.Data.CreditEstimate
+
+    def __repr__(self):
+        return f"CompositePipelineJob(index={self.index}, stage={self.stage}, credit_estimate={self.credit_estimate}, file_path={self.file_path})"
+
+
+class CreditBudget:
+    """
+    Thread-safe credit budget, reserving the estimated credits of composites before they are requested.
+    """
+
+    def __init__(
+        self,
+        credits: Optional[float] = None,
+        max_credits_per_composite: Optional[float] = None,
+    ):
+        self.remaining_credits = credits
+        self.max_credits_per_composite = max_credits_per_composite
+        self._lock = threading.Lock()
+
+    def reserve(
+        self,
+        credits: float,
+    ) -> Optional[str]:
+        """
+        Reserves credits, returning the reason if they are not within the budget.
+        """
+        if self.max_credits_per_composite is not None and credits > self.max_credits_per_composite:
+            return f"estimate of {credits} credits exceeds the maximum of {self.max_credits_per_composite} credits per composite"
+
+        with self._lock:
+            if self.remaining_credits is not None:
+                if credits > self.remaining_credits:
+                    return f"estimate of {credits} credits exceeds the remaining budget of {self.remaining_credits} credits"
+                self.remaining_credits -= credits
+        return None
+
+    def release(
+        self,
+        credits: float,
+    ):
+        with self._lock:
+            if self.remaining_credits is not None:
+                self.remaining_credits += credits
+
+
+def run_composite_pipeline(
+    api_service,
+    directory_to_save_files: str,
+    commands: Sequence[models.ProcessCompositeCommandDto],
+    credit_budget: Optional[float] = None,
+    max_credits_per_composite: Optional[float] = None,
+    max_concurrency: Optional[int] = None,
+    on_job_finished: Optional[Callable[[CompositePipelineJob], None]] = None,
+) -> List[CompositePipelineJob]:
+    """
+    Estimates, budget checks and downloads composites, with every job moving through the stages on its own.
+
+    Unlike estimating all commands before requesting any composite, a composite is requested as soon as its own
+    estimate returns, so slow estimates do not hold back downloads and the max_concurrency connections, by default
+    the max_concurrent_connections of the service, never idle between stages. Composites are only requested while their
+    estimated credits fit within credit_budget and max_credits_per_composite; credits of failed composites are
+    released again.
+
+    Failing jobs never abort the pipeline. on_job_finished is called from the worker threads with every finished job,
+    e.g. to process composites while others are still downloading. Returns the jobs in the order of commands.
+    """
+    jobs = [CompositePipelineJob(index, command) for index, command in enumerate(commands)]
+    budget = CreditBudget(credit_budget, max_credits_per_composite)
+
+    def run_job(job: CompositePipelineJob):
+        try:
+            _run_job(api_service, directory_to_save_files, job, budget)
+        except Exception as e:
+            job.stage, job.error = STAGE_FAILED, str(e)
+
+        if on_job_finished is not None:
+            on_job_finished(job)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency or api_service.max_concurrent_connections) as executor:
+        list(executor.map(run_job, jobs))
+
+    return jobs
+
+
+def estimate_query_for_command(command: models.ProcessCompositeCommandDto) -> models.ProcessCompositeEstimateQueryDto:
+    """
+    Returns the estimate query with the fields of a composite command.
+    """
+    estimate_fields = models.ProcessCompositeEstimateQueryDto.model_fields
+    return models.ProcessCompositeEstimateQueryDto.model_construct(**{name: getattr(command, name) for name in estimate_fields})
+
+
+def _run_job(
+    api_service,
+    directory_to_save_files: str,
+    job: CompositePipelineJob,
+    budget: CreditBudget,
+):
+    """
+    Helper method moving a job through all stages.
+    """
+    job.stage = STAGE_ESTIMATING
+    job.estimate = api_service.retrieve_estimate_for_process_composite_of_satellite_imagery(estimate_query_for_command(job.command))
+
+    if job.credit_estimate is None or not job.estimate.Succeeded:
+        job.stage = STAGE_FAILED
+        job.error = job.estimate.Error.Message if job.estimate.Error else "estimate failed"
+        return
+
+    rejection = budget.reserve(job.credit_estimate)
+    if rejection is not None:
+        job.stage, job.error = STAGE_REJECTED, rejection
+        return
+
+    job.stage = STAGE_DOWNLOADING
+    try:
+        result = api_service.process_composite_of_satellite_imagery(directory_to_save_files, job.command, show_progress=False)
+    except Exception:
+        budget.release(job.credit_estimate)
+        raise
+
+    if not isinstance(result, str):
+        budget.release(job.credit_estimate)
+        job.stage, job.error = STAGE_FAILED, result.Error.Message
+        return
+
+    job.stage, job.file_path = STAGE_COMPLETED, result
@@ -0,0 +1,466 @@
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+
+import models
+from tools.batch_executor import BatchJob, BatchJobOutcome
+from tools.crs_transformer import get_transformer
+
+SQUARE_METERS_PER_KM2 = 1e6
+WGS84_EPSG = 4326
+# fraction of a pixel by which bounds may miss the pixel grid, e.g. after a round trip through EPSG:4326 WKT
+PIXEL_TOLERANCE = 1e-3
+
+
+class CompositePiece:
+    """
+    A part of the geometry of a composite command, within one cell of a UTM grid.
+
+    command: composite command of the piece, the original command with the piece geometry as Wkt.
+    grid_bounds: (min_x, min_y, max_x, max_y) of the grid cell in grid_epsg.
+    area_km2: area of the piece geometry in grid_epsg.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        command: models.ProcessCompositeCommandDto,
+        grid_epsg: int,
+        grid_bounds: Tuple[float, float, float, float],
+        area_km2: float,
+    ):
+        self.index = index
+        self.command = command
+        self.grid_epsg = grid_epsg
+        self.grid_bounds = grid_bounds
+        self.area_km2 = area_km2
+
+    def __repr__(self):
+        return f"CompositePiece(index={self.index}, grid_epsg={self.grid_epsg}, grid_bounds={self.grid_bounds}, area_km2={self.area_km2:.2f})"
+
+
+class CompositeManifest:
+    """
+    Pieces of a split composite command and the outcomes of their downloads.
+
+    The pieces follow one UTM grid, aligned to the pixel resolution of the command, so the downloaded files of a
+    command projected to grid_epsg form a seamless mosaic, e.g. as a GDAL virtual mosaic built with
+    gdalbuildvrt from file_paths.
+    """
+
+    def __init__(
+        self,
+        command: models.ProcessCompositeCommandDto,
+        pieces: List[CompositePiece],
+        outcomes: List[BatchJobOutcome],
+    ):
+        self.command = command
+        self.pieces = pieces
+        self.outcomes = outcomes
+
+    @property
+    def succeeded(self) -> bool:
+        return all(outcome.succeeded for outcome in self.outcomes)
+
+    @property
+    def file_paths(self) -> List[str]:
+        """
+        Paths of the downloaded pieces, in the order of the pieces.
+        """
+        return [outcome.result for outcome in self.outcomes if outcome.succeeded and isinstance(outcome.result, str)]
+
+    def to_dict(self) -> dict:
+        pieces = []
+        for piece, outcome in zip(self.pieces, self.outcomes):
+            error = None
+            if outcome.error is not None:
+                error = str(outcome.error)
+            elif isinstance(outcome.result, models.ServiceResultError):
+                error = outcome.result.Error.Message
+
+            pieces.append(
+                {
+                    "index": piece.index,
+                    "wkt": piece.command.Wkt,
+                    "grid_epsg": piece.grid_epsg,
+                    "grid_bounds": list(piece.grid_bounds),
+                    "area_km2": piece.area_km2,
+                    "succeeded": outcome.succeeded,
+                    "status_code": outcome.status_code,
+                    "file_path": outcome.result if outcome.succeeded and isinstance(outcome.result, str) else None,
+                    "error": error,
+                }
+            )
+
+        return {"command": self.command.model_dump(mode="json"), "succeeded": self.succeeded, "pieces": pieces}
+
+    def write(
+        self,
+        file_path: str,
+    ):
+        incomplete_file_path = file_path + ".incomplete"
+        with open(incomplete_file_path, "w") as manifest_file:
+            json.dump(self.to_dict(), manifest_file, indent=2)
+        os.replace(incomplete_file_path, file_path)
+
+
+def split_composite_command(
+    command: models.ProcessCompositeCommandDto,
+    max_area_km2: float,
+    safety_factor: float = 0.95,
+) -> List[CompositePiece]:
+    """
+    Partitions the geometry of a composite command into pieces of at most safety_factor * max_area_km2 each.
+
+    The pieces are the intersections of the geometry with the cells of a square grid in the UTM projection of the
+    command, or the UTM zone of the geometry centroid if the command is not projected to UTM. Cell sides are a
+    multiple of the command resolution, so pieces are aligned to the pixel grid. A command whose geometry is within
+    the limit is returned as the only piece, unchanged.
+    """
+    geometry = command_geometry(command)
+    grid_epsg = command.EpsgProjection if is_utm_epsg(command.EpsgProjection) else utm_epsg_for_geometry(geometry)
+    projected_geometry = transform_geometries(geometry, WGS84_EPSG, grid_epsg)
+
+    max_area_m2 = max_area_km2 * SQUARE_METERS_PER_KM2
+    if projected_geometry.area <= max_area_m2 * safety_factor:
+        return [CompositePiece(0, command, grid_epsg, projected_geometry.bounds, projected_geometry.area / SQUARE_METERS_PER_KM2)]
+
+    resolution = command.Resolution
+    cell_size = max(1, math.floor(math.sqrt(max_area_m2 * safety_factor) / resolution)) * resolution
+
+    min_x, min_y, max_x, max_y = projected_geometry.bounds
+    cell_x, cell_y = np.meshgrid(
+        np.arange(math.floor(min_x / cell_size) * cell_size, max_x, cell_size),
+        np.arange(math.floor(min_y / cell_size) * cell_size, max_y, cell_size),
+    )
+    cells = shapely.box(cell_x.ravel(), cell_y.ravel(), cell_x.ravel() + cell_size, cell_y.ravel() + cell_size)
+
+    shapely.prepare(projected_geometry)
+    cells = cells[shapely.intersects(projected_geometry, cells)]
+    parts = np.array([polygonal_part(part) for part in shapely.intersection(cells, projected_geometry)], dtype=object)
+    areas = shapely.area(parts)
+    cells, parts, areas = cells[areas > 0], parts[areas > 0], areas[areas > 0]
+
+    # densify the cell edges, which are curved in EPSG:4326
+    parts = transform_geometries(shapely.segmentize(parts, cell_size / 16), grid_epsg, WGS84_EPSG)
+    wkts = shapely.to_wkt(parts, rounding_precision=-1)
+
+    return [
+        CompositePiece(index, command.model_copy(update={"Wkt": wkt, "GeoJson": None}), grid_epsg, tuple(shapely.bounds(cell).tolist()), float(area) / SQUARE_METERS_PER_KM2)
+        for index, (cell, wkt, area) in enumerate(zip(cells, wkts, areas))
+    ]
+
+
+def process_composite_in_pieces(
+    api_service,
+    directory_to_save_files: str,
+    command: models.ProcessCompositeCommandDto,
+    max_area_km2: Optional[float] = None,
+    max_concurrency: Optional[int] = None,
+    safety_factor: float = 0.95,
+) -> CompositeManifest:
+    """
+    Splits a composite command exceeding the MaxCompositeAreaKm2 of the API key with split_composite_command, and
+    downloads the pieces concurrently with api_service.execute_batch.
+
+    Every piece is saved to its own piece_<index> subdirectory of directory_to_save_files, and the manifest is
+    written to manifest.json in directory_to_save_files, so use one directory per command.
+    """
+    if max_area_km2 is None:
+        api_key_info = api_service.get_api_key_info()
+        assert api_key_info.Data is not None
+        max_area_km2 = api_key_info.Data.MaxCompositeAreaKm2
+
+    pieces = split_composite_command(command, max_area_km2, safety_factor)
+    jobs = [
+        BatchJob(
+            api_service.process_composite_of_satellite_imagery,
+            args=(os.path.join(directory_to_save_files, f"piece_{piece.index:05d}"), piece.command),
+            kwargs={"show_progress": False},
+            request_parameters=piece,
+        )
+        for piece in pieces
+    ]
+    outcomes = api_service.execute_batch(jobs, max_concurrency=max_concurrency)
+
+    manifest = CompositeManifest(command, pieces, outcomes)
+    os.makedirs(directory_to_save_files, exist_ok=True)
+    manifest.write(os.path.join(directory_to_save_files, "manifest.json"))
+    return manifest
+
+
+class CoalescedComposite:
+    """
+    A composite command merging the nearby geometries of several composite commands into one request.
+
+    indices: indices of the merged commands in the commands passed to coalesce_composite_commands.
+    member_bounds: (min_x, min_y, max_x, max_y) of each merged geometry in grid_epsg.
+    windows: (column_offset, row_offset, width, height) of each merged geometry in the raster of the command, assuming
+    the raster covers the bounding box of the merged geometries with pixels aligned to multiples of the resolution.
+    None unless the command is projected to UTM. Use windows_in_raster for the windows in a downloaded raster.
+    outcome: outcome of the download by process_coalesced_composites.
+    """
+
+    def __init__(
+        self,
+        command: models.ProcessCompositeCommandDto,
+        grid_epsg: int,
+        indices: List[int],
+        member_bounds: List[Tuple[float, float, float, float]],
+        windows: Optional[List[Tuple[int, int, int, int]]],
+    ):
+        self.command = command
+        self.grid_epsg = grid_epsg
+        self.indices = indices
+        self.member_bounds = member_bounds
+        self.windows = windows
+        self.outcome: Optional[BatchJobOutcome] = None
+
+    @property
+    def file_path(self) -> Optional[str]:
+        if self.outcome is None or not self.outcome.succeeded or not isinstance(self.outcome.result, str):
+            return None
+        return self.outcome.result
+
+    def window_of(
+        self,
+        index: int,
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Returns the window of the command at index in the original commands.
+        """
+        if self.windows is None:
+            return None
+        return self.windows[self.indices.index(index)]
+
+    def windows_in_raster(
+        self,
+        geotransform: Sequence[float],
+    ) -> List[Tuple[int, int, int, int]]:
+        """
+        Returns the window of each merged geometry in a downloaded north-up raster, given its GDAL geotransform
+        (origin_x, pixel_width, 0, origin_y, 0, -pixel_height), e.g. from rasterio's dataset.transform.to_gdal().
+
+        Unlike windows, this makes no assumption about the extent and alignment of the raster returned by the API.
+        The raster is in the EpsgProjection of the command, so the command must be projected to UTM.
+        """
+        if not is_utm_epsg(self.command.EpsgProjection):
+            raise ValueError(f"windows are only known for commands projected to UTM, not EPSG:{self.command.EpsgProjection}")
+
+        origin_x, pixel_width, _, origin_y, _, pixel_height = geotransform
+        return [_raster_window(origin_x, origin_y, pixel_width, -pixel_height, member_bound) for member_bound in self.member_bounds]
+
+    def __repr__(self):
+        return f"CoalescedComposite(commands={len(self.indices)}, grid_epsg={self.grid_epsg})"
+
+
+def coalesce_composite_commands(
+    commands: Sequence[models.ProcessCompositeCommandDto],
+    max_area_km2: float,
+    max_gap_meters: float = 1000.0,
+    safety_factor: float = 0.95,
+) -> List[CoalescedComposite]:
+    """
+    Merges composite commands of nearby geometries into fewer commands, e.g. for many small, adjacent field polygons.
+
+    Only commands identical apart from their geometry are merged. Geometries are clustered greedily with an STRtree:
+    a cluster grows by the geometries within max_gap_meters of its bounding box, as long as the bounding box stays
+    within safety_factor * max_area_km2, and is requested as the union of its geometries, so overlapping pixels are
+    processed once. Returns the merged commands ordered by their first original command.
+    """
+    groups: Dict[str, List[int]] = {}
+    for index, command in enumerate(commands):
+        group_key = json.dumps(command.model_dump(mode="json", exclude={"Wkt", "GeoJson"}), sort_keys=True)
+        groups.setdefault(group_key, []).append(index)
+
+    coalesced_composites = []
+    for indices in groups.values():
+        coalesced_composites.extend(_coalesce_group(commands, indices, max_area_km2 * SQUARE_METERS_PER_KM2 * safety_factor, max_gap_meters))
+
+    return sorted(coalesced_composites, key=lambda coalesced_composite: coalesced_composite.indices[0])
+
+
+def _coalesce_group(
+    commands: Sequence[models.ProcessCompositeCommandDto],
+    indices: List[int],
+    max_area_m2: float,
+    max_gap_meters: float,
+) -> List[CoalescedComposite]:
+    """
+    Helper method clustering the geometries of commands which only differ by geometry.
+    """
+    first_command = commands[indices[0]]
+    geometries = np.array([command_geometry(commands[index]) for index in indices], dtype=object)
+    if is_utm_epsg(first_command.EpsgProjection):
+        grid_epsg = first_command.EpsgProjection
+    else:
+        grid_epsg = utm_epsg_for_geometry(shapely.box(*shapely.total_bounds(geometries)))
+
+    bounds = shapely.bounds(transform_geometries(geometries, WGS84_EPSG, grid_epsg))
+    tree = shapely.STRtree(shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]))
+    assigned = np.zeros(len(indices), dtype=bool)
+
+    coalesced_composites = []
+    # seed clusters row by row, so clusters grow in a consistent direction
+    for seed in np.lexsort((bounds[:, 0], -bounds[:, 3])):
+        if assigned[seed]:
+            continue
+
+        members = [seed]
+        assigned[seed] = True
+        cluster_bounds = bounds[seed].copy()
+        grown = True
+        while grown:
+            grown = False
+            search_box = shapely.box(cluster_bounds[0] - max_gap_meters, cluster_bounds[1] - max_gap_meters, cluster_bounds[2] + max_gap_meters, cluster_bounds[3] + max_gap_meters)
+            for candidate in np.sort(tree.query(search_box)):
+                if assigned[candidate]:
+                    continue
+
+                merged_bounds = np.concatenate([np.minimum(cluster_bounds[:2], bounds[candidate, :2]), np.maximum(cluster_bounds[2:], bounds[candidate, 2:])])
+                if (merged_bounds[2] - merged_bounds[0]) * (merged_bounds[3] - merged_bounds[1]) > max_area_m2:
+                    continue
+
+                members.append(candidate)
+                assigned[candidate] = True
+                cluster_bounds = merged_bounds
+                grown = True
+
+        members.sort()
+        if len(members) == 1:
+            command = commands[indices[members[0]]]
+        else:
+            merged_geometry = polygonal_part(shapely.union_all(geometries[members]))
+            command = first_command.model_copy(update={"Wkt": shapely.to_wkt(merged_geometry, rounding_precision=-1), "GeoJson": None})
+
+        member_bounds = [tuple(bounds[member].tolist()) for member in members]
+        windows = None
+        if is_utm_epsg(command.EpsgProjection):
+            origin_x = _floor_pixels(cluster_bounds[0] / command.Resolution) * command.Resolution
+            origin_y = _ceil_pixels(cluster_bounds[3] / command.Resolution) * command.Resolution
+            windows = [_raster_window(origin_x, origin_y, command.Resolution, command.Resolution, member_bound) for member_bound in member_bounds]
+
+        coalesced_composites.append(CoalescedComposite(command, grid_epsg, [indices[member] for member in members], member_bounds, windows))
+
+    return coalesced_composites
+
+
+def _raster_window(
+    origin_x: float,
+    origin_y: float,
+    pixel_width: float,
+    pixel_height: float,
+    bounds,
+) -> Tuple[int, int, int, int]:
+    """
+    Helper method returning the (column_offset, row_offset, width, height) of the pixels covering bounds in a north-up
+    raster with its top left corner at (origin_x, origin_y).
+    """
+    column_offset = _floor_pixels((bounds[0] - origin_x) / pixel_width)
+    row_offset = _floor_pixels((origin_y - bounds[3]) / pixel_height)
+    width = _ceil_pixels((bounds[2] - origin_x) / pixel_width) - column_offset
+    height = _ceil_pixels((origin_y - bounds[1]) / pixel_height) - row_offset
+    return column_offset, row_offset, width, height
+
+
+def _floor_pixels(pixels: float) -> int:
+    """
+    Helper method flooring a number of pixels, ignoring the error of coordinates reprojected to EPSG:4326 and back.
+    """
+    return math.floor(pixels + PIXEL_TOLERANCE)
+
+
+def _ceil_pixels(pixels: float) -> int:
+    """
+    Helper method ceiling a number of pixels, ignoring the error of coordinates reprojected to EPSG:4326 and back.
+    """
+    return math.ceil(pixels - PIXEL_TOLERANCE)
+
+
+def process_coalesced_composites(
+    api_service,
+    directory_to_save_files: str,
+    commands: Sequence[models.ProcessCompositeCommandDto],
+    max_area_km2: Optional[float] = None,
+    max_gap_meters: float = 1000.0,
+    max_concurrency: Optional[int] = None,
+) -> List[CoalescedComposite]:
+    """
+    Merges commands with coalesce_composite_commands and downloads one composite per merged command concurrently
+    with api_service.execute_batch. The outcome of every download is set on its CoalescedComposite.
+    """
+    if max_area_km2 is None:
+        api_key_info = api_service.get_api_key_info()
+        assert api_key_info.Data is not None
+        max_area_km2 = api_key_info.Data.MaxCompositeAreaKm2
+
+    coalesced_composites = coalesce_composite_commands(commands, max_area_km2, max_gap_meters)
+    jobs = [
+        BatchJob(
+            api_service.process_composite_of_satellite_imagery,
+            args=(directory_to_save_files, coalesced_composite.command),
+            kwargs={"show_progress": False},
+            request_parameters=coalesced_composite,
+        )
+        for coalesced_composite in coalesced_composites
+    ]
+
+    for coalesced_composite, outcome in zip(coalesced_composites, api_service.execute_batch(jobs, max_concurrency=max_concurrency)):
+        coalesced_composite.outcome = outcome
+
+    return coalesced_composites
+
+
+def command_geometry(command: Any) -> shapely.Geometry:
+    """
+    Returns the shapely geometry of the Wkt or GeoJson of a command or query.
+    """
+    if command.Wkt:
+        return shapely.from_wkt(command.Wkt)
+    if isinstance(command.GeoJson, models.CompactGeoJsonModel):
+        return command.GeoJson.to_shapely()
+    return shapely.from_wkt(command.GeoJson.to_wkt())
+
+
+def polygonal_part(geometry: shapely.Geometry) -> shapely.Geometry:
+    """
+    Returns the polygons of a geometry as a Polygon or MultiPolygon, e.g. dropping the lines and points of an intersection.
+    """
+    if geometry.geom_type in ("Polygon", "MultiPolygon"):
+        return geometry
+
+    polygons = [part for part in shapely.get_parts(geometry) if part.geom_type in ("Polygon", "MultiPolygon")]
+    polygons = [polygon for part in polygons for polygon in shapely.get_parts(part)]
+    if len(polygons) == 1:
+        return polygons[0]
+    return shapely.multipolygons(polygons) if polygons else shapely.Polygon()
+
+
+def is_utm_epsg(epsg: int) -> bool:
+    return 32601 <= epsg <= 32660 or 32701 <= epsg <= 32760
+
+
+def utm_epsg_for_geometry(geometry: shapely.Geometry) -> int:
+    """
+    Returns the EPSG code of the WGS84 UTM zone of the centroid of a geometry in EPSG:4326.
+    """
+    centroid = geometry.centroid
+    zone = min(60, int((centroid.x + 180) // 6) + 1)
+    return (32600 if centroid.y >= 0 else 32700) + zone
+
+
+def transform_geometries(geometries, epsg_from: int, epsg_to: int):
+    """
+    Reprojects a geometry or an array of geometries, transforming all coordinates in one pyproj call.
+    """
+    transformer = get_transformer(epsg_from, epsg_to)
+
+    def project(coordinates: np.ndarray) -> np.ndarray:
+        x, y = transformer.transform(coordinates[:, 0], coordinates[:, 1])
+        return np.column_stack([x, y])
+
+    return shapely.transform(geometries, project)
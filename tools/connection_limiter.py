@@ -0,0 +1,212 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+    import msvcrt
+
+
+class ConnectionLimiter(ABC):
+    """
+    Base class of limiters of the concurrent connections of an API key, shared by every ClearSkyVisionAPI using it,
+    also in other processes or on other hosts depending on the backend.
+
+    acquire returns a token for the slot, passed to release when the connection is done, or None on timeout.
+    acquire and release are called from the threads making requests and must be thread-safe.
+    """
+
+    @abstractmethod
+    def acquire(
+        self,
+        timeout: Optional[float] = None,
+    ) -> Optional[object]:
+        pass
+
+    @abstractmethod
+    def release(
+        self,
+        token: object,
+    ):
+        pass
+
+    @contextmanager
+    def slot(
+        self,
+        timeout: Optional[float] = None,
+    ) -> Iterator[object]:
+        token = self.acquire(timeout)
+        if token is None:
+            raise TimeoutError(f"no connection slot became free within {timeout} seconds")
+        try:
+            yield token
+        finally:
+            self.release(token)
+
+
+class FileLockConnectionLimiter(ConnectionLimiter):
+    """
+    Connection limiter shared by all processes on a host, holding an exclusive lock on one of max_connections slot
+    files in directory per connection.
+
+    Locks are released by the operating system when a process dies, so crashed workers never leak slots.
+    Waiting threads poll the slot files, backing off from poll_interval_seconds up to 50 ms.
+
+    Usage:
+
+        limiter = FileLockConnectionLimiter("/tmp/clearsky-slots", api_key_info.Data.MaxConcurrentConnections)
+        api_service = ClearSkyVisionAPI(api_key, connection_limiter=limiter)
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_connections: int,
+        poll_interval_seconds: float = 0.002,
+    ):
+        self.directory = directory
+        self.max_connections = max_connections
+        self.poll_interval_seconds = poll_interval_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def acquire(
+        self,
+        timeout: Optional[float] = None,
+    ) -> Optional[Tuple[int, int]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        poll_interval_seconds = self.poll_interval_seconds
+        while True:
+            # starting at a random slot spreads the lock attempts of waiting threads over the slot files
+            first_slot = random.randrange(self.max_connections)
+            for offset in range(self.max_connections):
+                slot = (first_slot + offset) % self.max_connections
+                file_descriptor = os.open(os.path.join(self.directory, f"slot-{slot}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+                if _try_lock(file_descriptor):
+                    return slot, file_descriptor
+                os.close(file_descriptor)
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval_seconds)
+            poll_interval_seconds = min(0.05, poll_interval_seconds * 2)
+
+    def release(
+        self,
+        token: Tuple[int, int],
+    ):
+        _, file_descriptor = token
+        _unlock(file_descriptor)
+        os.close(file_descriptor)
+
+
+def _try_lock(file_descriptor: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(file_descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(file_descriptor, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(file_descriptor: int):
+    if fcntl is not None:
+        fcntl.flock(file_descriptor, fcntl.LOCK_UN)
+    else:
+        os.lseek(file_descriptor, 0, os.SEEK_SET)
+        msvcrt.locking(file_descriptor, msvcrt.LK_UNLCK, 1)
+
+
+class HttpConnectionLimiter(ConnectionLimiter):
+    """
+    Connection limiter shared by processes on several hosts, leasing slots from a limiter service, e.g. the one
+    served by tools/mock_server.py, keyed on the API key.
+
+    The service answers POST {url}/limiter/acquire with 200 and a LeaseId while fewer than max_connections leases of
+    the key are held, otherwise with 429. Leases expire after lease_seconds unless renewed, so slots of crashed
+    workers are freed; a background thread renews the leases held by this limiter every lease_seconds / 3.
+    Failing releases are ignored rather than failing the request holding the slot, the lease then expires instead.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        max_connections: int,
+        lease_seconds: float = 30.0,
+        poll_interval_seconds: float = 0.005,
+        request_timeout_seconds: float = 5.0,
+    ):
+        self.url = url.rstrip("/")
+        self.max_connections = max_connections
+        self.lease_seconds = lease_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.request_timeout_seconds = request_timeout_seconds
+        self._session = requests.Session()
+        self._session.headers.update({"x-api-key": api_key})
+        self._leases: Dict[str, float] = {}
+        self._leases_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._renew_thread: Optional[threading.Thread] = None
+
+    def acquire(
+        self,
+        timeout: Optional[float] = None,
+    ) -> Optional[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        poll_interval_seconds = self.poll_interval_seconds
+        while True:
+            response = self._session.post(
+                f"{self.url}/limiter/acquire",
+                json={"MaxConnections": self.max_connections, "LeaseSeconds": self.lease_seconds},
+                timeout=self.request_timeout_seconds,
+            )
+            if response.status_code == 200:
+                lease_id = response.json()["Data"]["LeaseId"]
+                with self._leases_lock:
+                    self._leases[lease_id] = time.monotonic()
+                    if self._renew_thread is None:
+                        self._renew_thread = threading.Thread(target=self._renew_leases, daemon=True)
+                        self._renew_thread.start()
+                return lease_id
+            if response.status_code != 429:
+                raise Exception(f"connection limiter at {self.url} answered acquire with status {response.status_code}")
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval_seconds)
+            poll_interval_seconds = min(0.1, poll_interval_seconds * 2)
+
+    def release(
+        self,
+        token: str,
+    ):
+        with self._leases_lock:
+            self._leases.pop(token, None)
+        try:
+            self._session.post(f"{self.url}/limiter/release", json={"LeaseId": token}, timeout=self.request_timeout_seconds)
+        except requests.exceptions.RequestException:
+            pass  # no longer renewed, the lease expires after lease_seconds
+
+    def close(self):
+        self._closed.set()
+        self._session.close()
+
+    def _renew_leases(self):
+        while not self._closed.wait(self.lease_seconds / 3):
+            with self._leases_lock:
+                lease_ids = list(self._leases)
+            if lease_ids:
+                try:
+                    self._session.post(f"{self.url}/limiter/renew", json={"LeaseIds": lease_ids, "LeaseSeconds": self.lease_seconds}, timeout=self.request_timeout_seconds)
+                except requests.exceptions.RequestException:
+                    pass  # retried on the next renewal, leases outlive a few missed renewals
@@ -0,0 +1,40 @@
+from functools import lru_cache
+
+from pyproj import CRS, Transformer
+
+
+def get_transformer(crs_from, crs_to) -> Transformer:
+    """
+    Returns a cached always_xy Transformer between two CRSs, given as anything CRS.from_user_input accepts,
+    e.g. EPSG codes, "EPSG:32632", pyproj CRS objects or dicts of projection parameters.
+
+    Equivalent CRSs given in different forms share a transformer, as they are keyed on their WKT.
+    """
+    return _get_transformer(crs_key(crs_from), crs_key(crs_to))
+
+
+def crs_key(crs) -> str:
+    """
+    Returns the WKT of a CRS, a hashable key for CRSs given in any form.
+    """
+    if isinstance(crs, dict):
+        try:
+            return _dict_crs_key(tuple(sorted(crs.items())))
+        except TypeError:  # unhashable parameter values, e.g. lists
+            return CRS.from_user_input(crs).to_wkt()
+    return _crs_key(crs)
+
+
+@lru_cache(maxsize=None)
+def _crs_key(crs) -> str:
+    return CRS.from_user_input(crs).to_wkt()
+
+
+@lru_cache(maxsize=None)
+def _dict_crs_key(items: tuple) -> str:
+    return CRS.from_user_input(dict(items)).to_wkt()
+
+
+@lru_cache(maxsize=None)
+def _get_transformer(crs_from: str, crs_to: str) -> Transformer:
+    return Transformer.from_crs(CRS.from_wkt(crs_from), CRS.from_wkt(crs_to), always_xy=True)
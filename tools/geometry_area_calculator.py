@@ -1,6 +1,18 @@
+from typing import Sequence, Union
+
+import numpy as np
+import shapely
 from shapely import wkt
-from pyproj import CRS, Transformer
-from shapely.ops import transform
+
+from tools.crs_transformer import get_transformer
+
+DEFAULT_AEA_PARAMS = {
+    "proj": "aea",
+    "lat_1": 20,  # First standard parallel
+    "lat_2": 50,  # Second standard parallel
+    "lat_0": 0,  # Latitude of origin
+    "lon_0": 0,  # Central meridian
+}
 
 
 def calculate_area_ratio(wkt1: str, wkt2: str, crs_from=4326, aea_params=None):
@@ -18,29 +30,72 @@ def calculate_area_ratio(wkt1: str, wkt2: str, crs_from=4326, aea_params=None):
     Returns:
         float: The area ratio of the two geometries.
     """
-    geom1 = wkt.loads(wkt1)
-    geom2 = wkt.loads(wkt2)
+    area1, area2 = calculate_projected_areas([wkt.loads(wkt1), wkt.loads(wkt2)], crs_from, aea_params)
 
-    if aea_params is None:
-        aea_params = {
-            "proj": "aea",
-            "lat_1": 20,  # First standard parallel
-            "lat_2": 50,  # Second standard parallel
-            "lat_0": 0,  # Latitude of origin
-            "lon_0": 0,  # Central meridian
-        }
-    aea_crs = CRS.from_user_input(aea_params)
+    if area2 == 0:
+        raise ValueError("The area of the second geometry is zero, cannot compute ratio.")
 
-    transformer = Transformer.from_crs(crs_from, aea_crs, always_xy=True)
-    project = lambda x, y: transformer.transform(x, y)
+    return float(area1 / area2)
 
-    geom1_projected = transform(project, geom1)  # type: ignore
-    geom2_projected = transform(project, geom2)  # type: ignore
 
-    area1 = geom1_projected.area
-    area2 = geom2_projected.area
+def calculate_area_ratios(geometries1: Sequence[Union[str, shapely.Geometry]], geometries2: Sequence[Union[str, shapely.Geometry]], crs_from=4326, aea_params=None) -> np.ndarray:
+    """
+    Calculate the area ratios of many pairs of geometries using the Albers Equal Area projection,
+    e.g. the AreasOfInterestWkt of tasking order estimates versus the requested areas of interest.
 
-    if area2 == 0:
-        raise ValueError("The area of the second geometry is zero, cannot compute ratio.")
+    The coordinates of all geometries are reprojected in a single vectorized pyproj call, and areas are computed
+    with the shapely array functions.
+
+    Parameters:
+        geometries1: WKTs or shapely geometries of the first geometries.
+        geometries2: WKTs or shapely geometries of the second geometries, of the same length as geometries1.
+        crs_from (str): Original CRS of the geometries (default is EPSG:4326 for WGS84).
+        aea_params (dict): Parameters for the AEA projection, see calculate_area_ratio.
+
+    Returns:
+        np.ndarray: The area ratio of each pair, NaN where the area of the second geometry is zero.
+    """
+    geometry_array1 = _to_geometry_array(geometries1)
+    geometry_array2 = _to_geometry_array(geometries2)
+    if geometry_array1.shape != geometry_array2.shape:
+        raise ValueError("geometries1 and geometries2 must have the same length.")
+
+    areas = calculate_projected_areas(np.concatenate([geometry_array1, geometry_array2]), crs_from, aea_params)
+    areas1, areas2 = areas[: len(geometry_array1)], areas[len(geometry_array1) :]
 
-    return area1 / area2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(areas2 == 0, np.nan, areas1 / areas2)
+
+
+def calculate_projected_areas(geometries: Sequence[Union[str, shapely.Geometry]], crs_from=4326, aea_params=None) -> np.ndarray:
+    """
+    Calculate the areas of geometries in square meters in the Albers Equal Area projection.
+
+    Parameters:
+        geometries: WKTs or shapely geometries.
+        crs_from (str): Original CRS of the geometries (default is EPSG:4326 for WGS84).
+        aea_params (dict): Parameters for the AEA projection, see calculate_area_ratio.
+
+    Returns:
+        np.ndarray: The area of each geometry.
+    """
+    transformer = get_transformer(crs_from, aea_params or DEFAULT_AEA_PARAMS)
+
+    def project(coordinates: np.ndarray) -> np.ndarray:
+        x, y = transformer.transform(coordinates[:, 0], coordinates[:, 1])
+        return np.column_stack([x, y])
+
+    # shapely.transform passes the coordinates of all geometries to project at once
+    projected_geometries = shapely.transform(_to_geometry_array(geometries), project)
+    return shapely.area(projected_geometries)
+
+
+def _to_geometry_array(geometries) -> np.ndarray:
+    """
+    Returns WKTs and shapely geometries, also mixed, as an array of shapely geometries. Other values raise TypeError.
+    """
+    geometry_array = np.array(geometries, dtype=object)
+    is_geometry = shapely.is_geometry(geometry_array)
+    if not is_geometry.all():
+        geometry_array[~is_geometry] = shapely.from_wkt(geometry_array[~is_geometry])
+    return geometry_array
@@ -0,0 +1,513 @@
+"""
+Local stand-in for the ClearSKY Vision API, for load tests and benchmarks without spending credits.
+"""
+
+from datetime import date, timedelta
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+import uuid
+
+from shapely import wkt
+from shapely.geometry import GeometryCollection, shape
+
+MOCK_API_KEY = "mock-api-key"
+KM2_PER_SQUARE_DEGREE_AT_EQUATOR = 111.32**2
+MOCK_IMAGERY_EPOCH = date(2015, 1, 1)
+
+
+class MockClearSkyServer:
+    """
+    Threaded HTTP server implementing every endpoint used by ClearSkyVisionAPI with synthetic data.
+
+    latency_seconds: server processing time added before every response.
+    composite_latency_seconds: additional processing time of composite requests.
+    bandwidth_bytes_per_second: per connection bandwidth of composite downloads, None for unlimited.
+    error_rate: fraction of requests answered with a 500 error.
+    max_concurrent_connections: requests in flight above this limit are answered with 429, as reported by the
+    api key info endpoint.
+    composite_size_bytes: size of the synthetic composite files, which support Range requests.
+    max_composite_area_km2: composites of larger geometries are answered with 400, as reported by the api key info endpoint.
+    drop_after_bytes: when set, the connection of composite downloads is closed after this many bytes of the body,
+    for the next drop_count downloads or all of them if drop_count is None.
+    supports_ranges: when False, Range headers are ignored and the whole composite is sent with 200.
+
+    Range requests are answered with 206, or 416 when starting beyond the composite. A Range with an If-Range other
+    than the current etag is ignored, so tests can replace composite and etag to simulate a changed composite.
+
+    Tasking tiles are served from a synthetic 0.2 degree grid. Tiles found by geometry are kept in tiles by Guid, and
+    searches by TileGuids only return those, so tests can remove or change tiles to simulate changes of the catalog.
+
+    The server also serves the connection limiter service used by tools.connection_limiter.HttpConnectionLimiter
+    under /limiter/.
+
+    Usage:
+
+        with MockClearSkyServer(latency_seconds=0.05) as server:
+            api_service = ClearSkyVisionAPI(MOCK_API_KEY)
+            api_service.BASE_URL = server.url
+    """
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.0,
+        composite_latency_seconds: float = 0.0,
+        bandwidth_bytes_per_second: Optional[float] = None,
+        error_rate: float = 0.0,
+        max_concurrent_connections: int = 10,
+        composite_size_bytes: int = 2**20,
+        max_composite_area_km2: int = 500,
+        drop_after_bytes: Optional[int] = None,
+        drop_count: Optional[int] = None,
+        supports_ranges: bool = True,
+        api_key: str = MOCK_API_KEY,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.latency_seconds = latency_seconds
+        self.composite_latency_seconds = composite_latency_seconds
+        self.bandwidth_bytes_per_second = bandwidth_bytes_per_second
+        self.error_rate = error_rate
+        self.max_concurrent_connections = max_concurrent_connections
+        self.max_composite_area_km2 = max_composite_area_km2
+        self.api_key = api_key
+        self.composite = os.urandom(composite_size_bytes)
+        self.etag = '"mock-composite"'
+        self.drop_after_bytes = drop_after_bytes
+        self.drop_count = drop_count
+        self.supports_ranges = supports_ranges
+        self.tiles: Dict[str, dict] = {}
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.request_counts: Dict[str, int] = {}
+        self.status_counts: Dict[int, int] = {}
+        self.connection_leases = ConnectionLeaseTable()
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockClearSkyServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _enter_request(self, path: str) -> bool:
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return self.in_flight <= self.max_concurrent_connections
+
+    def _take_drop(self) -> Optional[int]:
+        """
+        Returns the number of body bytes after which to drop the connection of a composite download, if any.
+        """
+        with self._lock:
+            if self.drop_after_bytes is None or self.drop_count == 0:
+                return None
+            if self.drop_count is not None:
+                self.drop_count -= 1
+            return self.drop_after_bytes
+
+    def _exit_request(self, status_code: int):
+        with self._lock:
+            self.in_flight -= 1
+            self.status_counts[status_code] = self.status_counts.get(status_code, 0) + 1
+
+    # -----------------------------------
+    # Synthetic responses
+    # -----------------------------------
+
+    def api_key_info(self) -> dict:
+        return {
+            "Key": self.api_key,
+            "CreditAmount": 1000.0,
+            "EuroCreditAmount": 1000.0,
+            "CreditLimit": 0,
+            "EuroCreditLimit": 0,
+            "ContactInfo": "mock",
+            "Email": None,
+            "MaxConcurrentConnections": self.max_concurrent_connections,
+            "MaxCompositeAreaKm2": self.max_composite_area_km2,
+            "MaxTotalBands": 10,
+            "CurrentMonthCosts": 0.0,
+            "NextMonthCosts": 0.0,
+        }
+
+    def search_available(self, body: dict) -> dict:
+        start = date.fromisoformat(body.get("From") or "2024-01-01")
+        end = date.fromisoformat(body.get("Until") or start.isoformat())
+        dates_by_geog = []
+        for geometry_wkt in _split_geometries(body):
+            # every geometry has imagery every 1 to 5 days, depending on the geometry
+            step = 1 + int(hashlib.sha256(geometry_wkt.encode("utf-8")).hexdigest(), 16) % 5
+            # anchored to a fixed date, so overlapping searches return the same dates
+            first_day = -(start - MOCK_IMAGERY_EPOCH).days % step
+            days = range(first_day, (end - start).days + 1, step)
+            dates_by_geog.append({"Wkt": geometry_wkt, "Dates": [(start + timedelta(days=day)).isoformat() for day in days]})
+
+        return {
+            "ModelImageDates": [
+                {"Model": "Stratus2", "SatelliteConstellations": ["Sentinel1", "Sentinel2", "Landsat89"], "DatesByGeog": dates_by_geog},
+            ]
+        }
+
+    def composite_estimate(self, body: dict) -> dict:
+        area_km2 = _area_km2(_geometry(body))
+        return {"AreaEstimateKm2": area_km2, "CreditEstimate": round(area_km2 * 0.1, 4)}
+
+    def tasking_models(self) -> dict:
+        return {
+            "TaskingModels": [
+                {
+                    "Model": "Stratus2",
+                    "SupportedSatelliteConstellations": [
+                        {"SatelliteConstellation": "Sentinel1", "Optional": False},
+                        {"SatelliteConstellation": "Sentinel2", "Optional": False},
+                        {"SatelliteConstellation": "Landsat89", "Optional": True},
+                    ],
+                }
+            ]
+        }
+
+    def task_order(self, body: Optional[dict] = None) -> dict:
+        body = body or {"ReferenceDate": "2024-11-01", "From": "2024-11-01", "To": None, "Model": "Stratus2", "SatelliteConstellations": ["Sentinel1", "Sentinel2"]}
+        return {
+            "TaskOrderGuid": str(uuid.uuid4()),
+            "BillingCycle": "Monthly",
+            "OrderingProcessStatus": "Completed",
+            "StorageMonths": body.get("StorageMonths", 1),
+            "ApiRequests": body.get("ApiRequests", 1),
+            "ImageFrequency": body.get("ImageFrequency", 1),
+            "TaskOrderAreaKm2": 1.0,
+            "Model": body["Model"],
+            "ReferenceDate": body["ReferenceDate"],
+            "From": body["From"],
+            "To": body.get("To"),
+            "SatelliteConstellations": body["SatelliteConstellations"],
+            "Tiles": None,
+            "Wkt": body.get("Wkt"),
+        }
+
+    def search_tiles(self, body: dict) -> dict:
+        if body.get("TileGuids"):
+            with self._lock:
+                return {"Tiles": [self.tiles[str(guid)] for guid in body["TileGuids"] if str(guid) in self.tiles]}
+
+        minx, miny, maxx, maxy = _geometry(body).bounds
+        tiles = []
+        # 0.2 degree synthetic tile grid covering the query geometry
+        for x in range(int(minx // 0.2), int(maxx // 0.2) + 1):
+            for y in range(int(miny // 0.2), int(maxy // 0.2) + 1):
+                tile_bounds = (round(x * 0.2, 6), round(y * 0.2, 6), round((x + 1) * 0.2, 6), round((y + 1) * 0.2, 6))
+                guid = uuid.uuid5(uuid.NAMESPACE_URL, f"mock-tile-{x}-{y}")
+                epsg = 32600 + int((tile_bounds[0] + 180) // 6) + 1
+                tile_wkt = "POLYGON (({0} {1}, {2} {1}, {2} {3}, {0} {3}, {0} {1}))".format(*tile_bounds)
+                tiles.append({"Guid": str(guid), "Epsg": str(epsg), "DataGeogWkt": tile_wkt})
+        with self._lock:
+            for tile in tiles:
+                self.tiles.setdefault(tile["Guid"], tile)
+            return {"Tiles": [self.tiles[tile["Guid"]] for tile in tiles]}
+
+    def tasking_estimate(self, body: dict) -> dict:
+        geometry = _geometry(body)
+        area_km2 = _area_km2(geometry)
+        aoi_count = len(geometry.geoms) if isinstance(geometry, GeometryCollection) else 1
+        bounding_boxes = GeometryCollection([shape(_box(part.bounds)) for part in (geometry.geoms if isinstance(geometry, GeometryCollection) else [geometry])])
+        return {
+            "StorageMonths": body["StorageMonths"],
+            "ApiRequests": body["ApiRequests"],
+            "Model": body["Model"],
+            "CancellationDate": body["From"],
+            "AreaKm2": max(area_km2, aoi_count),
+            "AreaKm2BeforeMinimum1Km2PerAoi": area_km2,
+            "CurrentMonthCost": 1.0,
+            "NextMonthCost": 1.0,
+            "Costs": {
+                "CurrencyCode": "EUR",
+                "CurrentMonthOrderCostEstimate": 1.0,
+                "CurrentMonthStorageCosts": 0.1,
+                "NextMonthOrderCostEstimate": 1.0,
+                "NextMonthStorageCosts": 0.1,
+            },
+            "Tiles": None,
+            "AreasOfInterestWkt": bounding_boxes.wkt,
+            "SatelliteConstellations": body["SatelliteConstellations"],
+            "ImageDates": [body["From"]],
+        }
+
+
+class ConnectionLeaseTable:
+    """
+    Server side of tools.connection_limiter.HttpConnectionLimiter, the connection leases held per API key with their expiry times.
+    """
+
+    def __init__(self):
+        self._leases: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(
+        self,
+        key: str,
+        max_connections: int,
+        lease_seconds: float,
+    ) -> Optional[str]:
+        """
+        Returns a new lease id, or None if max_connections unexpired leases of key are held.
+        """
+        now = time.monotonic()
+        with self._lock:
+            leases = self._leases.setdefault(key, {})
+            for lease_id in [lease_id for lease_id, expires_at in leases.items() if expires_at <= now]:
+                del leases[lease_id]
+            if len(leases) >= max_connections:
+                return None
+
+            lease_id = uuid.uuid4().hex
+            leases[lease_id] = now + lease_seconds
+            return lease_id
+
+    def renew(
+        self,
+        key: str,
+        lease_ids,
+        lease_seconds: float,
+    ):
+        expires_at = time.monotonic() + lease_seconds
+        with self._lock:
+            leases = self._leases.get(key, {})
+            for lease_id in lease_ids:
+                if lease_id in leases:
+                    leases[lease_id] = expires_at
+
+    def release(
+        self,
+        key: str,
+        lease_id: str,
+    ):
+        with self._lock:
+            self._leases.get(key, {}).pop(lease_id, None)
+
+    def held(
+        self,
+        key: str,
+    ) -> int:
+        now = time.monotonic()
+        with self._lock:
+            return sum(expires_at > now for expires_at in self._leases.get(key, {}).values())
+
+
+def _make_handler(server: MockClearSkyServer):
+
+    class MockClearSkyHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body are written separately
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def do_DELETE(self):
+            self._handle("DELETE")
+
+        def _handle(self, method: str):
+            url = urlsplit(self.path)
+            body_bytes = self.rfile.read(int(self.headers.get("content-length") or 0))
+            if method == "POST" and url.path.startswith("/limiter/"):
+                # the connection limiter service is not an API endpoint, its requests do not count as connections
+                self._handle_limiter(url.path, self.headers.get("x-api-key") or "", json.loads(body_bytes) if body_bytes else {})
+                return
+
+            status_code = 500
+            accepted = server._enter_request(url.path)
+            try:
+                if self.headers.get("x-api-key") != server.api_key:
+                    status_code = self._send_json(401, None)
+                    return
+
+                if not accepted:
+                    status_code = self._send_error(429, "Too many concurrent connections")
+                    return
+
+                time.sleep(server.latency_seconds)
+
+                if server.error_rate and random.random() < server.error_rate:
+                    status_code = self._send_error(500, "Simulated server error")
+                    return
+
+                body = json.loads(body_bytes) if body_bytes else {}
+                status_code = self._route(method, url.path, parse_qs(url.query), body, body_bytes)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+            finally:
+                server._exit_request(status_code)
+
+        def _handle_limiter(self, path: str, key: str, body: dict):
+            if path == "/limiter/acquire":
+                lease_id = server.connection_leases.acquire(key, int(body["MaxConnections"]), float(body["LeaseSeconds"]))
+                if lease_id is None:
+                    self._send_error(429, "No free connection slot")
+                else:
+                    self._send_json(200, {"LeaseId": lease_id})
+            elif path == "/limiter/renew":
+                server.connection_leases.renew(key, body["LeaseIds"], float(body["LeaseSeconds"]))
+                self._send_json(200, True)
+            elif path == "/limiter/release":
+                server.connection_leases.release(key, body["LeaseId"])
+                self._send_json(200, True)
+            else:
+                self._send_error(404, f"Unknown endpoint POST {path}")
+
+        def _route(self, method: str, path: str, query: dict, body: dict, body_bytes: bytes) -> int:
+            if method == "GET" and path == "/api/apikey/info":
+                return self._send_json(200, server.api_key_info())
+            if method == "POST" and path == "/api/satelliteimages/search/available":
+                return self._send_json(200, server.search_available(body))
+            if method == "POST" and path == "/api/satelliteimages/process/composite/estimate":
+                return self._send_json(200, server.composite_estimate(body))
+            if method == "POST" and path == "/api/satelliteimages/process/composite":
+                return self._send_composite(body_bytes, body)
+            if method == "GET" and path == "/api/tasking/models":
+                return self._send_json(200, server.tasking_models())
+            if method == "GET" and path == "/api/tasking/orders":
+                task_orders = [server.task_order()]
+                if query.get("recurringOnly", ["False"])[0].lower() == "true":
+                    task_orders = [order for order in task_orders if order["To"] is None]
+                return self._send_json(200, {"TaskOrders": task_orders})
+            if method == "POST" and path == "/api/tasking/search/tiles":
+                return self._send_json(200, server.search_tiles(body))
+            if method == "POST" and path == "/api/tasking/orders/estimate":
+                return self._send_json(200, server.tasking_estimate(body))
+            if method == "POST" and path == "/api/tasking/orders":
+                return self._send_json(200, server.task_order(body))
+            if method == "DELETE" and path == "/api/tasking/orders/cancel":
+                return self._send_json(200, True)
+            return self._send_error(404, f"Unknown endpoint {method} {path}")
+
+        def _send_json(self, status_code: int, data) -> int:
+            succeeded = status_code == 200
+            payload = json.dumps({"Succeeded": succeeded, "Error": None, "Data": data}).encode("utf-8")
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return status_code
+
+        def _send_error(self, status_code: int, message: str) -> int:
+            payload = json.dumps({"Succeeded": False, "Error": {"Message": message, "Code": status_code}, "Data": None}).encode("utf-8")
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if status_code == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(payload)
+            return status_code
+
+        def _send_composite(self, body_bytes: bytes, body: dict) -> int:
+            time.sleep(server.composite_latency_seconds)
+
+            if _area_km2(_geometry(body)) > server.max_composite_area_km2:
+                return self._send_error(400, f"Area exceeds the maximum composite area of {server.max_composite_area_km2} km2")
+
+            composite = server.composite
+            start, end = 0, len(composite) - 1
+            byte_range = self.headers.get("range") if server.supports_ranges else None
+            if_range = self.headers.get("if-range")
+            if if_range is not None and if_range != server.etag:
+                byte_range = None  # the composite changed, send all of it
+            status_code = 200
+            if byte_range:
+                range_start, range_end = byte_range.split("=", 1)[1].split("-", 1)
+                start, end = int(range_start), min(int(range_end), end) if range_end else end
+                if start > end:
+                    return self._send_error(416, "Range not satisfiable")
+                status_code = 206
+
+            command_hash = hashlib.sha256(body_bytes).hexdigest()[:16]
+            self.send_response(status_code)
+            if status_code == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(composite)}")
+            self.send_header("Content-Type", "application/octet-stream")
+            if server.supports_ranges:
+                self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", server.etag)
+            self.send_header("Content-Length", str(end + 1 - start))
+            self.send_header("Content-Disposition", f'attachment; filename="composite-{body.get("Date", "")}-{command_hash}.{body.get("FileType", "tif")}"')
+            self.end_headers()
+
+            drop_after_bytes = server._take_drop()
+            if drop_after_bytes is not None:
+                end = min(end, start + drop_after_bytes - 1)
+                self.close_connection = True
+
+            chunk_size = 2**16
+            for position in range(start, end + 1, chunk_size):
+                chunk = composite[position : min(position + chunk_size, end + 1)]
+                self.wfile.write(chunk)
+                if server.bandwidth_bytes_per_second:
+                    time.sleep(len(chunk) / server.bandwidth_bytes_per_second)
+            return status_code
+
+    return MockClearSkyHandler
+
+
+def _split_geometries(body: dict):
+    geometry = _geometry(body)
+    if isinstance(geometry, GeometryCollection):
+        return [part.wkt for part in geometry.geoms]
+    return [geometry.wkt]
+
+
+def _geometry(body: dict):
+    if body.get("Wkt"):
+        return wkt.loads(body["Wkt"])
+    return shape(body["GeoJson"])
+
+
+def _area_km2(geometry) -> float:
+    if geometry.is_empty:
+        return 0.0
+    return geometry.area * KM2_PER_SQUARE_DEGREE_AT_EQUATOR * math.cos(math.radians(geometry.centroid.y))
+
+
+def _box(bounds) -> dict:
+    minx, miny, maxx, maxy = bounds
+    return {"type": "Polygon", "coordinates": [[(minx, miny), (maxx, miny), (maxx, maxy), (minx, maxy), (minx, miny)]]}
+
+
+if __name__ == "__main__":
+    with MockClearSkyServer(port=8089, latency_seconds=0.05) as mock_server:
+        print(f"Mock ClearSKY Vision API listening on {mock_server.url}, use api key {MOCK_API_KEY!r}")
+        threading.Event().wait()
@@ -0,0 +1,154 @@
+import os
+import queue
+import threading
+from typing import Optional
+
+FSYNC_NONE = "none"
+FSYNC_END = "end"
+FSYNC_EVERY_BUFFER = "every_buffer"
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_END, FSYNC_EVERY_BUFFER)
+
+
+class PipelinedFileWriter:
+    """
+    Double-buffered file writer, letting a reader fill one buffer while a writer thread flushes another to disk.
+
+    Buffers are allocated once and reused. Usage:
+
+        with PipelinedFileWriter(path, offset=0, preallocate_size=content_length) as writer:
+            while True:
+                buffer = writer.acquire_buffer()
+                size = source.readinto(buffer)
+                if not size:
+                    writer.release_buffer(buffer)
+                    break
+                writer.submit(buffer, size)
+
+    The file is truncated to the bytes actually written when the writer closes, so a preallocated file that was only
+    partially written can still be resumed from its length.
+
+    fsync_policy: "none" leaves flushing to the OS, "end" syncs once before closing, "every_buffer" syncs every buffer.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        offset: int = 0,
+        preallocate_size: Optional[int] = None,
+        buffer_size: int = 2**20,
+        buffer_count: int = 2,
+        fsync_policy: str = FSYNC_NONE,
+    ):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}")
+
+        self.file_path = file_path
+        self.position = offset
+        self._written_position = offset
+        self.fsync_policy = fsync_policy
+        self._free_buffers: "queue.Queue[bytearray]" = queue.Queue()
+        self._filled_buffers: "queue.Queue" = queue.Queue()
+        self._error: Optional[BaseException] = None
+
+        for _ in range(max(2, buffer_count)):
+            self._free_buffers.put(bytearray(buffer_size))
+
+        if offset > 0 and (not os.path.isfile(file_path) or os.path.getsize(file_path) < offset):
+            raise ValueError(f"can not resume writing {file_path} at offset {offset}, the file is missing or shorter")
+
+        self._file = open(file_path, "r+b" if offset > 0 else "wb")
+        self._file.truncate(offset)
+        if preallocate_size:
+            self._preallocate(offset + preallocate_size)
+        self._file.seek(offset)
+
+        self._writer_thread = threading.Thread(target=self._write_buffers, daemon=True)
+        self._writer_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _preallocate(
+        self,
+        size: int,
+    ):
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(self._file.fileno(), 0, size)
+                return
+            except OSError:
+                pass  # not supported by the filesystem
+        self._file.truncate(size)
+
+    def _write_buffers(self):
+        while True:
+            item = self._filled_buffers.get()
+            if item is None:
+                return
+
+            buffer, size = item
+            try:
+                if self._error is None:
+                    self._file.write(memoryview(buffer)[:size])
+                    self._written_position += size
+                    if self.fsync_policy == FSYNC_EVERY_BUFFER:
+                        self._file.flush()
+                        os.fsync(self._file.fileno())
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._free_buffers.put(buffer)
+
+    def _raise_writer_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def acquire_buffer(self) -> bytearray:
+        """
+        Returns a free buffer, blocking while the writer thread still holds all of them.
+        """
+        self._raise_writer_error()
+        return self._free_buffers.get()
+
+    def release_buffer(
+        self,
+        buffer: bytearray,
+    ):
+        """
+        Returns an unused buffer.
+        """
+        self._free_buffers.put(buffer)
+
+    def submit(
+        self,
+        buffer: bytearray,
+        size: int,
+    ):
+        """
+        Queues the first size bytes of buffer to be written, the buffer is returned to the free buffers once written.
+        """
+        self._raise_writer_error()
+        self.position += size
+        self._filled_buffers.put((buffer, size))
+
+    def close(self):
+        """
+        Waits for queued buffers to be written, trims preallocated space and closes the file.
+        """
+        if self._file.closed:
+            return
+
+        self._filled_buffers.put(None)
+        self._writer_thread.join()
+        try:
+            self._file.truncate(self._written_position)
+            if self.fsync_policy != FSYNC_NONE:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+
+        self._raise_writer_error()
@@ -0,0 +1,344 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_connect_timing = threading.local()
+
+
+class RequestMetrics:
+    """
+    Timings and sizes of a single HTTP request.
+
+    connect_seconds: time spent establishing a new connection, 0 when a pooled connection was reused.
+    time_to_first_byte_seconds: time from sending the request until the response headers arrived,
+    i.e. mostly server processing time.
+    download_seconds: time from the response headers until the body was read completely.
+    """
+
+    def __init__(
+        self,
+        method: str,
+        endpoint: str,
+        status_code: int,
+        request_bytes: int,
+        response_bytes: int,
+        connect_seconds: float,
+        time_to_first_byte_seconds: float,
+        download_seconds: float,
+    ):
+        self.method = method
+        self.endpoint = endpoint
+        self.status_code = status_code
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.connect_seconds = connect_seconds
+        self.time_to_first_byte_seconds = time_to_first_byte_seconds
+        self.download_seconds = download_seconds
+
+    @property
+    def total_seconds(self) -> float:
+        return self.time_to_first_byte_seconds + self.download_seconds
+
+    @property
+    def throughput_bytes_per_second(self) -> Optional[float]:
+        return self.response_bytes / self.download_seconds if self.download_seconds > 0 else None
+
+    def __repr__(self):
+        return (
+            f"RequestMetrics({self.method} {self.endpoint} {self.status_code}, connect={self.connect_seconds:.3f}s, "
+            f"ttfb={self.time_to_first_byte_seconds:.3f}s, download={self.download_seconds:.3f}s, {self.response_bytes} bytes)"
+        )
+
+
+class MetricsExporter(ABC):
+    """
+    Base class of the exporters receiving the RequestMetrics of every request made by ClearSkyVisionAPI.
+
+    export is called from the thread that made the request and must be thread-safe.
+    """
+
+    @abstractmethod
+    def export(
+        self,
+        metrics: RequestMetrics,
+    ):
+        pass
+
+
+class InMemoryMetricsExporter(MetricsExporter):
+    """
+    Aggregates request metrics per endpoint and status code in memory.
+
+    The latest max_samples total latencies per endpoint are kept for percentiles.
+    """
+
+    def __init__(
+        self,
+        max_samples: int = 10000,
+    ):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._aggregates: Dict[Tuple[str, str, int], Dict[str, float]] = {}
+        self._latency_samples: Dict[str, List[float]] = {}
+
+    def export(
+        self,
+        metrics: RequestMetrics,
+    ):
+        with self._lock:
+            key = (metrics.method, metrics.endpoint, metrics.status_code)
+            aggregate = self._aggregates.setdefault(
+                key,
+                {
+                    "count": 0,
+                    "request_bytes": 0,
+                    "response_bytes": 0,
+                    "connect_seconds": 0.0,
+                    "time_to_first_byte_seconds": 0.0,
+                    "download_seconds": 0.0,
+                    "max_total_seconds": 0.0,
+                },
+            )
+            aggregate["count"] += 1
+            aggregate["request_bytes"] += metrics.request_bytes
+            aggregate["response_bytes"] += metrics.response_bytes
+            aggregate["connect_seconds"] += metrics.connect_seconds
+            aggregate["time_to_first_byte_seconds"] += metrics.time_to_first_byte_seconds
+            aggregate["download_seconds"] += metrics.download_seconds
+            aggregate["max_total_seconds"] = max(aggregate["max_total_seconds"], metrics.total_seconds)
+
+            samples = self._latency_samples.setdefault(metrics.endpoint, [])
+            samples.append(metrics.total_seconds)
+            if len(samples) > self.max_samples:
+                del samples[: len(samples) - self.max_samples]
+
+            self._observe(metrics)
+
+    def _observe(
+        self,
+        metrics: RequestMetrics,
+    ):
+        """
+        Called with the lock held for every exported request, for subclasses keeping additional aggregates.
+        """
+
+    def summary(self) -> List[Dict]:
+        """
+        Returns one dictionary per method, endpoint and status code, with counts, totals and mean timings.
+        """
+        with self._lock:
+            rows = []
+            for (method, endpoint, status_code), aggregate in sorted(self._aggregates.items()):
+                count = aggregate["count"]
+                row = {"method": method, "endpoint": endpoint, "status_code": status_code}
+                row.update(aggregate)
+                row["mean_connect_seconds"] = aggregate["connect_seconds"] / count
+                row["mean_time_to_first_byte_seconds"] = aggregate["time_to_first_byte_seconds"] / count
+                row["mean_download_seconds"] = aggregate["download_seconds"] / count
+                row["download_bytes_per_second"] = aggregate["response_bytes"] / aggregate["download_seconds"] if aggregate["download_seconds"] > 0 else None
+                rows.append(row)
+            return rows
+
+    def latency_percentile(
+        self,
+        endpoint: str,
+        percentile: float,
+    ) -> Optional[float]:
+        """
+        Returns the given percentile (0-100) of the total latency of recent requests to endpoint.
+        """
+        with self._lock:
+            samples = sorted(self._latency_samples.get(endpoint, []))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))]
+
+
+class PrometheusMetricsExporter(InMemoryMetricsExporter):
+    """
+    Keeps request metrics as Prometheus counters and histograms, rendered in the Prometheus text exposition format
+    by render(), e.g. to be served on a /metrics endpoint.
+    """
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__(
+        self,
+        namespace: str = "clearsky_api",
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__()
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._histograms: Dict[Tuple[str, str, str], List[int]] = {}
+        self._histogram_sums: Dict[Tuple[str, str, str], float] = {}
+
+    def _observe(
+        self,
+        metrics: RequestMetrics,
+    ):
+        for name, value in (
+            ("connect_seconds", metrics.connect_seconds),
+            ("time_to_first_byte_seconds", metrics.time_to_first_byte_seconds),
+            ("download_seconds", metrics.download_seconds),
+            ("request_duration_seconds", metrics.total_seconds),
+        ):
+            key = (name, metrics.method, metrics.endpoint)
+            counts = self._histograms.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._histogram_sums[key] = self._histogram_sums.get(key, 0.0) + value
+
+    def render(self) -> str:
+        lines = []
+        counters = (
+            ("requests_total", "count", "Requests sent to the ClearSKY Vision API."),
+            ("request_bytes_total", "request_bytes", "Request body bytes sent."),
+            ("response_bytes_total", "response_bytes", "Response body bytes received."),
+        )
+        with self._lock:
+            for name, field, help_text in counters:
+                lines.append(f"# HELP {self.namespace}_{name} {help_text}")
+                lines.append(f"# TYPE {self.namespace}_{name} counter")
+                for (method, endpoint, status_code), aggregate in sorted(self._aggregates.items()):
+                    lines.append(f'{self.namespace}_{name}{{method="{method}",endpoint="{endpoint}",status="{status_code}"}} {aggregate[field]:g}')
+
+            histogram_names = sorted(set(name for name, _, _ in self._histograms))
+            for name in histogram_names:
+                lines.append(f"# HELP {self.namespace}_{name} Request {name.replace('_', ' ')}.")
+                lines.append(f"# TYPE {self.namespace}_{name} histogram")
+                for (histogram_name, method, endpoint), counts in sorted(self._histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    labels = f'method="{method}",endpoint="{endpoint}"'
+                    cumulative = 0
+                    for bucket, count in zip(self.buckets, counts):
+                        cumulative += count
+                        lines.append(f'{self.namespace}_{name}_bucket{{{labels},le="{bucket:g}"}} {cumulative}')
+                    cumulative += counts[-1]
+                    lines.append(f'{self.namespace}_{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+                    lines.append(f"{self.namespace}_{name}_sum{{{labels}}} {self._histogram_sums[(histogram_name, method, endpoint)]:g}")
+                    lines.append(f"{self.namespace}_{name}_count{{{labels}}} {cumulative}")
+
+        return "\n".join(lines) + "\n"
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = getattr(_connect_timing, "seconds", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = getattr(_connect_timing, "seconds", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter measuring the time spent establishing new connections (TCP and TLS handshakes).
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+class InstrumentedSession(requests.Session):
+    """
+    requests.Session passing RequestMetrics of every request to its exporters.
+
+    Metrics of streamed responses are exported when the response is closed. When connection_limiter is set, every
+    request holds a slot of the limiter (see tools/connection_limiter.py) until its response is read, or closed when streamed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.metrics_exporters: List[MetricsExporter] = []
+        self.connection_limiter = None
+
+    def send(self, request, **kwargs):
+        connection_limiter = self.connection_limiter
+        if connection_limiter is None:
+            return self._send_with_metrics(request, **kwargs)
+
+        token = connection_limiter.acquire()
+        try:
+            response = self._send_with_metrics(request, **kwargs)
+        except BaseException:
+            connection_limiter.release(token)
+            raise
+
+        if not kwargs.get("stream"):
+            connection_limiter.release(token)
+            return response
+
+        close = response.close
+
+        def close_and_release():
+            close()
+            if not getattr(response, "_connection_slot_released", False):
+                response._connection_slot_released = True  # type: ignore
+                connection_limiter.release(token)
+
+        response.close = close_and_release  # type: ignore
+        return response
+
+    def _send_with_metrics(self, request, **kwargs):
+        if not self.metrics_exporters:
+            return super().send(request, **kwargs)
+
+        _connect_timing.seconds = 0.0
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        connect_seconds = _connect_timing.seconds
+        request_body = request.body or b""
+        request_bytes = len(request_body.encode("utf-8") if isinstance(request_body, str) else request_body)
+        time_to_first_byte_seconds = min(response.elapsed.total_seconds(), time.perf_counter() - start)
+
+        def export(response_bytes: int):
+            metrics = RequestMetrics(
+                request.method,
+                urlsplit(request.url).path,
+                response.status_code,
+                request_bytes,
+                response_bytes,
+                connect_seconds,
+                time_to_first_byte_seconds,
+                max(0.0, time.perf_counter() - start - time_to_first_byte_seconds),
+            )
+            for exporter in self.metrics_exporters:
+                exporter.export(metrics)
+
+        if not kwargs.get("stream"):
+            export(len(response.content))
+            return response
+
+        close = response.close
+
+        def close_and_export():
+            if not getattr(response, "_metrics_exported", False):
+                response._metrics_exported = True  # type: ignore
+                export(response.raw.tell() if hasattr(response.raw, "tell") else 0)
+            close()
+
+        response.close = close_and_export  # type: ignore
+        return response
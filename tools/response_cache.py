@@ -0,0 +1,227 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+# get_api_key_info is not cached by default, as budgets and key pools rely on its CreditAmount being current
+DEFAULT_TTL_SECONDS = {
+    "get_tasking_models": 3600,
+    "search_orderable_tiles": 3600,
+    "retrieve_estimate_for_process_composite_of_satellite_imagery": 600,
+    "retrieve_estimate_for_tasking_order": 600,
+}
+
+
+class ResponseCache(ABC):
+    """
+    Base class of the response caches used by ClearSkyVisionAPI for read-only endpoints.
+
+    Responses are stored as the raw JSON text of successful responses, keyed on the endpoint, the API key and the
+    request body. Each endpoint has its own time to live, endpoints without a TTL are not cached.
+
+    Subclasses implement the abstract methods _get and _set.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[Dict[str, float]] = None,
+        max_size_bytes: int = 64 * 2**20,
+    ):
+        """
+        ttl_seconds: time to live per endpoint (method name on ClearSkyVisionAPI), overriding DEFAULT_TTL_SECONDS.
+        max_size_bytes: upper bound of the total size of the cached responses, least recently used responses are evicted.
+        """
+        self.ttl_seconds = dict(DEFAULT_TTL_SECONDS)
+        if ttl_seconds:
+            self.ttl_seconds.update(ttl_seconds)
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        endpoint: str,
+        api_key: str,
+        request_body: Optional[str] = None,
+    ) -> str:
+        key_material = "\n".join([endpoint, api_key, request_body or ""])
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def ttl_for(
+        self,
+        endpoint: str,
+    ) -> Optional[float]:
+        return self.ttl_seconds.get(endpoint)
+
+    def get(
+        self,
+        key: str,
+    ) -> Optional[str]:
+        value = self._get(key)
+        with self._counter_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(
+        self,
+        key: str,
+        value: str,
+        ttl_seconds: float,
+    ):
+        self._set(key, value, time.time() + ttl_seconds)
+
+    def stats(self) -> Dict[str, int]:
+        with self._counter_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    @abstractmethod
+    def _get(
+        self,
+        key: str,
+    ) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def _set(
+        self,
+        key: str,
+        value: str,
+        expires_at: float,
+    ):
+        pass
+
+
+class MemoryResponseCache(ResponseCache):
+    """
+    In-memory LRU response cache, shared by the threads of a single process.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[Dict[str, float]] = None,
+        max_size_bytes: int = 64 * 2**20,
+    ):
+        super().__init__(ttl_seconds, max_size_bytes)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+    def _get(
+        self,
+        key: str,
+    ) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(
+        self,
+        key: str,
+        value: str,
+        expires_at: float,
+    ):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, expires_at)
+            self._size_bytes += len(value)
+
+            while self._size_bytes > self.max_size_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(
+        self,
+        key: str,
+    ):
+        value, _ = self._entries.pop(key)
+        self._size_bytes -= len(value)
+
+
+class SqliteResponseCache(ResponseCache):
+    """
+    Response cache stored in an SQLite database, which several processes can share.
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        ttl_seconds: Optional[Dict[str, float]] = None,
+        max_size_bytes: int = 256 * 2**20,
+    ):
+        super().__init__(ttl_seconds, max_size_bytes)
+        self.database_path = database_path
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            with connection:  # commits on success, rolls back on exceptions
+                yield connection
+        finally:
+            connection.close()
+
+    def _get(
+        self,
+        key: str,
+    ) -> Optional[str]:
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            if row[1] <= now:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+
+            connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def _set(
+        self,
+        key: str,
+        value: str,
+        expires_at: float,
+    ):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires_at, now),
+            )
+            connection.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+
+            total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size <= self.max_size_bytes:
+                return
+
+            for lru_key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                if total_size <= self.max_size_bytes:
+                    break
+                connection.execute("DELETE FROM responses WHERE key = ?", (lru_key,))
+                total_size -= size
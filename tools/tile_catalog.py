@@ -0,0 +1,246 @@
+from contextlib import contextmanager
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import shapely
+
+import models
+
+# TileGuids per search_orderable_tiles request when refreshing tiles
+REFRESH_BATCH_SIZE = 500
+
+
+class TileCatalog:
+    """
+    Local spatial index of the orderable tiles returned by search_orderable_tiles.
+
+    Tiles are kept in an shapely STRtree, answering point, bbox and geometry queries without round trips to the API,
+    and persisted in an SQLite database when database_path is set, so the catalog survives restarts. Tiles are keyed
+    on their Guid: adding a tile again replaces the stored tile, so the catalog can be refreshed incrementally.
+
+    Usage:
+
+        catalog = TileCatalog("tiles.sqlite")
+        tiles = catalog.search(api_service, aoi_wkt)  # only calls the API when the catalog does not cover the AOI
+    """
+
+    def __init__(
+        self,
+        database_path: Optional[str] = None,
+    ):
+        self.database_path = database_path
+        self._lock = threading.RLock()
+        self._tiles: Dict[str, models.TaskingTileDto] = {}
+        self._geometries: Dict[str, shapely.Geometry] = {}
+        self._tree: Optional[shapely.STRtree] = None
+        self._tree_guids = np.empty(0, dtype=object)
+
+        if database_path is not None:
+            with self._connect() as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("CREATE TABLE IF NOT EXISTS tiles (guid TEXT PRIMARY KEY, epsg TEXT NOT NULL, wkt TEXT NOT NULL, wkb BLOB NOT NULL, updated_at REAL NOT NULL)")
+                rows = connection.execute("SELECT guid, epsg, wkt, wkb FROM tiles").fetchall()
+
+            geometries = shapely.from_wkb([row[3] for row in rows])
+            for (guid, epsg, wkt, _), geometry in zip(rows, geometries):
+                self._tiles[guid] = models.TaskingTileDto.model_construct(Guid=guid, Epsg=epsg, DataGeogWkt=wkt)
+                self._geometries[guid] = geometry
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.database_path, timeout=30)  # type: ignore
+        try:
+            with connection:  # commits on success, rolls back on exceptions
+                yield connection
+        finally:
+            connection.close()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def __contains__(self, guid: str) -> bool:
+        return str(guid) in self._tiles
+
+    def get(
+        self,
+        guid: str,
+    ) -> Optional[models.TaskingTileDto]:
+        return self._tiles.get(str(guid))
+
+    def add_tiles(
+        self,
+        tiles: Iterable[models.TaskingTileDto],
+    ) -> int:
+        """
+        Adds tiles to the catalog, replacing stored tiles with the same Guid.
+
+        Returns the number of tiles which were new or changed.
+        """
+        tiles = list(tiles)
+        with self._lock:
+            changed_tiles = [tile for tile in tiles if self._tiles.get(tile.Guid) != tile]
+            if not changed_tiles:
+                return 0
+
+            geometries = shapely.from_wkt([tile.DataGeogWkt for tile in changed_tiles])
+            for tile, geometry in zip(changed_tiles, geometries):
+                self._tiles[tile.Guid] = tile
+                self._geometries[tile.Guid] = geometry
+            self._tree = None
+
+            if self.database_path is not None:
+                now = time.time()
+                with self._connect() as connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO tiles (guid, epsg, wkt, wkb, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        [(tile.Guid, tile.Epsg, tile.DataGeogWkt, shapely.to_wkb(geometry), now) for tile, geometry in zip(changed_tiles, geometries)],
+                    )
+
+        return len(changed_tiles)
+
+    def remove_tiles(
+        self,
+        guids: Iterable[str],
+    ):
+        guids = [str(guid) for guid in guids]
+        with self._lock:
+            for guid in guids:
+                self._tiles.pop(guid, None)
+                self._geometries.pop(guid, None)
+            self._tree = None
+
+            if self.database_path is not None:
+                with self._connect() as connection:
+                    connection.executemany("DELETE FROM tiles WHERE guid = ?", [(guid,) for guid in guids])
+
+    def update_from_search(
+        self,
+        api_service,
+        query: models.TaskingTileSearchQueryDto,
+    ) -> List[models.TaskingTileDto]:
+        """
+        Runs search_orderable_tiles and adds the tiles found to the catalog.
+
+        Returns the tiles found.
+        """
+        search_result = api_service.search_orderable_tiles(query)
+        if not search_result.Succeeded or search_result.Data is None:
+            raise Exception(f"search of orderable tiles failed: {search_result.Error.Message if search_result.Error else 'no data'}")
+
+        self.add_tiles(search_result.Data.Tiles)
+        return search_result.Data.Tiles
+
+    def refresh(
+        self,
+        api_service,
+        guids: Optional[Sequence[str]] = None,
+    ) -> int:
+        """
+        Refetches tiles by Guid, all tiles in the catalog unless guids is set, REFRESH_BATCH_SIZE tiles per request.
+
+        Tiles the API no longer returns are removed. The catalog is only updated once every batch succeeded, in one
+        step, so queries never see a partially refreshed catalog.
+
+        Returns the number of tiles which were new, changed or removed.
+        """
+        with self._lock:
+            guids = list(self._tiles) if guids is None else [str(guid) for guid in guids]
+
+        fresh_tiles: Dict[str, models.TaskingTileDto] = {}
+        for start in range(0, len(guids), REFRESH_BATCH_SIZE):
+            query = models.TaskingTileSearchQueryDto(TileGuids=guids[start : start + REFRESH_BATCH_SIZE])
+            search_result = api_service.search_orderable_tiles(query)
+            if not search_result.Succeeded or search_result.Data is None:
+                raise Exception(f"refresh of orderable tiles failed: {search_result.Error.Message if search_result.Error else 'no data'}")
+            fresh_tiles.update((tile.Guid, tile) for tile in search_result.Data.Tiles)
+
+        with self._lock:
+            stale_guids = [guid for guid in guids if guid not in fresh_tiles and guid in self._tiles]
+            changed = self.add_tiles(fresh_tiles.values())
+            self.remove_tiles(stale_guids)
+        return changed + len(stale_guids)
+
+    def search(
+        self,
+        api_service,
+        geometry: Union[str, shapely.Geometry],
+    ) -> List[models.TaskingTileDto]:
+        """
+        Returns the tiles intersecting geometry, searching the API only if the catalog tiles do not cover geometry.
+        """
+        geometry = _to_geometry(geometry)
+        with self._lock:
+            tiles = self.query_geometry(geometry)
+            if tiles and shapely.covers(shapely.union_all([self._geometries[tile.Guid] for tile in tiles]), geometry):
+                return tiles
+
+        self.update_from_search(api_service, models.TaskingTileSearchQueryDto(Wkt=geometry.wkt))
+        return self.query_geometry(geometry)
+
+    def query_point(
+        self,
+        x: float,
+        y: float,
+    ) -> List[models.TaskingTileDto]:
+        """
+        Returns the tiles containing the point (x, y) in EPSG:4326.
+        """
+        return self.query_geometry(shapely.Point(x, y))
+
+    def query_bbox(
+        self,
+        min_x: float,
+        min_y: float,
+        max_x: float,
+        max_y: float,
+    ) -> List[models.TaskingTileDto]:
+        """
+        Returns the tiles intersecting the bounding box in EPSG:4326.
+        """
+        return self.query_geometry(shapely.box(min_x, min_y, max_x, max_y))
+
+    def query_geometry(
+        self,
+        geometry: Union[str, shapely.Geometry],
+        predicate: str = "intersects",
+    ) -> List[models.TaskingTileDto]:
+        """
+        Returns the tiles for which predicate(geometry, tile) holds, with the predicates of shapely.STRtree.query.
+        """
+        with self._lock:
+            tree, tree_guids = self._get_tree()
+            indices = tree.query(_to_geometry(geometry), predicate=predicate)
+            return [self._tiles[guid] for guid in tree_guids[np.sort(indices)]]
+
+    def query_geometries(
+        self,
+        geometries: Sequence[Union[str, shapely.Geometry]],
+        predicate: str = "intersects",
+    ) -> List[List[str]]:
+        """
+        Returns the Guids of the tiles matching each of many geometries, in one vectorized STRtree query.
+        """
+        geometry_array = np.asarray(geometries, dtype=object)
+        if geometry_array.size and isinstance(geometry_array.flat[0], str):
+            geometry_array = shapely.from_wkt(geometry_array)
+
+        tree, tree_guids = self._get_tree()
+        input_indices, tree_indices = tree.query(geometry_array, predicate=predicate)
+        guids_by_geometry: List[List[str]] = [[] for _ in range(len(geometry_array))]
+        for input_index, tree_index in zip(input_indices, tree_indices):
+            guids_by_geometry[input_index].append(tree_guids[tree_index])
+        return guids_by_geometry
+
+    def _get_tree(self):
+        with self._lock:
+            if self._tree is None:
+                self._tree_guids = np.array(list(self._geometries), dtype=object)
+                self._tree = shapely.STRtree([self._geometries[guid] for guid in self._tree_guids])
+            return self._tree, self._tree_guids
+
+
+def _to_geometry(geometry: Union[str, shapely.Geometry]) -> shapely.Geometry:
+    return shapely.from_wkt(geometry) if isinstance(geometry, str) else geometry
@@ -1,6 +1,9 @@
-from pyproj import Transformer
+import numpy as np
+import shapely
 from shapely.geometry import Polygon
 
+from tools.crs_transformer import get_transformer
+
 
 def pad_and_transform_bbox(bbox, epsg_code: int, padding: float = 0):
     """
@@ -27,7 +30,7 @@ def pad_and_transform_bbox(bbox, epsg_code: int, padding: float = 0):
     padded_bbox = (min_x - padding, min_y - padding, max_x + padding, max_y + padding)
 
     # Coordinate transformation
-    transformer = Transformer.from_crs(f"epsg:{epsg_code}", "epsg:4326", always_xy=True)
+    transformer = get_transformer(epsg_code, 4326)
     min_x, min_y = transformer.transform(padded_bbox[0], padded_bbox[1])
     max_x, max_y = transformer.transform(padded_bbox[2], padded_bbox[3])
 
@@ -36,6 +39,45 @@ def pad_and_transform_bbox(bbox, epsg_code: int, padding: float = 0):
     return polygon.wkt
 
 
+def pad_and_transform_bboxes(bboxes, epsg_code: int, padding: float = 0, points_per_edge: int = 16, as_wkt: bool = False) -> np.ndarray:
+    """
+    Pads many UTM bounding boxes and converts them to EPSG:4326 polygons in one vectorized pass.
+
+    Unlike pad_and_transform_bbox, which only transforms two corners, every edge is densified to points_per_edge
+    points before the transformation, so the polygons follow the curved outline of the boxes in EPSG:4326
+    closely and little padding is needed to select the intended pixels with PixelSelectionMode.
+
+    Parameters:
+    bboxes (array-like): An (N, 4) array of (min_x, min_y, max_x, max_y) bounding boxes.
+    epsg_code (int): The EPSG code of the bounding boxes' coordinate system.
+    padding (float): The padding value to expand/contract the bounding boxes.
+    points_per_edge (int): Number of points per edge, including its first corner.
+    as_wkt (bool): Return WKTs instead of shapely polygons.
+
+    Returns:
+    np.ndarray: Shapely polygons, or WKTs if as_wkt is set, of the padded bounding boxes in EPSG:4326.
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    padded_bboxes = bboxes + np.array([-padding, -padding, padding, padding])
+    min_x, min_y, max_x, max_y = padded_bboxes.T
+
+    # corners in the order of pad_and_transform_bbox, shape (N, 4, 2)
+    corners = np.stack([np.column_stack([min_x, min_y]), np.column_stack([min_x, max_y]), np.column_stack([max_x, max_y]), np.column_stack([max_x, min_y])], axis=1)
+    edge_vectors = np.roll(corners, -1, axis=1) - corners
+    steps = np.linspace(0, 1, points_per_edge, endpoint=False)
+
+    # shape (N, 4 * points_per_edge, 2), closed by repeating the first point
+    points = (corners[:, :, None, :] + steps[None, None, :, None] * edge_vectors[:, :, None, :]).reshape(len(bboxes), -1, 2)
+    points = np.concatenate([points, points[:, :1]], axis=1)
+
+    x, y = get_transformer(epsg_code, 4326).transform(points[..., 0].ravel(), points[..., 1].ravel())
+    polygons = shapely.polygons(np.stack([x, y], axis=-1).reshape(points.shape))
+
+    if as_wkt:
+        return shapely.to_wkt(polygons, rounding_precision=-1)
+    return polygons
+
+
 if __name__ == "__main__":
     in_epsg = 32633
     # (min_x, min_y, max_x, max_y)